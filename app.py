@@ -1,11 +1,31 @@
 import streamlit as st
-import os, hashlib
-from utils.qr_utils import extract_qr_from_image_path, extract_qr_from_pdf_path
-from utils.pdf_utils import save_uploaded_file, extract_text_from_file, render_first_page_as_image
-from utils.compare import compute_sha256, text_similarity_score, extract_common_fields, aggregate_score
+import os
+from utils.pdf_utils import save_uploaded_file
 from utils.fetch_official import fetch_official_pdf
+from utils.document import CertificateDocument
+from utils.tiers import verify_tiered
+from utils.visual import heatmap_overlay
+from utils.tracing import start_trace, render_debug_panel
+from utils.dedup import DEDUP_ENABLED, get_dedup_index, is_hit, known_result
+from utils.pdf_utils import start_ocr_warmup, ocr_status
 
 st.set_page_config(page_title="NPTEL Cert Verifier (Demo)", layout="wide")
+
+# load EasyOCR in the background while the page is already usable (text-layer PDFs never wait for it)
+start_ocr_warmup()
+st.sidebar.caption(f"OCR engine: {ocr_status()['state']}")
+
+# per-stage timings / cache hits of this run (QR, fetch, text layer, OCR, fields, scoring) in the sidebar
+show_trace = st.sidebar.checkbox("Debug: stage timings", value=os.environ.get("CERTISCAN_DEBUG_PANEL") == "1")
+run_trace = start_trace()
+
+
+def stop():
+    if show_trace:
+        render_debug_panel(st.sidebar, run_trace)
+    st.stop()
+
+
 st.title("NPTEL Certificate Verifier — Demo (EasyOCR + Streamlit)")
 st.write("Bhai: bas apna certificate upload kar, baaki kaam system khud karega ✅")
 
@@ -23,24 +43,47 @@ with col1:
         user_path = save_uploaded_file(user_file, prefix=r"D:\Profile\Pictures\NPTEL")
         st.success(f"User file saved: `{user_path}`")
 
+        # one decode of the upload shared by preview, QR, hash and text extraction
+        user_doc = CertificateDocument(user_path)
+
         # preview
         if user_path.lower().endswith(".pdf"):
             st.write("Preview (first page):")
-            img = render_first_page_as_image(user_path)
+            img = user_doc.preview_png()
             st.image(img, use_container_width=True)
         else:
             st.image(user_path, use_container_width=True)
 
         # Try read QR
         try:
-            if user_path.lower().endswith('.pdf'):
-                qr = extract_qr_from_pdf_path(user_path)
-            else:
-                qr = extract_qr_from_image_path(user_path)
+            qr = user_doc.qr()["data"]
         except Exception as e:
             qr = None
             st.warning(f"QR extraction error: {e}")
 
+        # same file verified before: show the stored verdict, skip fetch / OCR. Not for the upload this
+        # session just verified and added, or every rerun would report it as a duplicate of itself.
+        own = st.session_state.get("dedup_added") == user_doc.sha256
+        known = get_dedup_index().lookup(user_doc, qr) if DEDUP_ENABLED and not own else None
+        if is_hit(known):
+            known = known_result(known)
+            st.info(f"Already verified (same file as {known['dedup']['sha256'][:12]}…) — stored result:")
+            st.json({k: known.get(k) for k in ("verdict", "final_score", "user_fields", "official_fields")})
+            if known["verdict"] == "VERIFIED":
+                st.success("VERIFIED ✅ (stored)")
+            elif known["verdict"] == "SUSPICIOUS":
+                st.warning("SUSPICIOUS ⚠️ (stored) — manual review recommended")
+            else:
+                st.error("FAKE / MISMATCH ❌ (stored)")
+            stop()
+        elif known and known["match"] == "near":
+            # looks like a re-scan, but an edited copy can look the same: verify it anyway
+            st.info(f"Looks like a re-scan of {known['sha256'][:12]}… (stored verdict: {known['verdict']}) — "
+                    "not reusing that verdict.")
+        elif known:
+            st.warning("Another file with this certificate id was verified before — check for a copied QR: "
+                       + ", ".join(s[:12] for s in known["same_key"]))
+
         if qr:
             st.success("QR detected!")
             st.write("QR content (usually URL):")
@@ -66,7 +109,7 @@ if st.button("Verify" if user_file else "Upload user file first"):
         st.error("Pehle user certificate upload karo bhai.")
     elif not official_path and not official_file:
         st.error("Official certificate not available. Please check QR link or upload manually.")
-        st.stop()
+        stop()
     else:
         # decide official path
         if official_file:
@@ -74,55 +117,54 @@ if st.button("Verify" if user_file else "Upload user file first"):
             st.success(f"Saved manual official file: `{official_path}`")
         else:
             st.success(f"Using auto-downloaded official file: `{official_path}`")
+        official_doc = CertificateDocument(official_path)
+
+        # ---------------- TIERED DECISION ----------------
+        # hash -> QR cert id -> text layer -> OCR; stops at the first tier that can decide
+        if user_doc.is_pdf and official_doc.is_pdf:
+            st.write("SHA-256 (user):", user_doc.sha256)
+            st.write("SHA-256 (official):", official_doc.sha256)
+        with st.spinner("Verifying (OCR only runs if the cheaper checks can't decide)..."):
+            result = verify_tiered(user_doc, official_doc, qr)
+        final_score = result["final_score"]
+        if DEDUP_ENABLED:
+            get_dedup_index().add(user_doc, result, qr)
+            st.session_state["dedup_added"] = user_doc.sha256
+        st.caption("Decided by: " + result["decided_by"] + " | " +
+                   ", ".join(f"{t['tier']} {t['ms']:.0f} ms ({t['outcome']})" for t in result["tiers"]))
+        if result["decided_by"] == "hash":
+            st.balloons()
+            st.success("Verified — exact PDF match (100%).")
+            stop()
+
+        if result.get("user_text") is not None:
+            u_text, o_text = result["user_text"], result["official_text"]
+            st.subheader("Extracted Text (short preview)")
+            c1, c2 = st.columns(2)
+            with c1:
+                st.write("User certificate:")
+                st.text(u_text[:800] + ("..." if len(u_text) > 800 else ""))
+            with c2:
+                st.write("Official certificate:")
+                st.text(o_text[:800] + ("..." if len(o_text) > 800 else ""))
+
+            st.metric("Text similarity (0-100)", f"{result['text_similarity']:.1f}")
+            st.write("Extracted fields (heuristic):")
+            st.json({"user": result["user_fields"], "official": result["official_fields"]})
 
-        # ---------------- HASH COMPARE ----------------
-        try:
-            if user_path.lower().endswith('.pdf') and official_path.lower().endswith('.pdf'):
-                h1 = compute_sha256(user_path)
-                h2 = compute_sha256(official_path)
-                st.write("SHA-256 (user):", h1)
-                st.write("SHA-256 (official):", h2)
-                if h1 == h2:
-                    st.balloons()
-                    st.success("Verified — exact PDF match (100%).")
-                    st.stop()
-        except Exception as e:
-            st.warning(f"Hash compare failed: {e}")
-
-        # ---------------- TEXT COMPARE ----------------
-        with st.spinner("Extracting text using PyMuPDF + EasyOCR..."):
-            u_text = extract_text_from_file(user_path)
-            o_text = extract_text_from_file(official_path)
-
-        st.subheader("Extracted Text (short preview)")
-        c1, c2 = st.columns(2)
-        with c1:
-            st.write("User certificate:")
-            st.text(u_text[:800] + ("..." if len(u_text) > 800 else ""))
-        with c2:
-            st.write("Official certificate:")
-            st.text(o_text[:800] + ("..." if len(o_text) > 800 else ""))
-
-        # similarity
-        score_text = text_similarity_score(u_text, o_text)
-        st.metric("Text similarity (0-100)", f"{score_text:.1f}")
-
-        # field compare
-        u_fields = extract_common_fields(u_text)
-        o_fields = extract_common_fields(o_text)
-        st.write("Extracted fields (heuristic):")
-        st.json({"user": u_fields, "official": o_fields})
-
-        # aggregate
-        final_score, details = aggregate_score(u_fields, o_fields, score_text)
         st.write("Decision details:")
-        st.json(details)
+        st.json(result["details"])
+        if result.get("visual_heatmap") is not None:
+            v = result["visual"]
+            st.image(heatmap_overlay(user_doc, result["visual_heatmap"]), channels="BGR",
+                     caption=f"Visual diff vs official (SSIM {v['ssim']:.2f}, pHash distance {v['phash_distance']}, "
+                             f"{v['tampered_fraction'] * 100:.0f}% of blocks changed)")
 
         st.metric("Aggregate confidence (0-100)", f"{final_score*100:.1f}%")
-        if final_score >= 0.9:
+        if result["verdict"] == "VERIFIED":
             st.success("VERIFIED ✅ — High confidence")
             st.balloons()
-        elif final_score >= 0.6:
+        elif result["verdict"] == "SUSPICIOUS":
             st.warning("SUSPICIOUS ⚠️ — Partial match; manual review recommended")
         else:
             st.error("FAKE / MISMATCH ❌ — Low confidence")
@@ -132,4 +174,7 @@ if st.button("Verify" if user_file else "Upload user file first"):
         st.download_button("Download official file", data=open(official_path, "rb").read(), file_name=os.path.basename(official_path))
 
 st.markdown("---")
-st.write("Next steps: add visual tampering check (pHash/SSIM), improve field extraction regexes, and DB logging.")
+st.write("Next steps: improve field extraction regexes, and DB logging.")
+
+if show_trace:
+    render_debug_panel(st.sidebar, run_trace)
@@ -0,0 +1,109 @@
+"""
+Headless CertiScan command line.
+
+    python certiscan.py verify cert.pdf [more.pdf ...] [--official official.pdf]
+    python certiscan.py verify-batch <dir-or-manifest> --out results.jsonl [--workers 4]
+    python certiscan.py register-template official.pdf
+    python certiscan.py export-report results.jsonl --out report.xlsx
+"""
+import argparse, os, sys
+
+
+def cmd_verify(args):
+    import asyncio, json
+    from utils.async_pipeline import verify_many_async
+
+    # one process: each file's official-PDF fetch overlaps with OCR of the uploads
+    results = asyncio.run(verify_many_async(args.files, concurrency=args.concurrency,
+                                            official_path=args.official, official_dir=args.official_dir))
+    for r in results:
+        r.pop("trace", None)
+        print(json.dumps(r, default=str) if args.json else
+              f"{r['user_path']} -> {r.get('verdict') or r.get('error')} "
+              f"({r.get('decided_by') or '-'}, {r.get('elapsed_s', 0):.1f}s)")
+    return 1 if any("error" in r for r in results) else 0
+
+
+def cmd_verify_batch(args):
+    if args.ocr_backend:
+        # set before utils is imported so pool workers pick it up too
+        os.environ["CERTISCAN_OCR_BACKEND"] = args.ocr_backend
+    from utils.batch import run_batch
+
+    def progress(row):
+        verdict = row.get("verdict") or row.get("error", "")
+        print(f"[{row['status']}] {row['user_path']} -> {verdict} ({row['elapsed_s']:.1f}s)", flush=True)
+
+    summary = run_batch(
+        args.source, args.out,
+        workers=args.workers,
+        fmt=args.format,
+        resume=not args.no_resume,
+        official_dir=args.official_dir,
+        warm_ocr=not args.no_ocr_warmup,
+        on_result=progress,
+    )
+    print(f"done: {summary}")
+    return 1 if summary["error"] else 0
+
+
+def cmd_register_template(args):
+    from utils.ocr_template import register_template, load_template, DEFAULT_TEMPLATE_PATH
+    path = register_template(args.pdf, args.out or DEFAULT_TEMPLATE_PATH)
+    print(f"template saved to {path}: fields {sorted(load_template(path)['fields'])}")
+    return 0
+
+
+def cmd_export_report(args):
+    from utils.report import export_results, iter_result_file
+    try:
+        n = export_results(iter_result_file(args.results), args.out, args.format, chunk_rows=args.chunk_rows)
+    except (RuntimeError, ValueError) as e:  # unknown format, pyarrow missing for parquet
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    print(f"{n} rows written to {args.out}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="certiscan", description="NPTEL certificate verifier")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    v = sub.add_parser("verify", help="verify a few certificates in this process (asyncio pipeline)")
+    v.add_argument("files", nargs="+", help="PDF/JPG/PNG certificates")
+    v.add_argument("--official", default=None, help="official PDF to compare against (default: fetched via the QR)")
+    v.add_argument("--official-dir", default=None, help="where auto-fetched official PDFs are stored")
+    v.add_argument("--concurrency", type=int, default=4, help="certificates in flight at once")
+    v.add_argument("--json", action="store_true", help="print full results as JSON lines")
+    v.set_defaults(func=cmd_verify)
+
+    vb = sub.add_parser("verify-batch", help="verify a directory or manifest of certificates")
+    vb.add_argument("source", help="folder of PDF/JPG/PNG files, or a .csv/.jsonl/.txt manifest")
+    vb.add_argument("--out", default="results.jsonl", help="results file (.jsonl or .csv)")
+    vb.add_argument("--format", choices=["jsonl", "csv"], help="override format picked from --out extension")
+    vb.add_argument("--workers", type=int, default=None, help="process pool size (default: CPU count)")
+    vb.add_argument("--official-dir", default=None, help="where auto-fetched official PDFs are stored")
+    vb.add_argument("--no-resume", action="store_true", help="re-verify documents already in --out")
+    vb.add_argument("--no-ocr-warmup", action="store_true", help="don't load the OCR backend when a worker starts")
+    vb.add_argument("--ocr-backend", choices=["easyocr", "tesseract"], default=None,
+                    help="OCR engine for scans/photos (default: CERTISCAN_OCR_BACKEND or easyocr)")
+    vb.set_defaults(func=cmd_verify_batch)
+
+    rt = sub.add_parser("register-template", help="learn OCR field boxes from a reference official PDF")
+    rt.add_argument("pdf", help="official NPTEL certificate PDF with a text layer")
+    rt.add_argument("--out", default=None, help="template path (default: CERTISCAN_OCR_TEMPLATE)")
+    rt.set_defaults(func=cmd_register_template)
+
+    er = sub.add_parser("export-report", help="stream verify-batch results into an xlsx / csv / parquet report")
+    er.add_argument("results", help="verify-batch output (.jsonl or .csv)")
+    er.add_argument("--out", default="report.xlsx", help="report file (.xlsx, .csv or .parquet)")
+    er.add_argument("--format", choices=["xlsx", "csv", "parquet"], help="override format picked from --out extension")
+    er.add_argument("--chunk-rows", type=int, default=5000, help="rows held in memory at a time")
+    er.set_defaults(func=cmd_export_report)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
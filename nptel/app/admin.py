@@ -1,3 +1,30 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import VerificationJob, Certificate, OfficialDocument, VerificationRun
+
+
+@admin.register(VerificationJob)
+class VerificationJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "status", "verdict", "user_path", "created_at", "finished_at")
+    list_filter = ("status", "verdict")
+    readonly_fields = ("result",)
+
+
+@admin.register(Certificate)
+class CertificateAdmin(admin.ModelAdmin):
+    list_display = ("cert_id", "roll_no", "name", "course", "sha256", "last_seen")
+    search_fields = ("sha256", "cert_id", "roll_no", "qr_url")
+
+
+@admin.register(OfficialDocument)
+class OfficialDocumentAdmin(admin.ModelAdmin):
+    list_display = ("cert_id", "qr_url", "path", "fetched_at")
+    search_fields = ("sha256", "cert_id", "qr_url")
+
+
+@admin.register(VerificationRun)
+class VerificationRunAdmin(admin.ModelAdmin):
+    list_display = ("certificate", "verdict", "final_score", "decided_by", "created_at")
+    list_filter = ("verdict", "decided_by")
+    raw_id_fields = ("certificate", "official")
+    readonly_fields = ("result",)
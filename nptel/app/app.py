@@ -1,76 +1,65 @@
 import streamlit as st
-import os, re, hashlib
+import os, time
 from datetime import datetime
 import pandas as pd
 from io import BytesIO
 
-from utils.qr_utils import extract_qr_from_image_path, extract_qr_from_pdf_path
-from utils.pdf_utils import save_uploaded_file, extract_text_from_file, render_first_page_as_image
-from utils.compare import compute_sha256, text_similarity_score, aggregate_score
+from utils.pdf_utils import save_uploaded_file
 from utils.fetch_official import fetch_official_pdf
+from utils.document import CertificateDocument
+from utils.tiers import verify_tiered
+from utils.visual import heatmap_overlay
+from utils.tracing import start_trace, render_debug_panel
+from utils.dedup import DEDUP_ENABLED, get_dedup_index, is_hit, known_result
+from utils.report import export_report
+from utils.api_client import DEFAULT_API_URL, submit_verification, get_result
+from utils.pdf_utils import start_ocr_warmup, ocr_status
 
 
 # ---------------- STREAMLIT CONFIG ----------------
 st.set_page_config(page_title="NPTEL Cert Verifier", layout="wide")
-st.title("NPTEL Certificate Verifier (Auto Verify)")
-
-
-# ---------------- GLOBALS ----------------
-official_path = None
-official_file = None
-final_score = None
-o_text, u_text, o_fields = "", "", {}
 
+# load EasyOCR in the background while the page is already usable (text-layer PDFs never wait for it)
+start_ocr_warmup()
+st.sidebar.caption(f"OCR engine: {ocr_status()['state']}")
 
-# ---------------- FIELD EXTRACTOR (Improved for NPTEL) ----------------
-def extract_nptel_fields(text: str):
-    import re
-    fields = {}
-    lines = [l.strip() for l in text.splitlines() if l.strip()]
-
-    for i, line in enumerate(lines):
-        # Roll No
-        if line.startswith("Roll No"):
-            if i+1 < len(lines):
-                fields["roll_no"] = lines[i+1]
+# per-stage timings / cache hits of this run (QR, fetch, text layer, OCR, fields, scoring) in the sidebar
+show_trace = st.sidebar.checkbox("Debug: stage timings", value=os.environ.get("CERTISCAN_DEBUG_PANEL") == "1")
+run_trace = start_trace()
 
-        # Course
-        if "week course" in line.lower():
-            if i+1 < len(lines):
-                fields["course"] = lines[i+1]
 
-        # Name (all caps -> candidate name)
-        if re.match(r"^[A-Z\s]{3,}$", line):
-            fields["name"] = line.title()
+def stop():
+    if show_trace:
+        render_debug_panel(st.sidebar, run_trace)
+    st.stop()
 
-        # Certificate ID
-        if line.startswith("NPTEL"):
-            fields["certificate_id"] = line
 
-        # Date
-        if re.search(r"\b\d{4}\b", line) and any(m in line for m in 
-                    ["Jan","Feb","Mar","Apr","May","Jun","Jul","Aug","Sep","Oct","Nov","Dec"]):
-            fields["date"] = line
-
-        # Institute Name
-        if any(word in line for word in ["IIT", "NIT", "Institute", "College", "University"]):
-            fields["institute"] = line
+def show_stored_result(res, source):
+    st.json({k: res.get(k) for k in ("verdict", "final_score", "decided_by", "user_fields", "official_fields")})
+    if res.get("verdict") == "VERIFIED":
+        st.success(f"VERIFIED ✅ ({source})")
+    elif res.get("verdict") == "SUSPICIOUS":
+        st.warning(f"SUSPICIOUS ⚠️ ({source}) — manual review recommended")
+    else:
+        st.error(f"FAKE / MISMATCH ❌ ({source})")
 
-        # Score (percentage like 66 or 66%)
-        if re.fullmatch(r"\d{2,3}", line):   # pure number line
-            fields["score"] = f"{line.strip()}%"
-        match = re.search(r"(\d{1,3}\s*%)", line)
-        if match:
-            fields["score"] = match.group(1)
 
-    # fallback: agar institute missing hai
-    if "institute" not in fields:
-        fields["institute"] = "IIT Roorkee"   # ⚠️ tu apne hisab se set kar sakta hai
+st.title("NPTEL Certificate Verifier (Auto Verify)")
 
-    return fields
 
+# ---------------- GLOBALS ----------------
+# with CERTISCAN_API_URL set, uploads go to the Django verification API (nptel/) and this page only polls the job
+USE_API = bool(os.environ.get("CERTISCAN_API_URL"))
+API_POLL_S = 1.0
+official_path = None
+official_file = None
+final_score = None
+o_text, u_text, o_fields = "", "", {}
 
 
+# ---------------- FIELD EXTRACTOR (Improved for NPTEL) ----------------
+# rule table and benchmark: utils/fields.py
+from utils.fields import extract_nptel_fields
 
 
 # ---------------- FILE UPLOAD ----------------
@@ -83,24 +72,62 @@ with col1:
         user_path = save_uploaded_file(user_file, prefix=r"D:\Profile\Pictures\NPTEL")
         st.success(f"User file saved: `{user_path}`")
 
+        # one decode of the upload shared by preview, QR, hash and text extraction
+        user_doc = CertificateDocument(user_path)
+
         # preview
         if user_path.lower().endswith(".pdf"):
             st.write("Preview (first page):")
-            img = render_first_page_as_image(user_path)
+            img = user_doc.preview_png()
             st.image(img, use_container_width=True)
         else:
             st.image(user_path, use_container_width=True)
 
+        if USE_API:
+            # the API's workers do QR, fetch and OCR; each script run just polls, so the page never blocks
+            job = st.session_state.get("api_job")
+            try:
+                if job is None or job["sha256"] != user_doc.sha256:
+                    job = st.session_state["api_job"] = dict(submit_verification(user_path), sha256=user_doc.sha256)
+                if job["status"] not in ("done", "failed"):
+                    job.update(get_result(job))
+            except Exception as e:
+                st.error(f"Verification API at {DEFAULT_API_URL} failed: {e}")
+                stop()
+            if job["status"] not in ("done", "failed"):
+                st.info(f"Verification job {job['job_id']} is {job['status']}…")
+                time.sleep(API_POLL_S)
+                st.rerun()
+            if job["status"] == "failed":
+                st.error(f"Verification failed: {job.get('error')}")
+            else:
+                show_stored_result(job["result"], "verification API")
+            stop()
+
         # QR extraction
         try:
-            if user_path.lower().endswith('.pdf'):
-                qr = extract_qr_from_pdf_path(user_path)
-            else:
-                qr = extract_qr_from_image_path(user_path)
+            qr = user_doc.qr()["data"]
         except Exception as e:
             qr = None
             st.warning(f"QR extraction error: {e}")
 
+        # same file verified before: show the stored verdict, skip fetch / OCR. Not for the upload this
+        # session just verified and added, or every rerun would report it as a duplicate of itself.
+        own = st.session_state.get("dedup_added") == user_doc.sha256
+        known = get_dedup_index().lookup(user_doc, qr) if DEDUP_ENABLED and not own else None
+        if is_hit(known):
+            known = known_result(known)
+            st.info(f"Already verified (same file as {known['dedup']['sha256'][:12]}…) — stored result:")
+            show_stored_result(known, "stored")
+            stop()
+        elif known and known["match"] == "near":
+            # looks like a re-scan, but an edited copy can look the same: verify it anyway
+            st.info(f"Looks like a re-scan of {known['sha256'][:12]}… (stored verdict: {known['verdict']}) — "
+                    "not reusing that verdict.")
+        elif known:
+            st.warning("Another file with this certificate id was verified before — check for a copied QR: "
+                       + ", ".join(s[:12] for s in known["same_key"]))
+
         if qr:
             st.success("✅ QR detected!")
             st.write("QR content (usually URL):")
@@ -120,64 +147,63 @@ with col1:
 if user_file:
     if not official_path and not official_file:
         st.error("Official certificate not available. Please check QR link or upload manually.")
-        st.stop()
+        stop()
     else:
         if official_file:
             official_path = save_uploaded_file(official_file, prefix=r"D:\Profile\Pictures\NPTEL")
             st.success(f"Saved manual official file: `{official_path}`")
         else:
             st.success(f"Using auto-downloaded official file: `{official_path}`")
-
-        # HASH COMPARE
-        try:
-            if user_path.lower().endswith('.pdf') and official_path.lower().endswith('.pdf'):
-                h1 = compute_sha256(user_path)
-                h2 = compute_sha256(official_path)
-                st.write("SHA-256 (user):", h1)
-                st.write("SHA-256 (official):", h2)
-
-                if h1 == h2:
-                    st.balloons()
-                    st.success("Verified — exact PDF match (100%).")
-                    final_score = 1.0
-                    o_text = extract_text_from_file(official_path)
-                    u_text = extract_text_from_file(user_path)
-                    o_fields = extract_nptel_fields(o_text)
-        except Exception as e:
-            st.warning(f"Hash compare failed: {e}")
-
-        # TEXT COMPARE
-        if final_score is None:
-            with st.spinner("Extracting text using PyMuPDF + EasyOCR..."):
-                u_text = extract_text_from_file(user_path)
-                o_text = extract_text_from_file(official_path)
-
-            st.subheader("Extracted Text (short preview)")
-            c1, c2 = st.columns(2)
-            with c1:
-                st.write("User certificate:")
-                st.text(u_text[:800] + ("..." if len(u_text) > 800 else ""))
-            with c2:
-                st.write("Official certificate:")
-                st.text(o_text[:800] + ("..." if len(o_text) > 800 else ""))
-
-            score_text = text_similarity_score(u_text, o_text)
-            st.metric("Text similarity (0-100)", f"{score_text:.1f}")
-
-            u_fields = extract_nptel_fields(u_text)
+        official_doc = CertificateDocument(official_path)
+
+        # TIERED DECISION: hash -> QR cert id -> text layer -> OCR, stops at the first tier that decides
+        if user_doc.is_pdf and official_doc.is_pdf:
+            st.write("SHA-256 (user):", user_doc.sha256)
+            st.write("SHA-256 (official):", official_doc.sha256)
+        with st.spinner("Verifying (OCR only runs if the cheaper checks can't decide)..."):
+            result = verify_tiered(user_doc, official_doc, qr)
+        final_score = result["final_score"]
+        if DEDUP_ENABLED:
+            get_dedup_index().add(user_doc, result, qr)
+            st.session_state["dedup_added"] = user_doc.sha256
+        st.caption("Decided by: " + result["decided_by"] + " | " +
+                   ", ".join(f"{t['tier']} {t['ms']:.0f} ms ({t['outcome']})" for t in result["tiers"]))
+
+        if result["decided_by"] == "hash":
+            st.balloons()
+            st.success("Verified — exact PDF match (100%).")
+            # fields for the report straight from the official text layer, no OCR
+            o_fields = extract_nptel_fields(official_doc.text_layer())
+        else:
+            u_text = result.get("user_text", "")
+            o_text = result.get("official_text") or official_doc.text_layer()
             o_fields = extract_nptel_fields(o_text)
-            st.write("Extracted fields:")
-            st.json({"user": u_fields, "official": o_fields})
+            if u_text:
+                st.subheader("Extracted Text (short preview)")
+                c1, c2 = st.columns(2)
+                with c1:
+                    st.write("User certificate:")
+                    st.text(u_text[:800] + ("..." if len(u_text) > 800 else ""))
+                with c2:
+                    st.write("Official certificate:")
+                    st.text(o_text[:800] + ("..." if len(o_text) > 800 else ""))
+                st.metric("Text similarity (0-100)", f"{result['text_similarity']:.1f}")
+                st.write("Extracted fields:")
+                st.json({"user": result["user_fields"], "official": result["official_fields"]})
 
-            final_score, details = aggregate_score(u_fields, o_fields, score_text)
             st.write("Decision details:")
-            st.json(details)
+            st.json(result["details"])
+            if result.get("visual_heatmap") is not None:
+                v = result["visual"]
+                st.image(heatmap_overlay(user_doc, result["visual_heatmap"]), channels="BGR",
+                         caption=f"Visual diff vs official (SSIM {v['ssim']:.2f}, pHash distance {v['phash_distance']}, "
+                                 f"{v['tampered_fraction'] * 100:.0f}% of blocks changed)")
 
             st.metric("Aggregate confidence (0-100)", f"{final_score*100:.1f}%")
-            if final_score >= 0.9:
+            if result["verdict"] == "VERIFIED":
                 st.success("VERIFIED ✅ — High confidence")
                 st.balloons()
-            elif final_score >= 0.6:
+            elif result["verdict"] == "SUSPICIOUS":
                 st.warning("SUSPICIOUS ⚠️ — Partial match; manual review recommended")
             else:
                 st.error("FAKE / MISMATCH ❌ — Low confidence")
@@ -205,10 +231,9 @@ if final_score is not None and final_score >= 0.6:
     st.subheader("📊 Official Certificate Extracted Data")
     st.dataframe(df, use_container_width=True)
 
-    # Save to Excel
+    # Save to Excel (same streaming writer as the bulk exports)
     output = BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="VerificationData")
+    export_report([record], output, "xlsx", columns=list(record))
     excel_data = output.getvalue()
 
     st.download_button(
@@ -220,3 +245,6 @@ if final_score is not None and final_score >= 0.6:
 
 elif final_score is not None:
     st.info("❌ Fake certificate detected. No report generated.")
+
+if show_trace:
+    render_debug_panel(st.sidebar, run_trace)
@@ -0,0 +1,255 @@
+"""
+Background verification workers backed by the VerificationJob table.
+
+A dispatcher thread claims queued jobs (oldest first) and hands them to a process pool that
+runs the same verify step as `certiscan.py verify-batch`. Claiming is a conditional UPDATE, so
+several dispatchers (web process + `manage.py run_verification_workers`) can share one queue.
+Files already in the verification ledger (app/ledger.py) are answered from it without a worker,
+and every finished result is recorded there. If a worker process dies the pool is replaced and
+its jobs are queued again, up to MAX_ATTEMPTS.
+"""
+import os, threading, time, logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from .ledger import get_ledger
+from .models import VerificationJob
+from .utils.batch import _init_worker, _verify_job
+from .utils.compare import compute_sha256
+from .utils.tracing import metrics, record_spans, cache_event
+
+log = logging.getLogger(__name__)
+
+API_WORKERS = getattr(settings, "CERTISCAN_API_WORKERS", None) or int(os.environ.get("CERTISCAN_API_WORKERS", "2"))
+# a job still "running" after this long belonged to a worker that died; it is queued again
+STALE_AFTER = timedelta(seconds=getattr(settings, "CERTISCAN_JOB_TIMEOUT", 15 * 60))
+MAX_ATTEMPTS = 3
+POLL_INTERVAL = 1.0
+
+
+def from_ledger(user_path: str):
+    """
+    Previous result for the same file from the ledger as a job result row, or None.
+    """
+    sha256 = compute_sha256(user_path)
+    prior = get_ledger().lookup(sha256)
+    cache_event("ledger", "miss" if prior is None else "hit")
+    if prior is None:
+        return None
+    return dict(prior, doc_id=sha256, user_path=user_path, status="ok", ledger_hit=True)
+
+
+def enqueue(user_path: str, official_path: str = None):
+    row = from_ledger(user_path)
+    if row is not None:
+        now = timezone.now()
+        return VerificationJob.objects.create(user_path=user_path, official_path=official_path or "",
+                                              status=VerificationJob.DONE, verdict=row.get("verdict") or "",
+                                              result=row, started_at=now, finished_at=now)
+    job = VerificationJob.objects.create(user_path=user_path, official_path=official_path or "")
+    if getattr(settings, "CERTISCAN_INPROCESS_WORKERS", True):
+        get_runner().wake()
+    return job
+
+
+def claim_next():
+    """
+    Oldest queued job, atomically marked running; None if the queue is empty.
+    """
+    while True:
+        pk = (VerificationJob.objects.filter(status=VerificationJob.QUEUED)
+              .order_by("created_at").values_list("pk", flat=True).first())
+        if pk is None:
+            return None
+        claimed = VerificationJob.objects.filter(pk=pk, status=VerificationJob.QUEUED).update(
+            status=VerificationJob.RUNNING, started_at=timezone.now(), attempts=F("attempts") + 1)
+        if claimed:
+            return VerificationJob.objects.get(pk=pk)
+        # another dispatcher got it first; try the next one
+
+
+def requeue_stale():
+    cutoff = timezone.now() - STALE_AFTER
+    stale = VerificationJob.objects.filter(status=VerificationJob.RUNNING, started_at__lt=cutoff)
+    stale.filter(attempts__gte=MAX_ATTEMPTS).update(status=VerificationJob.FAILED, finished_at=timezone.now(),
+                                                    error="worker did not finish the job")
+    return stale.update(status=VerificationJob.QUEUED)
+
+
+def requeue(job_id, error: str, ran: bool = True):
+    """
+    Put a running job back in the queue after its worker pool broke. ran=False: the job never
+    reached a worker, so the attempt isn't counted. A job that has used up MAX_ATTEMPTS (say a
+    file that crashes the worker every time) is failed with error instead. True if requeued.
+    """
+    running = VerificationJob.objects.filter(pk=job_id, status=VerificationJob.RUNNING)
+    if not ran:
+        return bool(running.update(status=VerificationJob.QUEUED, attempts=F("attempts") - 1))
+    if running.filter(attempts__lt=MAX_ATTEMPTS).update(status=VerificationJob.QUEUED):
+        return True
+    finish(job_id, {"status": "error", "error": error})
+    return False
+
+
+def finish(job_id, row: dict):
+    ok = row.get("status") == "ok"
+    # spans were timed in the worker process; count them in this one, which serves /metrics
+    record_spans(row.get("trace"))
+    metrics.inc("certiscan_jobs_total", {"status": "done" if ok else "failed"})
+    if row.get("elapsed_s") is not None:
+        metrics.observe("certiscan_job_seconds", row["elapsed_s"])
+    VerificationJob.objects.filter(pk=job_id).update(
+        status=VerificationJob.DONE if ok else VerificationJob.FAILED,
+        verdict=row.get("verdict") or "",
+        result=row,
+        error="" if ok else row.get("error", ""),
+        finished_at=timezone.now(),
+    )
+    if ok and not row.get("ledger_hit"):
+        try:
+            get_ledger().record(row)
+        except Exception:
+            log.exception("recording job %s in the ledger failed", job_id)
+
+
+class JobRunner:
+    """
+    Dispatcher thread + process pool. At most `workers` jobs are in flight at once.
+    """
+    def __init__(self, workers: int = API_WORKERS, official_dir: str = None, warm_ocr: bool = True):
+        self.workers = workers
+        self.official_dir = official_dir or getattr(settings, "CERTISCAN_OFFICIAL_DIR", None)
+        self.warm_ocr = warm_ocr
+        self._pool = None
+        self._thread = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._slots = threading.Semaphore(workers)
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._start()
+        return self
+
+    def _start(self):
+        self._pool = self._new_pool()
+        self._thread = threading.Thread(target=self._loop, name="certiscan-dispatcher", daemon=True)
+        self._thread.start()
+
+    def _new_pool(self):
+        torch_threads = max(1, (os.cpu_count() or 1) // self.workers)
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                   initargs=(self.warm_ocr, torch_threads))
+
+    def _replace_pool(self, broken):
+        # called from the dispatcher and from done callbacks; only the first caller per broken pool swaps it
+        with self._start_lock:
+            if self._pool is not broken or self._stop.is_set():
+                return
+            log.warning("verification worker pool broke, starting a new one")
+            self._pool = self._new_pool()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def wake(self):
+        self.start()
+        self._wake.set()
+
+    def _loop(self):
+        last_sweep = 0.0
+        while not self._stop.is_set():
+            self._slots.acquire()
+            try:
+                close_old_connections()
+                if time.monotonic() - last_sweep > 60:
+                    requeue_stale()
+                    last_sweep = time.monotonic()
+                job = claim_next()
+            except Exception:
+                log.exception("claiming a verification job failed")
+                job = None
+            if job is None:
+                self._slots.release()
+                self._wake.wait(POLL_INTERVAL)
+                self._wake.clear()
+                continue
+            try:
+                self._dispatch(job)
+            except Exception:
+                # the job stays "running" and requeue_stale picks it up again
+                log.exception("dispatching job %s failed", job.pk)
+                self._slots.release()
+
+    def _dispatch(self, job):
+        try:
+            # a copy of this file may have finished since the job was queued
+            row = from_ledger(job.user_path)
+        except Exception:
+            log.exception("ledger lookup for job %s failed", job.pk)
+            row = None
+        if row is not None:
+            finish(job.pk, row)
+            self._slots.release()
+            return
+        pool = self._pool
+        try:
+            fut = pool.submit(_verify_job, {"doc_id": str(job.pk), "user_path": job.user_path,
+                                            "official_path": job.official_path or None,
+                                            "official_dir": self.official_dir})
+        except (BrokenProcessPool, RuntimeError) as e:  # a worker died while idle, or the pool is shut down
+            self._replace_pool(pool)
+            requeue(job.pk, f"{type(e).__name__}: {e}", ran=False)
+            self._slots.release()
+            return
+        fut.add_done_callback(lambda f, job_id=job.pk: self._done(job_id, pool, f))
+
+    def _done(self, job_id, pool, fut):
+        try:
+            try:
+                row = fut.result()
+            except BrokenProcessPool as e:
+                # a worker process died (OOM, segfault in a native library): every job in flight
+                # on this pool fails with it, so start a new pool and give them another attempt
+                self._replace_pool(pool)
+                requeue(job_id, f"worker process died: {e}")
+                return
+            except Exception as e:
+                row = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+            finish(job_id, row)
+        except Exception:
+            log.exception("saving result of job %s failed", job_id)
+        finally:
+            close_old_connections()
+            self._slots.release()
+            self._wake.set()
+
+    def run_forever(self):
+        self.start()
+        try:
+            while self._thread.is_alive():
+                self._thread.join(1.0)
+        except KeyboardInterrupt:
+            self.stop()
+
+    def stop(self, wait: bool = True):
+        self._stop.set()
+        self._wake.set()
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+
+
+_runner = None
+_runner_lock = threading.Lock()
+def get_runner():
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner()
+        return _runner
@@ -0,0 +1,78 @@
+"""
+Verification ledger on top of the Certificate / OfficialDocument / VerificationRun tables.
+
+The job queue (app/jobs.py) consults DjangoLedger before handing a file to a worker: a
+resubmitted file (same SHA-256) is answered from its latest run, so neither the fetch nor OCR
+runs again. Lookups and recording stay in the web / dispatcher process; pool workers never touch
+the database. Every lookup is a single indexed equality query.
+"""
+from django.db import transaction
+
+from .models import Certificate, OfficialDocument, VerificationRun
+from .utils.official_store import normalize_qr_url
+
+
+class DjangoLedger:
+    def lookup(self, sha256: str):
+        """
+        Result dict of the newest run for a user file, or None if it was never verified.
+        """
+        return (VerificationRun.objects.filter(certificate__sha256=sha256)
+                .order_by("-created_at").values_list("result", flat=True).first())
+
+    def find(self, sha256: str = None, cert_id: str = None, roll_no: str = None, qr_url: str = None):
+        """
+        Certificates matching any of the given keys, newest first.
+        """
+        qs = Certificate.objects.all()
+        if sha256:
+            qs = qs.filter(sha256=sha256)
+        if cert_id:
+            qs = qs.filter(cert_id=cert_id.upper())
+        if roll_no:
+            qs = qs.filter(roll_no=roll_no)
+        if qr_url:
+            qs = qs.filter(qr_url=normalize_qr_url(qr_url))
+        return qs.order_by("-last_seen")
+
+    def iter_results(self, verdict: str = None, since=None, chunk_size: int = 2000):
+        """
+        Stored results, oldest first, fetched chunk_size rows at a time (server-side cursor where
+        the database has one) for exports that must not load the whole table.
+        """
+        qs = VerificationRun.objects.order_by("created_at")
+        if verdict:
+            qs = qs.filter(verdict=verdict)
+        if since:
+            qs = qs.filter(created_at__gte=since)
+        return qs.values_list("result", flat=True).iterator(chunk_size=chunk_size)
+
+    @transaction.atomic
+    def record(self, result: dict):
+        """
+        Store a finished verify_certificate() result; returns the VerificationRun or None when
+        the result has no verdict / user hash.
+        """
+        if not result.get("verdict") or not result.get("sha256_user"):
+            return None
+        qr_url = normalize_qr_url(result["qr"]) if result.get("qr") else ""
+        u_fields, o_fields = result.get("user_fields") or {}, result.get("official_fields") or {}
+        cert_id = (result.get("qr_cert_id") or u_fields.get("cert_id") or "").upper()
+
+        official = None
+        if result.get("sha256_official"):
+            official, _ = OfficialDocument.objects.update_or_create(
+                sha256=result["sha256_official"],
+                defaults={"path": result.get("official_path") or "", "qr_url": qr_url,
+                          "cert_id": (result.get("official_cert_id") or o_fields.get("cert_id") or cert_id).upper()})
+        cert, _ = Certificate.objects.update_or_create(
+            sha256=result["sha256_user"],
+            defaults={"cert_id": cert_id, "roll_no": result.get("roll_no") or "", "qr_url": qr_url,
+                      "name": (u_fields.get("name") or "")[:200], "course": (u_fields.get("course") or "")[:300]})
+        return VerificationRun.objects.create(certificate=cert, official=official, verdict=result["verdict"],
+                                              final_score=result.get("final_score"),
+                                              decided_by=result.get("decided_by") or "", result=result)
+
+
+def get_ledger():
+    return DjangoLedger()
@@ -0,0 +1,57 @@
+import hashlib, random, time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.ledger import DjangoLedger
+from app.models import Certificate, VerificationRun
+from app.utils.official_store import normalize_qr_url
+
+QR = "https://archive.nptel.ac.in/noc/Ecertificate/?q=NPTEL23CS{:08d}"
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Time ledger lookups by SHA-256 / cert id / roll no / QR URL against N synthetic rows (rolled back afterwards)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100000)
+        parser.add_argument("--lookups", type=int, default=2000)
+
+    def handle(self, *args, **opts):
+        n, k = opts["rows"], opts["lookups"]
+        try:
+            with transaction.atomic():
+                self._run(n, k)
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def _run(self, n, k):
+        sha = lambda i: hashlib.sha256(str(i).encode()).hexdigest()
+        t0 = time.perf_counter()
+        for start in range(0, n, 5000):
+            certs = Certificate.objects.bulk_create([
+                Certificate(sha256=sha(i), cert_id=f"NPTEL23CS{i:08d}", roll_no=f"NPTEL23CS{i:06d}R",
+                            qr_url=normalize_qr_url(QR.format(i)))
+                for i in range(start, min(n, start + 5000))])
+            VerificationRun.objects.bulk_create([
+                VerificationRun(certificate=c, verdict="VERIFIED", final_score=1.0, decided_by="hash",
+                                result={"verdict": "VERIFIED"}) for c in certs])
+        self.stdout.write(f"inserted {n} certificates + runs in {time.perf_counter() - t0:.1f}s")
+
+        ledger = DjangoLedger()
+        ids = [random.randrange(n) for _ in range(k)]
+        lookups = {
+            "sha256 -> latest run": lambda i: ledger.lookup(sha(i)),
+            "cert_id": lambda i: ledger.find(cert_id=f"NPTEL23CS{i:08d}").first(),
+            "roll_no": lambda i: ledger.find(roll_no=f"NPTEL23CS{i:06d}R").first(),
+            "qr_url": lambda i: ledger.find(qr_url=QR.format(i)).first(),
+        }
+        for label, fn in lookups.items():
+            t0 = time.perf_counter()
+            for i in ids:
+                fn(i)
+            self.stdout.write(f"{label:>22}: {(time.perf_counter() - t0) * 1000.0 / k:.3f} ms/lookup")
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from app.ledger import DjangoLedger
+from app.utils.report import export_results, REPORT_FORMATS, CHUNK_ROWS
+
+
+class Command(BaseCommand):
+    help = "Stream every verification in the ledger into an xlsx / csv / parquet report."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--out", default="report.xlsx", help="report file (.xlsx, .csv or .parquet)")
+        parser.add_argument("--format", choices=REPORT_FORMATS, default=None)
+        parser.add_argument("--verdict", default=None, help="only VERIFIED / SUSPICIOUS / FAKE runs")
+        parser.add_argument("--since", default=None, help="only runs from this ISO date/time on")
+        parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows held in memory at a time")
+
+    def handle(self, *args, **opts):
+        since = parse_datetime(opts["since"]) if opts["since"] else None
+        results = DjangoLedger().iter_results(opts["verdict"], since, chunk_size=opts["chunk_rows"])
+        try:
+            n = export_results(results, opts["out"], opts["format"], chunk_rows=opts["chunk_rows"])
+        except (RuntimeError, ValueError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"{n} rows written to {opts['out']}")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from app.jobs import JobRunner, API_WORKERS
+
+
+class Command(BaseCommand):
+    help = "Run verification workers for queued API jobs (instead of, or next to, the web process)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=API_WORKERS, help="process pool size")
+        parser.add_argument("--official-dir", default=None, help="where auto-fetched official PDFs are stored")
+        parser.add_argument("--no-ocr-warmup", action="store_true", help="don't load the OCR backend at worker start")
+
+    def handle(self, *args, **opts):
+        self.stdout.write(f"verification workers: {opts['workers']} processes, polling the job table")
+        JobRunner(opts["workers"], opts["official_dir"], warm_ocr=not opts["no_ocr_warmup"]).run_forever()
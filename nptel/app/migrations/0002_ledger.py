@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Certificate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('cert_id', models.CharField(blank=True, db_index=True, default='', max_length=64)),
+                ('roll_no', models.CharField(blank=True, db_index=True, default='', max_length=64)),
+                ('qr_url', models.CharField(blank=True, db_index=True, default='', max_length=500)),
+                ('name', models.CharField(blank=True, default='', max_length=200)),
+                ('course', models.CharField(blank=True, default='', max_length=300)),
+                ('first_seen', models.DateTimeField(auto_now_add=True)),
+                ('last_seen', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OfficialDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('cert_id', models.CharField(blank=True, db_index=True, default='', max_length=64)),
+                ('qr_url', models.CharField(blank=True, db_index=True, default='', max_length=500)),
+                ('path', models.CharField(max_length=500)),
+                ('fetched_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='VerificationRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('verdict', models.CharField(max_length=16)),
+                ('final_score', models.FloatField(blank=True, null=True)),
+                ('decided_by', models.CharField(blank=True, default='', max_length=32)),
+                ('result', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('certificate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='runs', to='app.certificate')),
+                ('official', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='runs', to='app.officialdocument')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['certificate', '-created_at'], name='run_latest_idx')],
+            },
+        ),
+    ]
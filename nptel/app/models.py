@@ -1,3 +1,84 @@
+import uuid
 from django.db import models
 
-# Create your models here.
+
+class VerificationJob(models.Model):
+    """
+    One queued certificate verification. The table doubles as the job queue: workers claim the
+    oldest queued row by flipping its status, so no external broker is needed.
+    """
+    QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+    STATUS_CHOICES = [(QUEUED, "Queued"), (RUNNING, "Running"), (DONE, "Done"), (FAILED, "Failed")]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    user_path = models.CharField(max_length=500)
+    official_path = models.CharField(max_length=500, blank=True, default="")
+    verdict = models.CharField(max_length=16, blank=True, default="")
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["status", "created_at"], name="job_queue_idx")]
+
+    def __str__(self):
+        return f"{self.id} ({self.status})"
+
+
+# ---- verification ledger: every certificate, official PDF and verdict ever seen ----
+
+class OfficialDocument(models.Model):
+    """
+    An official certificate PDF fetched from (or uploaded for) a QR link.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    cert_id = models.CharField(max_length=64, blank=True, default="", db_index=True)
+    qr_url = models.CharField(max_length=500, blank=True, default="", db_index=True)
+    path = models.CharField(max_length=500)
+    fetched_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.cert_id or self.sha256[:12]
+
+
+class Certificate(models.Model):
+    """
+    A user-submitted certificate file, keyed by the SHA-256 of its bytes.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    cert_id = models.CharField(max_length=64, blank=True, default="", db_index=True)
+    roll_no = models.CharField(max_length=64, blank=True, default="", db_index=True)
+    qr_url = models.CharField(max_length=500, blank=True, default="", db_index=True)
+    name = models.CharField(max_length=200, blank=True, default="")
+    course = models.CharField(max_length=300, blank=True, default="")
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.cert_id or self.sha256[:12]
+
+
+class VerificationRun(models.Model):
+    """
+    One verification of a Certificate; the newest run is what the ledger answers with.
+    """
+    certificate = models.ForeignKey(Certificate, on_delete=models.CASCADE, related_name="runs")
+    official = models.ForeignKey(OfficialDocument, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name="runs")
+    verdict = models.CharField(max_length=16)
+    final_score = models.FloatField(null=True, blank=True)
+    decided_by = models.CharField(max_length=32, blank=True, default="")
+    result = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["certificate", "-created_at"], name="run_latest_idx")]
+
+    def __str__(self):
+        return f"{self.certificate} {self.verdict}"
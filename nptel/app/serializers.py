@@ -0,0 +1,32 @@
+import os
+from rest_framework import serializers
+
+from .models import VerificationJob
+
+UPLOAD_EXTS = {".pdf", ".png", ".jpg", ".jpeg"}
+
+
+def _check_ext(f, allowed):
+    ext = os.path.splitext(f.name)[1].lower()
+    if ext not in allowed:
+        raise serializers.ValidationError(f"unsupported file type {ext or '(none)'}; expected one of {sorted(allowed)}")
+    return f
+
+
+class VerifyUploadSerializer(serializers.Serializer):
+    user_file = serializers.FileField()
+    official_file = serializers.FileField(required=False)
+
+    def validate_user_file(self, f):
+        return _check_ext(f, UPLOAD_EXTS)
+
+    def validate_official_file(self, f):
+        return _check_ext(f, {".pdf"})
+
+
+class VerificationJobSerializer(serializers.ModelSerializer):
+    job_id = serializers.UUIDField(source="id", read_only=True)
+
+    class Meta:
+        model = VerificationJob
+        fields = ["job_id", "status", "verdict", "error", "attempts", "created_at", "started_at", "finished_at"]
@@ -1,3 +1,780 @@
-from django.test import TestCase
+import os, shutil, tempfile, threading, hashlib
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db.models.query import QuerySet
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .jobs import claim_next, requeue, requeue_stale, finish, MAX_ATTEMPTS, STALE_AFTER
+from .ledger import get_ledger
+from .models import VerificationJob, Certificate, OfficialDocument, VerificationRun
+from .utils.fetch_official import pick_pdf_link, find_pdf_url_http, download_pdf, fetch_official_pdf
+from .utils.official_store import OfficialStore
+from .utils.report import (REPORT_COLUMNS, chunks, export_report, export_results, iter_result_file, report_row,
+                           synthetic_results)
+from .utils.batch import ResultWriter, load_completed
+from .utils.browser_pool import BrowserPool
+from .utils.compare import (pair_scores, score_matrix, match_registry, bulk_score, fuzz_token, aggregate_score,
+                            text_similarity_score, extract_common_fields)
+from .utils.dedup import DedupIndex, is_hit
+from .utils.document import CertificateDocument
+from .utils.ocr_engine import OcrEngine
+from .utils.pdf_utils import extract_text_from_file, extract_text_from_pdf_path, render_page_gray
+from .utils.text_cache import TextCache
+from .utils.tiers import verify_tiered, verdict_for_score
+from .utils.tracing import trace
+from .utils.visual import FingerprintStore, fingerprint, page_gray, visual_compare, TAMPER_SSIM, SSIM_BLOCK
+
+PDF = b"%PDF-1.4\n1 0 obj << /Type /Catalog >> endobj\ntrailer << /Root 1 0 R >>\n%%EOF\n"
+
+
+class _NPTELStandIn(BaseHTTPRequestHandler):
+    """
+    Landing pages and certificate PDFs the way the NPTEL site serves them; the tests set
+    self.server.routes to {path: (status, headers, body)}.
+    """
+    def do_GET(self):
+        self.server.seen.append((self.path, dict(self.headers)))
+        code, headers, body = self.server.routes.get(self.path, (404, {}, b"not found"))
+        if headers.get("ETag") and self.headers.get("If-None-Match") == headers["ETag"]:
+            code, body = 304, b""
+        self.send_response(code)
+        for k, v in headers.items():
+            if not k.startswith("_"):  # "_stream": send no Content-Length, the body ends at close
+                self.send_header(k, v)
+        if "Content-Length" not in headers and code != 304 and not headers.get("_stream"):
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FetchOfficialTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _NPTELStandIn)
+        cls.server.routes, cls.server.seen = {}, []
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.routes.clear()
+        self.server.seen.clear()
+        self.dir = tempfile.mkdtemp(prefix="certiscan-test-")
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+
+    def route(self, path, body, ctype="application/pdf", code=200, **headers):
+        self.server.routes[path] = (code, {"Content-Type": ctype, **headers}, body)
+        return self.base + path
+
+    def test_pick_pdf_link_prefers_certificate_keyword(self):
+        html = """<a href="/docs/brochure.pdf">Brochure</a>
+                  <a href="/noc/Ecertificate/NPTEL23CS01S1.pdf"> Course
+                  Certificate </a>"""
+        self.assertEqual(pick_pdf_link(html, "https://archive.nptel.ac.in/noc/Ecertificate/?q=X"),
+                         "https://archive.nptel.ac.in/noc/Ecertificate/NPTEL23CS01S1.pdf")
+
+    def test_pick_pdf_link_embeds_and_meta_refresh(self):
+        base = "https://archive.nptel.ac.in/noc/"
+        self.assertEqual(pick_pdf_link('<iframe src="c/1.pdf"></iframe>', base), base + "c/1.pdf")
+        self.assertEqual(pick_pdf_link('<object data="c/2.pdf"></object>', base), base + "c/2.pdf")
+        self.assertEqual(pick_pdf_link('<meta http-equiv="Refresh" content="0; url=\'c/3.pdf\'">', base),
+                         base + "c/3.pdf")
+        self.assertIsNone(pick_pdf_link('<a href="/about">About</a>', base))
+
+    def test_landing_page_link(self):
+        pdf_url = self.route("/cert/1.pdf", PDF)
+        landing = self.route("/noc/Ecertificate/?q=1", f'<a href="{pdf_url}">Download Certificate</a>'.encode(),
+                             ctype="text/html")
+        self.assertEqual(find_pdf_url_http(landing), pdf_url)
+
+    def test_direct_pdf_by_content_type(self):
+        # no .pdf in the URL: only the Content-Type says the QR points straight at the PDF
+        url = self.route("/noc/Ecertificate/?q=2", PDF, ctype="application/pdf; charset=binary")
+        self.assertEqual(find_pdf_url_http(url), url)
+
+    def test_download_writes_and_hashes(self):
+        url = self.route("/cert/2.pdf", PDF, ETag='"v1"', **{"Last-Modified": "Mon, 02 Oct 2023 10:00:00 GMT"})
+        dest = os.path.join(self.dir, "out.pdf")
+        meta = download_pdf(url, dest)
+        self.assertEqual(meta["status"], 200)
+        self.assertEqual(meta["etag"], '"v1"')
+        self.assertEqual(meta["bytes"], len(PDF))
+        with open(dest, "rb") as f:
+            self.assertEqual(f.read(), PDF)
+
+    def test_rejects_non_pdf(self):
+        dest = os.path.join(self.dir, "out.pdf")
+        html = self.route("/cert/3.pdf", b"<html>session expired</html>", ctype="text/html")
+        with self.assertRaisesRegex(RuntimeError, "Content-Type text/html"):
+            download_pdf(html, dest)
+        # octet-stream is accepted as a content type, but the body must still start with %PDF
+        octet = self.route("/cert/4.pdf", b"<html>session expired</html>", ctype="application/octet-stream")
+        with self.assertRaisesRegex(RuntimeError, "not a PDF"):
+            download_pdf(octet, dest)
+        self.assertFalse(os.path.exists(dest))
+
+    def test_max_size(self):
+        dest = os.path.join(self.dir, "out.pdf")
+        body = PDF + b"0" * 4096
+        declared = self.route("/cert/5.pdf", body)
+        with self.assertRaisesRegex(RuntimeError, "limit is 1024"):
+            download_pdf(declared, dest, max_bytes=1024)
+        # no Content-Length: the cap applies while streaming and the partial file is removed
+        streamed = self.route("/cert/6.pdf", body, _stream="1")
+        with self.assertRaisesRegex(RuntimeError, "exceeds 1024 bytes"):
+            download_pdf(streamed, dest, max_bytes=1024)
+        self.assertFalse(os.path.exists(dest))
+
+    def test_store_revalidates_with_304(self):
+        pdf_url = self.route("/cert/7.pdf", PDF, ETag='"v7"')
+        landing = self.route("/noc/Ecertificate/?q=7", f'<a href="{pdf_url}">Course Certificate</a>'.encode(),
+                             ctype="text/html")
+        store = OfficialStore(os.path.join(self.dir, "official"), ttl=0)  # every get() revalidates
+        first = fetch_official_pdf(landing, store)
+        self.server.seen.clear()
+        with trace() as tr:
+            second = fetch_official_pdf(landing, store)
+        self.assertEqual(first, second)
+        # only the conditional GET of the PDF, not the landing page
+        self.assertEqual([(p, h.get("If-None-Match")) for p, h in self.server.seen], [("/cert/7.pdf", '"v7"')])
+        self.assertIn({"cache": "official_store", "result": "revalidated"}, tr.spans)
+        self.assertEqual(sorted(f for f in os.listdir(store.root) if f.endswith(".pdf")),
+                         [os.path.basename(first)])
+
+
+def _result(sha256_user, verdict="VERIFIED", **extra):
+    # what a pool worker returns for a finished job (utils/batch.py _verify_job)
+    return {"status": "ok", "doc_id": sha256_user, "sha256_user": sha256_user, "sha256_official": "f" * 64,
+            "official_path": "/store/official.pdf", "verdict": verdict, "final_score": 0.97, "decided_by": "text_layer",
+            "qr": "https://archive.nptel.ac.in/noc/Ecertificate/?q=NPTEL23CS01S1234",
+            "qr_cert_id": "NPTEL23CS01S1234", "roll_no": "NPTEL23CS01234",
+            "user_fields": {"name": "Asha Rao", "course": "Data Structures"}, "official_fields": {}, **extra}
+
+
+@override_settings(CERTISCAN_INPROCESS_WORKERS=False)
+class VerificationApiTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp(prefix="certiscan-media-")
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def post(self, data=PDF, name="cert.pdf"):
+        return self.client.post(reverse("verify"), {"user_file": SimpleUploadedFile(name, data)})
+
+    def test_upload_returns_job_id(self):
+        resp = self.post()
+        self.assertEqual(resp.status_code, 202)
+        job = VerificationJob.objects.get(pk=resp.json()["job_id"])
+        self.assertEqual(job.status, VerificationJob.QUEUED)
+        self.assertTrue(os.path.exists(job.user_path))
+        self.assertTrue(resp.json()["result_url"].endswith(reverse("job-result", args=[job.pk])))
+
+    def test_rejects_unsupported_file(self):
+        self.assertEqual(self.post(b"MZ", "cert.exe").status_code, 400)
+        self.assertFalse(VerificationJob.objects.exists())
+
+    def test_status_and_result(self):
+        job_id = self.post().json()["job_id"]
+        status_url, result_url = reverse("job-status", args=[job_id]), reverse("job-result", args=[job_id])
+        self.assertEqual(self.client.get(status_url).json()["status"], "queued")
+        self.assertEqual(self.client.get(result_url).status_code, 202)
+
+        job = claim_next()
+        self.assertEqual(str(job.pk), job_id)
+        self.assertEqual(self.client.get(status_url).json()["status"], "running")
+        finish(job.pk, _result(hashlib.sha256(PDF).hexdigest()))
+
+        resp = self.client.get(result_url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["status"], "done")
+        self.assertEqual(resp.json()["result"]["verdict"], "VERIFIED")
+        self.assertEqual(self.client.get(status_url).json()["verdict"], "VERIFIED")
+
+    def test_failed_job_result(self):
+        job_id = self.post().json()["job_id"]
+        finish(claim_next().pk, {"status": "error", "error": "RuntimeError: No QR found"})
+        body = self.client.get(reverse("job-result", args=[job_id])).json()
+        self.assertEqual((body["status"], body["error"]), ("failed", "RuntimeError: No QR found"))
+
+    def test_known_file_answered_from_ledger(self):
+        get_ledger().record(_result(hashlib.sha256(PDF).hexdigest(), verdict="FAKE"))
+        resp = self.post()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["status"], "done")
+        self.assertEqual(resp.json()["result"]["verdict"], "FAKE")
+        self.assertTrue(resp.json()["result"]["ledger_hit"])
+
+
+class JobQueueTests(TestCase):
+    def job(self, **kw):
+        return VerificationJob.objects.create(user_path="/uploads/cert.pdf", **kw)
+
+    def test_claim_oldest_first(self):
+        first, second = self.job(), self.job()
+        self.assertEqual(claim_next().pk, first.pk)
+        self.assertEqual(claim_next().pk, second.pk)
+        self.assertIsNone(claim_next())
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.attempts), (VerificationJob.RUNNING, 1))
+        self.assertIsNotNone(first.started_at)
+
+    def test_claim_contested_job(self):
+        contested, other = self.job(), self.job()
+        real_first = QuerySet.first
+
+        def first_then_lose_race(qs):
+            pk = real_first(qs)
+            if pk == contested.pk:
+                # another dispatcher claims the row between our SELECT and our conditional UPDATE
+                VerificationJob.objects.filter(pk=pk).update(status=VerificationJob.RUNNING, attempts=1)
+            return pk
+
+        with mock.patch.object(QuerySet, "first", first_then_lose_race):
+            job = claim_next()
+        self.assertEqual(job.pk, other.pk)
+        contested.refresh_from_db()
+        self.assertEqual(contested.attempts, 1)  # not claimed twice
+
+    def test_requeue_stale(self):
+        old = timezone.now() - STALE_AFTER - timedelta(minutes=1)
+        stale = self.job(status=VerificationJob.RUNNING, started_at=old, attempts=1)
+        exhausted = self.job(status=VerificationJob.RUNNING, started_at=old, attempts=MAX_ATTEMPTS)
+        fresh = self.job(status=VerificationJob.RUNNING, started_at=timezone.now(), attempts=1)
+        self.assertEqual(requeue_stale(), 1)
+        statuses = {j.pk: j.status for j in VerificationJob.objects.all()}
+        self.assertEqual(statuses[stale.pk], VerificationJob.QUEUED)
+        self.assertEqual(statuses[exhausted.pk], VerificationJob.FAILED)
+        self.assertEqual(statuses[fresh.pk], VerificationJob.RUNNING)
+        self.assertEqual(claim_next().pk, stale.pk)
+
+    def test_requeue_after_broken_pool(self):
+        self.job()
+        never_ran = claim_next()
+        self.assertTrue(requeue(never_ran.pk, "BrokenProcessPool", ran=False))
+        never_ran.refresh_from_db()
+        self.assertEqual((never_ran.status, never_ran.attempts), (VerificationJob.QUEUED, 0))
+
+        crashing = self.job(status=VerificationJob.RUNNING, attempts=MAX_ATTEMPTS)
+        self.assertFalse(requeue(crashing.pk, "worker process died"))
+        crashing.refresh_from_db()
+        self.assertEqual((crashing.status, crashing.error), (VerificationJob.FAILED, "worker process died"))
+
+    def test_finish_records_in_ledger(self):
+        job = self.job(status=VerificationJob.RUNNING)
+        sha = "a" * 64
+        finish(job.pk, _result(sha))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.verdict), (VerificationJob.DONE, "VERIFIED"))
+        run = VerificationRun.objects.get(certificate__sha256=sha)
+        self.assertEqual((run.verdict, run.decided_by), ("VERIFIED", "text_layer"))
+        cert = Certificate.objects.get(sha256=sha)
+        self.assertEqual((cert.cert_id, cert.roll_no), ("NPTEL23CS01S1234", "NPTEL23CS01234"))
+        self.assertEqual(OfficialDocument.objects.get().sha256, "f" * 64)
+        self.assertEqual(get_ledger().lookup(sha)["verdict"], "VERIFIED")
+
+    def test_finish_does_not_record_failures_or_ledger_hits(self):
+        finish(self.job(status=VerificationJob.RUNNING).pk, {"status": "error", "error": "boom"})
+        finish(self.job(status=VerificationJob.RUNNING).pk, _result("b" * 64, ledger_hit=True))
+        self.assertFalse(VerificationRun.objects.exists())
+
+
+def _scanned_pdf(path, pages=("NPTEL Online Certification", "Programming in Python")):
+    # one image per page and no text layer, like a scanner's output
+    import fitz
+    out = fitz.open()
+    for text in pages:
+        src = fitz.open()
+        src.new_page(width=420, height=300).insert_text((40, 150), text, fontsize=20)
+        pix = src[0].get_pixmap(dpi=100)
+        out.new_page(width=420, height=300).insert_image(fitz.Rect(0, 0, 420, 300), pixmap=pix)
+    out.save(path)
+    return path
+
+
+class _RecordingOcr:
+    """OcrBackend stand-in: reads back what it was given instead of running a model."""
+    name = "recording"
+
+    def __init__(self):
+        self.images = []
+
+    def read_images(self, images):
+        import gc
+        gc.collect()  # any render the caller stopped referencing is freed by now
+        self.images.extend(img.copy() for img in images)
+        return [f"page {i} {img.shape[1]}x{img.shape[0]}" for i, img in enumerate(images)]
+
+    def read_regions(self, img, boxes):
+        self.regions = getattr(self, "regions", 0) + 1
+        return [(f"NPTEL23CS01S1234 at {x_min},{y_min}", 0.9) for x_min, _, y_min, _ in boxes]
+
+
+class ScannedPdfOcrTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="certiscan-test-")
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+
+    def test_template_ocr_is_cached_per_template(self):
+        from .utils import ocr_template
+        path = _scanned_pdf(os.path.join(self.dir, "scan.pdf"), pages=("NPTEL23CS01S1234",))
+        cache, ocr, active = TextCache(os.path.join(self.dir, "text.sqlite")), _RecordingOcr(), [None]
+        self.enterContext(mock.patch.object(ocr_template, "load_template", lambda *a: active[0]))
+
+        def read():
+            doc = CertificateDocument(path)
+            return doc.text(cache=cache, backend=ocr), doc.text_source
+
+        full_page = read()
+        self.assertEqual(full_page[1], "ocr")
+        active[0] = {"aspect": 1.4, "fields": {"cert_id": [0.1, 0.4, 0.9, 0.6]}}
+        first = read()
+        self.assertEqual(first[1], "ocr_template")  # not the full-page text cached for the same file
+        self.assertEqual(read(), (first[0], "cache"))
+        active[0] = {"aspect": 1.4, "fields": {"cert_id": [0.2, 0.4, 0.9, 0.6]}}  # template re-learned
+        moved = read()
+        self.assertEqual(moved[1], "ocr_template")
+        self.assertNotEqual(moved[0], first[0])
+        self.assertEqual(ocr.regions, 2)
+        active[0] = None
+        self.assertEqual(read(), (full_page[0], "cache"))
+
+    def test_ocr_fallback_gets_live_page_renders(self):
+        import fitz
+        path = _scanned_pdf(os.path.join(self.dir, "scan.pdf"))
+        ocr = _RecordingOcr()
+        text = extract_text_from_pdf_path(path, backend=ocr)
+        self.assertEqual(text.splitlines()[0], "page 0 1167x834")
+        self.assertEqual(len(text.splitlines()), 2)
+        # what the backend saw matches a fresh render, i.e. the pixels weren't freed under it
+        for page, seen in zip(fitz.open(path), ocr.images):
+            self.assertEqual(seen.ndim, 2)
+            self.assertTrue((seen == render_page_gray(page)).all())
+            self.assertLess(seen.min(), 128)  # the text is in there
+
+
+class _ShapeReader:
+    """EasyOCR reader stand-in: each 'recognized' page is its own padded size."""
+    def __init__(self):
+        self.calls = []
+
+    def readtext_batched(self, images, batch_size=1):
+        self.calls.append([img.shape for img in images])
+        return [[(None, f"{img.shape[1]}x{img.shape[0]}", 1.0)] for img in images]
+
+
+class OcrEngineBatchTests(SimpleTestCase):
+    def test_pages_are_padded_per_size_bucket(self):
+        import numpy as np
+        reader = _ShapeReader()
+        engine = OcrEngine(reader=reader, target_text_height=None)
+        pages = [np.full((1100, 850), 255, np.uint8), np.full((300, 400), 255, np.uint8),
+                 np.full((1080, 840), 255, np.uint8), np.full((310, 390), 255, np.uint8)]
+        texts = engine.read_images(pages)
+        # the two page scans share a batch, the two small crops another; order follows the input
+        self.assertEqual(texts, ["850x1100", "400x310", "850x1100", "400x310"])
+        self.assertEqual(sorted(len(c) for c in reader.calls), [2, 2])
+
+
+QR = "https://archive.nptel.ac.in/noc/Ecertificate/?q=NPTEL23CS01S1234"
+
+
+def _text_pdf(path, lines):
+    import fitz
+    doc = fitz.open()
+    page = doc.new_page(width=842, height=595)
+    for i, line in enumerate(lines):
+        page.insert_text((80, 90 + 55 * i), line, fontsize=22)
+    doc.save(path)
+    return path
+
+
+def _certificate_pdf(path, name="RAHUL SHARMA", score="55"):
+    # text-layer certificate in the NPTEL layout; edits keep the page looking almost the same
+    return _text_pdf(path, (name, "PROGRAMMING IN PYTHON", f"Total: {score}", "Jul-Oct 2023", "Roll No:",
+                            "NPTEL23CS01S1234"))
+
+
+class DedupTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="certiscan-test-")
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.index = DedupIndex(os.path.join(self.dir, "dedup.sqlite"),
+                                fingerprints=FingerprintStore(os.path.join(self.dir, "fingerprints.sqlite")))
+        self.official = _certificate_pdf(os.path.join(self.dir, "official.pdf"))
+
+    def test_only_the_same_file_reuses_a_verdict(self):
+        self.index.add(CertificateDocument(self.official), {"verdict": "VERIFIED", "final_score": 1.0}, QR)
+        same = self.index.lookup(CertificateDocument(self.official), QR)
+        self.assertTrue(is_hit(same))
+        self.assertEqual(same["result"]["verdict"], "VERIFIED")
+        for edit in ({"score": "95"}, {"name": "RAHUL SHARMB"}):
+            forged = _certificate_pdf(os.path.join(self.dir, "forged.pdf"), **edit)
+            known = self.index.lookup(CertificateDocument(forged), QR)
+            # the edit is invisible to pHash + block SSIM, so it is a near match, but only a hint
+            self.assertEqual(known["match"], "near")
+            self.assertFalse(is_hit(known))
+            self.assertNotIn("result", known)
+
+    def test_edited_copy_is_verified_in_full(self):
+        from .utils.pipeline import verify_certificate
+        from .utils import text_cache, visual
+        self.enterContext(mock.patch.object(visual, "_store", self.index.fingerprints))
+        self.enterContext(mock.patch.object(text_cache, "_cache",
+                                            text_cache.TextCache(os.path.join(self.dir, "text.sqlite"))))
+        first = verify_certificate(self.official, official_path=self.official, dedup=self.index)
+        self.assertEqual((first["verdict"], first["decided_by"]), ("VERIFIED", "hash"))
+
+        forged = _certificate_pdf(os.path.join(self.dir, "forged.pdf"), score="95")
+        result = verify_certificate(forged, official_path=self.official, dedup=self.index)
+        # the tiers ran on the forged file itself instead of returning the stored VERIFIED
+        self.assertEqual(result["decided_by"], "text_layer")
+        self.assertEqual(result["dedup"]["match"], "near")
+        self.assertEqual((result["user_fields"]["score"], result["official_fields"]["score"]), ("95", "55"))
+
+        again = verify_certificate(self.official, official_path=self.official, dedup=self.index)
+        self.assertEqual((again["verdict"], again["decided_by"]), ("VERIFIED", "dedup"))
+
+
+class TieredVerifyTests(SimpleTestCase):
+    def setUp(self):
+        from .utils import ocr_template, text_cache
+        self.dir = tempfile.mkdtemp(prefix="certiscan-test-")
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.enterContext(mock.patch.object(text_cache, "_cache", TextCache(os.path.join(self.dir, "text.sqlite"))))
+        self.enterContext(mock.patch.object(ocr_template, "load_template", lambda *a: None))
+        self.official = CertificateDocument(_certificate_pdf(os.path.join(self.dir, "official.pdf")))
+        self.ocr = _RecordingOcr()
+
+    def verify(self, path, qr=QR):
+        return verify_tiered(CertificateDocument(path), self.official, qr, backend=self.ocr, visual=False)
+
+    def tiers(self, result):
+        return [(t["tier"], t["outcome"]) for t in result["tiers"]]
+
+    def test_identical_pdf_stops_at_hash(self):
+        result = self.verify(self.official.path)
+        self.assertEqual((result["verdict"], result["decided_by"], result["final_score"]), ("VERIFIED", "hash", 1.0))
+        self.assertEqual(self.tiers(result), [("hash", "VERIFIED")])
+
+    def test_qr_for_another_certificate(self):
+        copy = _certificate_pdf(os.path.join(self.dir, "copy.pdf"))
+        result = self.verify(copy, qr=QR.replace("S1234", "S9999"))
+        self.assertEqual((result["verdict"], result["decided_by"]), ("FAKE", "qr_cert_id"))
+        self.assertEqual((result["qr_cert_id"], result["official_cert_id"]), ("NPTEL23CS01S9999", "NPTEL23CS01S1234"))
+        self.assertEqual(self.tiers(result), [("hash", "pass"), ("qr_cert_id", "FAKE")])
+
+    def test_text_layer_decides_both_ways(self):
+        # same text, different bytes (PyMuPDF stamps each save)
+        resaved = self.verify(_certificate_pdf(os.path.join(self.dir, "resaved.pdf")))
+        self.assertEqual((resaved["verdict"], resaved["decided_by"]), ("VERIFIED", "text_layer"))
+        other = self.verify(_text_pdf(os.path.join(self.dir, "bill.pdf"),
+                                      ("Quarterly electricity bill", "Amount due 1,240.00", "Pay before 15 Nov")))
+        self.assertEqual((other["verdict"], other["decided_by"]), ("FAKE", "text_layer"))
+        self.assertEqual(self.ocr.images, [])
+
+    def test_inconclusive_text_layer_falls_through_to_ocr(self):
+        renamed = self.verify(_certificate_pdf(os.path.join(self.dir, "renamed.pdf"), name="PRIYA VERMA"))
+        self.assertEqual(self.tiers(renamed), [("hash", "pass"), ("qr_cert_id", "pass"), ("text_layer", "pass"),
+                                               ("visual", "pass"), ("ocr", renamed["verdict"])])
+        # the rendered user page is read; the official side keeps its text layer
+        self.assertEqual(len(self.ocr.images), 1)
+        self.assertTrue(renamed["user_text"].startswith("page 0 "))
+        self.assertEqual(renamed["official_text"], self.official.text_layer())
+        self.assertEqual(renamed["verdict"], verdict_for_score(renamed["final_score"]))
+
+    def test_scanned_upload_is_decided_by_ocr(self):
+        scan = _scanned_pdf(os.path.join(self.dir, "scan.pdf"), pages=("RAHUL SHARMA",))
+        result = self.verify(scan)
+        self.assertEqual(result["decided_by"], "ocr")
+        self.assertEqual([t for t, _ in self.tiers(result)], ["hash", "qr_cert_id", "text_layer", "visual", "ocr"])
+        self.assertEqual([img.shape for img in self.ocr.images], [(834, 1167)])
+
+
+class VisualCompareTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="certiscan-test-")
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.store = FingerprintStore(os.path.join(self.dir, "fingerprints.sqlite"))
+        self.official = CertificateDocument(_certificate_pdf(os.path.join(self.dir, "official.pdf")))
+
+    def test_identical_render(self):
+        res = visual_compare(CertificateDocument(self.official.path), self.official, self.store)
+        self.assertEqual((res["phash_distance"], res["dhash_distance"], res["tampered_fraction"]), (0, 0, 0.0))
+        self.assertAlmostEqual(res["ssim"], 1.0, places=5)
+        self.assertAlmostEqual(res["visual_score"], 1.0, places=5)
+
+    def test_edited_region_is_flagged(self):
+        import fitz
+        doc = fitz.open(self.official.path)
+        doc[0].draw_rect(fitz.Rect(500, 300, 700, 450), color=(0, 0, 0), fill=(0, 0, 0))  # pasted-over area
+        path = os.path.join(self.dir, "edited.pdf")
+        doc.save(path)
+        res = visual_compare(CertificateDocument(path), self.official, self.store)
+        heatmap = res["heatmap"]
+        # page points -> heatmap blocks (72 dpi render scaled to the thumbnail width)
+        scale = self.store.get(self.official.sha256)["thumb"].shape[1] / 842 / SSIM_BLOCK
+        x0, y0, x1, y1 = (int(v * scale) for v in (500, 300, 700, 450))
+        changed = heatmap < TAMPER_SSIM
+        self.assertTrue(changed[y0 + 1:y1, x0 + 1:x1].all())
+        outside = changed.copy()
+        outside[y0:y1 + 1, x0:x1 + 1] = False
+        self.assertFalse(outside.any())
+        self.assertAlmostEqual(res["tampered_fraction"], changed.mean())
+
+    def test_fingerprint_round_trips(self):
+        fp = fingerprint(page_gray(self.official))
+        self.assertIsNone(self.store.get(self.official.sha256))
+        self.store.put(self.official.sha256, fp)
+        stored = FingerprintStore(self.store.path).get(self.official.sha256)  # fresh connection
+        self.assertEqual((stored["phash"], stored["dhash"]), (fp["phash"], fp["dhash"]))
+        self.assertTrue((stored["thumb"] == fp["thumb"]).all())
+
+
+class TextCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="certiscan-test-")
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+        self.cache = TextCache(os.path.join(self.dir, "text.sqlite"))
+
+    def test_hit_miss_and_version_bump(self):
+        from .utils import pdf_utils
+        path = _scanned_pdf(os.path.join(self.dir, "scan.pdf"))
+        ocr = _RecordingOcr()
+        first = extract_text_from_file(path, cache=self.cache, backend=ocr)
+        self.assertEqual(len(ocr.images), 2)
+        self.assertEqual(extract_text_from_file(path, cache=self.cache, backend=ocr), first)
+        self.assertEqual(len(ocr.images), 2)  # served from the cache
+        self.assertEqual(self.cache.stats()["entries"], 1)
+        with mock.patch.object(pdf_utils, "EXTRACTOR_VERSION", pdf_utils.EXTRACTOR_VERSION + "-next"):
+            self.assertEqual(extract_text_from_file(path, cache=self.cache, backend=ocr), first)
+        self.assertEqual(len(ocr.images), 4)  # old entry no longer matches
+        self.assertEqual(self.cache.stats()["entries"], 2)
+
+    def test_lru_eviction(self):
+        cache = TextCache(os.path.join(self.dir, "small.sqlite"), max_bytes=10)
+        cache.put("a", "aaaa")
+        cache.put("b", "bbbb")
+        cache.get("a")  # b is now the least recently used
+        cache.put("c", "cccc")
+        self.assertEqual([cache.get(k) for k in "abc"], ["aaaa", None, "cccc"])
+        cache.put("big", "x" * 11)  # larger than the whole cache: not stored
+        self.assertIsNone(cache.get("big"))
+
+    def test_concurrent_writers_share_the_file(self):
+        import subprocess, sys
+        path = self.cache.path
+        # another process (a batch worker) writes while threads here read and write
+        child = subprocess.Popen(
+            [sys.executable, "-c", "import sys; from utils.text_cache import TextCache; c = TextCache(sys.argv[1])\n"
+                                   "for i in range(200): c.put(f'proc:{i}', str(i)); c.get(f'proc:{i}')", path],
+            cwd=os.path.dirname(os.path.abspath(__file__)))
+        errors = []
+
+        def worker(n):
+            try:
+                for i in range(200):
+                    self.cache.put(f"t{n}:{i}", str(i))
+                    if self.cache.get(f"t{n}:{i}") != str(i):
+                        errors.append((n, i))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(child.wait(timeout=60), 0)
+        self.assertEqual(errors, [])
+        self.assertEqual(self.cache.stats()["entries"], 5 * 200)
+        self.assertEqual(self.cache._conn().execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+
+class BulkScoreTests(SimpleTestCase):
+    A = ["RAHUL SHARMA", "", "", "Programming in Python", "PRIYA  verma", "Data Structures", "Cloud Computing"]
+    B = ["Rahul Sharma", "", "Rahul", "PYTHON programming in", "Priya Verma Iyer", "Algorithms", "Cloud Computing Course"]
+
+    def test_pair_scores_match_the_scalar_score(self):
+        scores = pair_scores(self.A, self.B)
+        self.assertEqual(scores.dtype.name, "float64")
+        self.assertEqual(list(scores[:3]), [100.0, 100.0, 0.0])  # both empty -> 100, one empty -> 0
+        for got, a, b in zip(scores, self.A, self.B):
+            self.assertAlmostEqual(got, fuzz_token(a, b), places=4)
+        cut = pair_scores(self.A, self.B, score_cutoff=90)
+        self.assertTrue(((cut == 0) | (cut >= 90)).all())
+        self.assertEqual(cut[5], 0.0)
+        with self.assertRaises(ValueError):
+            pair_scores(["a"], [])
+
+    def test_score_matrix_and_registry(self):
+        m = score_matrix(self.A[3:], self.B)
+        self.assertEqual((m.shape, m.dtype.name), ((4, len(self.B)), "float32"))
+        for i, a in enumerate(self.A[3:]):
+            for j, b in enumerate(self.B):
+                self.assertAlmostEqual(float(m[i, j]), fuzz_token(a, b) if b else 0.0, places=3)
+        self.assertEqual(score_matrix([], self.B).shape, (0, len(self.B)))
+        best, scores = match_registry(["priya verma", "Nobody Here"], ["RAHUL SHARMA", "PRIYA VERMA"])
+        self.assertEqual(list(best), [1, -1])
+        self.assertEqual(float(scores[0]), 100.0)
+
+    def test_bulk_score_matches_aggregate_score(self):
+        from .utils.fields import synthetic_texts
+        u = synthetic_texts(20, seed=1)
+        o = u[:10] + synthetic_texts(10, seed=2)
+        o[3] = ""  # missing official text
+        res = bulk_score(u, o)
+        for i, (a, b) in enumerate(zip(u, o)):
+            sim = text_similarity_score(a, b)
+            self.assertAlmostEqual(res["text"][i], sim, places=4)
+            final, _ = aggregate_score(extract_common_fields(a), extract_common_fields(b), sim)
+            self.assertAlmostEqual(res["final"][i], final, places=6)
+
+
+class _FakeDriver:
+    def __init__(self):
+        self.quit_called = threading.Event()
+        self.page_load_timeout = None
+
+    def set_page_load_timeout(self, seconds):
+        self.page_load_timeout = seconds
+
+    @property
+    def current_url(self):
+        if self.quit_called.is_set():
+            raise ConnectionError("session gone")
+        return "about:blank"
+
+    def get(self, url):
+        pass
+
+    def delete_all_cookies(self):
+        pass
+
+    def quit(self):
+        self.quit_called.set()
+
+
+class BrowserPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.drivers = []
+
+        def factory():
+            self.drivers.append(_FakeDriver())
+            return self.drivers[-1]
+
+        self.pool = BrowserPool(size=1, driver_factory=factory, page_load_timeout=7, task_timeout=0.2)
+        self.addCleanup(self.pool.shutdown)
+
+    def test_stuck_task_times_out_and_gets_a_fresh_browser(self):
+        def stuck(driver):
+            # like a page that never finishes loading: only quitting the browser ends the call
+            if not driver.quit_called.wait(10):
+                return "never interrupted"
+            raise ConnectionError("browser closed")
+
+        with self.assertRaises(TimeoutError):
+            self.pool.run(stuck)
+        self.assertIs(self.pool.run(lambda d: d), self.drivers[1])
+        self.assertTrue(self.drivers[0].quit_called.is_set())
+        self.assertEqual([d.page_load_timeout for d in self.drivers], [7, 7])
+        m = self.pool.metrics()
+        self.assertEqual((m["timed_out"], m["crashed"], m["completed"]), (1, 1, 1))
+
+    def test_failed_task_recycles_the_browser(self):
+        first = self.pool.run(lambda d: d)
+        with self.assertRaises(ValueError):
+            self.pool.run(lambda d: int("no pdf link"))
+        self.assertIsNot(self.pool.run(lambda d: d), first)
+        self.assertTrue(first.quit_called.is_set())
+        self.assertEqual(self.pool.metrics()["recycled"], 1)
+
+
+class BatchResumeTests(SimpleTestCase):
+    def test_resume_reads_the_format_it_was_written_in(self):
+        out = os.path.join(tempfile.mkdtemp(prefix="certiscan-test-"), "results.out")
+        self.addCleanup(shutil.rmtree, os.path.dirname(out), ignore_errors=True)
+        for fmt in ("csv", "jsonl"):
+            with ResultWriter(out, fmt) as w:
+                w.write(_result("a" * 64))
+                w.write({"status": "error", "doc_id": "b" * 64, "error": "boom"})
+            self.assertEqual(load_completed(out, fmt), {"a" * 64})
+            os.remove(out)
+
+
+class ReportExportTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="certiscan-test-")
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+
+    def test_report_row(self):
+        row = report_row(_result("c" * 64, qr_cert_id="NPTEL23CS01S1234",
+                                 user_fields={"name": "RAHUL SHARMA", "cert_id": "NPTEL23CS01S9999"}))
+        self.assertEqual(list(row), REPORT_COLUMNS)
+        self.assertEqual((row["doc_id"], row["cert_id"], row["name"], row["course"], row["status"]),
+                         ("c" * 64, "NPTEL23CS01S1234", "RAHUL SHARMA", "", "ok"))
+
+    def test_chunks_pull_rows_lazily(self):
+        pulled = []
+
+        def rows():
+            for i in range(10):
+                pulled.append(i)
+                yield i
+
+        it = chunks(rows(), 4)
+        self.assertEqual(next(it), [0, 1, 2, 3])
+        self.assertEqual(len(pulled), 4)
+        self.assertEqual(list(it), [[4, 5, 6, 7], [8, 9]])
+
+    def test_csv_round_trip(self):
+        results = list(synthetic_results(23))
+        out = os.path.join(self.dir, "report.csv")
+        self.assertEqual(export_results(iter(results), out, chunk_rows=5), 23)
+        with open(out, newline="", encoding="utf-8") as f:
+            self.assertEqual(f.readline().strip(), ",".join(REPORT_COLUMNS))
+        back = list(iter_result_file(out))
+        self.assertEqual(len(back), 23)
+        first = report_row(results[0])
+        self.assertEqual(back[0]["verdict"], first["verdict"])
+        self.assertAlmostEqual(float(back[0]["final_score"]), first["final_score"])
+        self.assertEqual(back[-1]["roll_no"], "NPTEL23CS000022")
+
+    def test_xlsx_streams_every_row(self):
+        from openpyxl import load_workbook
+        out = os.path.join(self.dir, "report.xlsx")
+        self.assertEqual(export_results(synthetic_results(12), out, chunk_rows=5), 12)
+        ws = load_workbook(out, read_only=True)["VerificationData"]
+        rows = list(ws.iter_rows(values_only=True))
+        self.assertEqual(list(rows[0]), REPORT_COLUMNS)
+        self.assertEqual(len(rows), 13)
+        self.assertIsInstance(rows[1][REPORT_COLUMNS.index("final_score")], float)
+
+    def test_parquet_and_unknown_formats(self):
+        out = os.path.join(self.dir, "report.parquet")
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            with self.assertRaisesRegex(RuntimeError, "pyarrow"):
+                export_results(synthetic_results(3), out)
+        else:
+            self.assertEqual(export_results(synthetic_results(11), out, chunk_rows=5), 11)
+            meta = pq.ParquetFile(out).metadata
+            self.assertEqual((meta.num_rows, meta.num_row_groups), (11, 3))
+        with self.assertRaisesRegex(ValueError, "unknown report format"):
+            export_report([], os.path.join(self.dir, "report.txt"))
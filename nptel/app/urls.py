@@ -0,0 +1,10 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path("verify/", views.VerifyView.as_view(), name="verify"),
+    path("jobs/<uuid:job_id>/", views.JobStatusView.as_view(), name="job-status"),
+    path("jobs/<uuid:job_id>/result/", views.JobResultView.as_view(), name="job-result"),
+    path("metrics", views.metrics, name="metrics"),
+]
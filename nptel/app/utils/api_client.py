@@ -0,0 +1,43 @@
+import os, time
+
+from .fetch_official import get_http_session
+
+# base URL of the Django verification API (nptel/ project), e.g. http://127.0.0.1:8000/api/
+DEFAULT_API_URL = os.environ.get("CERTISCAN_API_URL", "http://127.0.0.1:8000/api/")
+
+
+def submit_verification(user_path: str, official_path: str = None, api_url: str = DEFAULT_API_URL):
+    """
+    Upload a certificate (and optionally the official PDF); returns the job dict with job_id,
+    status_url and result_url. Returns immediately, verification runs on the server's workers.
+    """
+    files = {"user_file": open(user_path, "rb")}
+    if official_path:
+        files["official_file"] = open(official_path, "rb")
+    try:
+        resp = get_http_session().post(api_url.rstrip("/") + "/verify/", files=files, timeout=60)
+    finally:
+        for f in files.values():
+            f.close()
+    resp.raise_for_status()
+    return resp.json()
+
+
+def get_result(job: dict):
+    """
+    One poll: the finished job (with "result") or its current status while queued / running.
+    """
+    resp = get_http_session().get(job["result_url"], timeout=30)
+    resp.raise_for_status()
+    return resp.json()
+
+
+def wait_for_result(job: dict, timeout: float = 600, interval: float = 1.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        res = get_result(job)
+        if res["status"] in ("done", "failed"):
+            return res
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"job {job['job_id']} still {res['status']} after {timeout}s")
+        time.sleep(interval)
@@ -0,0 +1,187 @@
+import os, csv, json, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .compare import compute_sha256
+from .tracing import stage_totals
+
+SUPPORTED_EXTS = (".pdf", ".png", ".jpg", ".jpeg")
+CSV_COLUMNS = ["doc_id", "user_path", "official_path", "qr", "qr_stage", "status", "verdict", "decided_by",
+               "final_score", "text_similarity", "details", "error", "elapsed_s"]
+
+
+def iter_inputs(source: str):
+    """
+    Yield (user_path, official_path_or_None) pairs.
+    source can be a directory (scanned recursively for PDF / images) or a manifest:
+      - .csv   with a user_path column and optional official_path column
+      - .jsonl with {"user_path": ..., "official_path": ...} per line
+      - anything else: one user path per line
+    Relative paths in a manifest are resolved against the manifest's folder.
+    """
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(SUPPORTED_EXTS):
+                    yield os.path.join(root, name), None
+        return
+
+    base = os.path.dirname(os.path.abspath(source))
+    resolve = lambda p: p if not p or os.path.isabs(p) else os.path.join(base, p)
+    ext = os.path.splitext(source)[1].lower()
+    with open(source, newline="", encoding="utf-8") as f:
+        if ext == ".csv":
+            for row in csv.DictReader(f):
+                yield resolve(row["user_path"]), resolve(row.get("official_path") or None)
+        elif ext == ".jsonl":
+            for ln in f:
+                if ln.strip():
+                    row = json.loads(ln)
+                    yield resolve(row["user_path"]), resolve(row.get("official_path"))
+        else:
+            for ln in f:
+                if ln.strip() and not ln.startswith("#"):
+                    yield resolve(ln.strip()), None
+
+
+def result_format(out_path: str, fmt: str = None):
+    # an explicit --format wins over the file extension
+    return fmt or ("csv" if out_path.lower().endswith(".csv") else "jsonl")
+
+
+def load_completed(out_path: str, fmt: str = None):
+    """
+    doc_ids that already finished successfully in a previous run (errors are retried).
+    fmt is the format the results were written in (default: from the extension).
+    """
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, newline="", encoding="utf-8") as f:
+        if result_format(out_path, fmt) == "csv":
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(ln) for ln in f if ln.strip())
+        for row in rows:
+            if row.get("status") == "ok":
+                done.add(row["doc_id"])
+    return done
+
+
+class ResultWriter:
+    """
+    Append-only JSONL / CSV sink. Each row is flushed as soon as it is written so
+    a crash (or Ctrl+C) keeps everything that already finished.
+    """
+    def __init__(self, out_path: str, fmt: str = None):
+        self.fmt = result_format(out_path, fmt)
+        os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+        new_file = not os.path.exists(out_path) or os.path.getsize(out_path) == 0
+        self.f = open(out_path, "a", newline="", encoding="utf-8")
+        if self.fmt == "csv":
+            self.csv = csv.DictWriter(self.f, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+            if new_file:
+                self.csv.writeheader()
+
+    def write(self, row: dict):
+        if self.fmt == "csv":
+            flat = dict(row)
+            flat["details"] = json.dumps(row.get("details") or {})
+            self.csv.writerow(flat)
+        else:
+            self.f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _init_worker(warm_ocr: bool, torch_threads: int = None):
+    from .ocr_backends import backend_name, get_ocr_backend
+    if backend_name() != "easyocr":
+        return  # tesseract: no torch to configure, no model to preload
+    # split the cores between workers instead of every worker grabbing all of them
+    from .ocr_engine import configure_torch_threads
+    configure_torch_threads(torch_threads)
+    # load the OCR backend once per process instead of once per certificate
+    if warm_ocr:
+        try:
+            get_ocr_backend().engine.reader
+        except Exception:
+            pass  # an initializer error would break the pool; OCR reports it on first use instead
+
+
+def _verify_job(job: dict):
+    from .pipeline import verify_certificate
+    from .dedup import DEDUP_ENABLED, get_dedup_index
+    from .tracing import trace
+    t0 = time.perf_counter()
+    row = {"doc_id": job["doc_id"], "user_path": job["user_path"], "official_path": job["official_path"]}
+    # outer trace so failed jobs still report how far they got
+    with trace() as tr:
+        try:
+            res = verify_certificate(job["user_path"], job["official_path"],
+                                     official_dir=job["official_dir"],
+                                     dedup=get_dedup_index() if DEDUP_ENABLED else None)
+            row.update(res)
+            row["status"] = "ok"
+        except Exception as e:
+            row.update(status="error", error=f"{type(e).__name__}: {e}")
+    row["trace"] = tr.spans
+    row["elapsed_s"] = time.perf_counter() - t0
+    return row
+
+
+def run_batch(source: str, out_path: str, workers: int = None, fmt: str = None,
+              resume: bool = True, official_dir: str = None, warm_ocr: bool = True, on_result=None):
+    """
+    Verify every certificate in source across a process pool, streaming one row per
+    document to out_path as soon as it finishes. Documents are keyed by SHA-256 of the
+    user file, so reruns skip anything already verified (and duplicates inside one batch).
+    Auto-fetched official PDFs go to the official store in official_dir (default: next to out_path).
+    Returns a small summary dict, with the seconds spent per pipeline stage over the whole run
+    (self time, so nested stages such as ocr inside tier_ocr are not counted twice).
+    """
+    official_dir = official_dir or os.path.join(os.path.dirname(os.path.abspath(out_path)), "official")
+    done = load_completed(out_path, fmt) if resume else set()
+
+    jobs, seen, skipped = [], set(), 0
+    for user_path, official_path in iter_inputs(source):
+        doc_id = compute_sha256(user_path)
+        if doc_id in done or doc_id in seen:
+            skipped += 1
+            continue
+        seen.add(doc_id)
+        jobs.append({
+            "doc_id": doc_id,
+            "user_path": user_path,
+            "official_path": official_path,
+            "official_dir": official_dir,
+        })
+
+    workers = workers or os.cpu_count() or 1
+    torch_threads = max(1, (os.cpu_count() or 1) // workers)
+    summary = {"total": len(jobs) + skipped, "skipped": skipped, "ok": 0, "error": 0, "stage_s": {}}
+    if not jobs:
+        return summary
+
+    t0 = time.perf_counter()
+    with ResultWriter(out_path, fmt) as writer, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(warm_ocr, torch_threads)) as pool:
+        futures = [pool.submit(_verify_job, job) for job in jobs]
+        for fut in as_completed(futures):
+            row = fut.result()
+            writer.write(row)
+            summary[row["status"]] += 1
+            for stage, ms in stage_totals(row.get("trace")).items():
+                summary["stage_s"][stage] = summary["stage_s"].get(stage, 0.0) + ms / 1000.0
+            if on_result:
+                on_result(row)
+    summary["elapsed_s"] = time.perf_counter() - t0
+    return summary
@@ -0,0 +1,245 @@
+import os, sys, json, time, sqlite3, threading
+import cv2
+
+from .text_cache import DEFAULT_CACHE_DIR
+from .fields import extract_common_fields
+from .tiers import cert_id_from_qr
+from .tracing import cache_event
+from .visual import fingerprint, page_gray, hamming, block_ssim, get_fingerprint_store, TAMPER_SSIM
+
+DEDUP_ENABLED = os.environ.get("CERTISCAN_DEDUP", "1") != "0"
+# pHash distance (of 64 bits) within which two pages look like re-scans / re-saves of each other
+NEAR_DUP_BITS = 8
+# a near duplicate must also have (almost) no changed SSIM blocks: NPTEL certificates share one
+# template, so an edited name moves the hash by very little. Even then a near match is only
+# reported, never trusted: an edited score or name can stay under both limits.
+NEAR_DUP_MAX_TAMPERED = 0.02
+# result keys kept with each entry (no texts / heatmaps)
+STORED_KEYS = ("verdict", "final_score", "decided_by", "details", "text_similarity", "user_fields", "official_fields",
+               "qr", "qr_cert_id", "official_cert_id", "official_path", "sha256_official", "roll_no", "visual")
+
+
+class MultiIndexHash:
+    """
+    Multi-index hashing over 64-bit hashes: each hash is split into `parts` 16-bit chunks with
+    one table per chunk. Two hashes within distance r agree to within r // parts bits on at
+    least one chunk (pigeonhole), so a radius query only probes the few chunk values near the
+    query's chunks and verifies the candidates it finds there.
+    """
+    def __init__(self, radius: int = 8, parts: int = 4):
+        self.radius, self.parts, self.bits = radius, parts, 64 // parts
+        self.tables = [{} for _ in range(parts)]
+        self.size = 0
+        sub = radius // parts
+        self._masks = [0]
+        for _ in range(sub):  # every chunk value with at most `sub` bits flipped
+            self._masks = sorted({m | (1 << b) for m in self._masks for b in range(self.bits)} | set(self._masks))
+
+    def _chunks(self, h: int):
+        mask = (1 << self.bits) - 1
+        return [(h >> (i * self.bits)) & mask for i in range(self.parts)]
+
+    def add(self, h: int, item):
+        self.size += 1
+        entry = (h, item)
+        for table, c in zip(self.tables, self._chunks(h)):
+            table.setdefault(c, []).append(entry)
+
+    def find(self, h: int, radius: int = None):
+        """
+        [(distance, item)] for every stored hash within radius (<= the index radius) of h, closest first.
+        """
+        radius = self.radius if radius is None else min(radius, self.radius)
+        out, seen = [], set()
+        for table, c in zip(self.tables, self._chunks(h)):
+            for m in self._masks:
+                for entry in table.get(c ^ m, ()):
+                    if id(entry) in seen:
+                        continue
+                    seen.add(id(entry))
+                    d = hamming(h, entry[0])
+                    if d <= radius:
+                        out.append((d, entry[1]))
+        out.sort(key=lambda x: x[0])
+        return out
+
+
+def field_key(doc, qr_data: str = None):
+    """
+    Identity of the certificate a document claims to be: the certificate id from the QR, else the
+    id (or name + course) from the text layer. None when neither is available without OCR.
+    """
+    cert_id = cert_id_from_qr(qr_data)
+    if cert_id:
+        return cert_id
+    if doc.is_pdf and doc.has_text_layer():
+        f = extract_common_fields(doc.text_layer())
+        if f.get("cert_id"):
+            return f["cert_id"].upper()
+        if f.get("name") and f.get("course"):
+            return f"{f['name']}|{f['course']}".casefold()
+    return None
+
+
+class DedupIndex:
+    """
+    Documents already verified, by SHA-256 (exact), pHash (near duplicates, in a MultiIndexHash) and
+    field key, in SQLite next to the text cache so the apps and batch workers share it. Only an
+    exact match returns a stored result; near and same-key matches are hints for a full verify.
+    Page thumbnails for the near-duplicate SSIM check go into the visual FingerprintStore.
+    """
+    def __init__(self, path: str = None, fingerprints=None):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "dedup.sqlite")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.fingerprints = fingerprints or get_fingerprint_store()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._hashes = MultiIndexHash(NEAR_DUP_BITS)
+        self._last_rowid = 0
+        with self._conn() as con:
+            con.execute("""CREATE TABLE IF NOT EXISTS dedup (
+                sha256 TEXT PRIMARY KEY,
+                phash INTEGER NOT NULL,
+                key TEXT,
+                verdict TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL)""")
+            con.execute("CREATE INDEX IF NOT EXISTS dedup_key ON dedup(key)")
+
+    def _conn(self):
+        con = getattr(self._local, "con", None)
+        if con is None or self._local.pid != os.getpid():
+            con = sqlite3.connect(self.path, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")
+            self._local.con, self._local.pid = con, os.getpid()
+        return con
+
+    def _sync(self):
+        # pick up rows added since the last query, also by other processes
+        with self._lock:
+            rows = self._conn().execute("SELECT rowid, sha256, phash FROM dedup WHERE rowid > ? ORDER BY rowid",
+                                        (self._last_rowid,)).fetchall()
+            for rowid, sha256, ph in rows:
+                self._hashes.add(ph & (2 ** 64 - 1), sha256)
+                self._last_rowid = rowid
+
+    def _entry(self, sha256: str):
+        row = self._conn().execute("SELECT key, result FROM dedup WHERE sha256 = ?", (sha256,)).fetchone()
+        return None if row is None else {"key": row[0], "result": json.loads(row[1])}
+
+    def lookup(self, doc, qr_data: str = None):
+        """
+        What the index knows about a CertificateDocument, or None:
+          exact  same SHA-256: {"match": "exact", "sha256", "result"}, the only kind that is a hit
+          near   pHash within NEAR_DUP_BITS, same field_key, and at most NEAR_DUP_MAX_TAMPERED of the
+                 SSIM blocks changed against the stored page: {"match": "near", "sha256",
+                 "phash_distance", "tampered_fraction", "verdict"}. Not a hit: the bytes differ, so
+                 the document still has to be verified; "verdict" is the earlier file's, for display
+          key    same field_key (certificate id) and no near match: {"match": None, "same_key": [sha256]}
+                 so callers can flag a second file claiming one certificate
+        qr_data is decoded from doc when not given.
+        """
+        known = self._lookup(doc, qr_data)
+        cache_event("dedup", "hit" if is_hit(known) else "miss")
+        return known
+
+    def _lookup(self, doc, qr_data):
+        entry = self._entry(doc.sha256)
+        if entry is not None:
+            return {"match": "exact", "sha256": doc.sha256, "result": entry["result"]}
+
+        self._sync()
+        if qr_data is None:
+            try:
+                qr_data = doc.qr()["data"]
+            except Exception:
+                qr_data = None
+        key = field_key(doc, qr_data)
+        if key is None:
+            return None
+        gray = page_gray(doc)
+        fp = fingerprint(gray)
+        for d, sha256 in self._hashes.find(fp["phash"], NEAR_DUP_BITS):
+            entry = self._entry(sha256)
+            if entry is None or entry["key"] != key:
+                continue
+            stored = self.fingerprints.get(sha256)
+            if stored is None:
+                continue
+            th, tw = stored["thumb"].shape[:2]
+            thumb = cv2.resize(gray, (tw, th), interpolation=cv2.INTER_AREA)
+            tampered = float((block_ssim(thumb, stored["thumb"]) < TAMPER_SSIM).mean())
+            if tampered <= NEAR_DUP_MAX_TAMPERED:
+                return {"match": "near", "sha256": sha256, "phash_distance": d, "tampered_fraction": tampered,
+                        "verdict": entry["result"].get("verdict")}
+        same_key = self._conn().execute("SELECT sha256 FROM dedup WHERE key = ? LIMIT 5", (key,)).fetchall()
+        return {"match": None, "same_key": [r[0] for r in same_key]} if same_key else None
+
+    def add(self, doc, result: dict, qr_data: str = None):
+        """
+        Remember a verified CertificateDocument and its result.
+        """
+        if not result.get("verdict"):
+            return
+        fp = fingerprint(page_gray(doc))
+        self.fingerprints.put(doc.sha256, fp)
+        stored = {k: result[k] for k in STORED_KEYS if result.get(k) is not None}
+        ph = fp["phash"] - 2 ** 64 if fp["phash"] >= 2 ** 63 else fp["phash"]
+        with self._conn() as con:
+            con.execute("INSERT OR REPLACE INTO dedup VALUES (?, ?, ?, ?, ?, ?)",
+                        (doc.sha256, ph, field_key(doc, qr_data), result["verdict"],
+                         json.dumps(stored, default=str), time.time()))
+
+
+def is_hit(known):
+    # only a byte-identical file may reuse a verdict
+    return bool(known) and known.get("match") == "exact"
+
+
+def known_result(known: dict):
+    """
+    Stored result of a dedup hit, marked as decided by the dedup stage.
+    """
+    res = dict(known["result"])
+    res["dedup"] = {k: v for k, v in known.items() if k != "result"}
+    res["dedup"]["decided_by"] = res.get("decided_by")
+    res["decided_by"] = "dedup"
+    return res
+
+
+_index = None
+def get_dedup_index():
+    global _index
+    if _index is None:
+        _index = DedupIndex()
+    return _index
+
+
+def benchmark_index(n: int = 100000, queries: int = 1000, radius: int = NEAR_DUP_BITS):
+    """
+    MultiIndexHash radius queries vs a linear scan over n random 64-bit hashes.
+    Usage: python -m utils.dedup [n]
+    """
+    import random
+    rnd = random.Random(0)
+    hashes = [rnd.getrandbits(64) for _ in range(n)]
+    index = MultiIndexHash(radius)
+    t0 = time.perf_counter()
+    for i, h in enumerate(hashes):
+        index.add(h, i)
+    build_s = time.perf_counter() - t0
+    # half the queries are near copies of stored hashes
+    qs = [hashes[rnd.randrange(n)] ^ (1 << rnd.randrange(64)) if i % 2 else rnd.getrandbits(64) for i in range(queries)]
+    t0 = time.perf_counter()
+    found = [len(index.find(q, radius)) for q in qs]
+    index_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    scan = [sum(1 for h in hashes if hamming(q, h) <= radius) for q in qs[:max(1, queries // 10)]]
+    scan_s = (time.perf_counter() - t0) * queries / max(1, queries // 10)
+    assert found[:len(scan)] == scan
+    return {"hashes": n, "build_s": build_s, "index_queries_per_s": queries / index_s,
+            "scan_queries_per_s": queries / scan_s, "speedup": scan_s / index_s}
+
+
+if __name__ == "__main__":
+    print(benchmark_index(int(sys.argv[1]) if len(sys.argv) > 1 else 100000))
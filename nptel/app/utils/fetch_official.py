@@ -1,68 +1,224 @@
-import os, tempfile, time, requests
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from webdriver_manager.chrome import ChromeDriverManager
+import os, hashlib, requests
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+from requests.adapters import HTTPAdapter
+from .official_store import OfficialStore, get_official_store
+from .browser_pool import BrowserPool, get_browser_pool
+from .tracing import span
 
-def fetch_official_pdf(qr_url: str) -> str:
+# link texts the NPTEL landing page uses for the certificate, most specific first
+PDF_LINK_KEYWORDS = ["Course Certificate", "Download Certificate", "View Certificate", "Certificate"]
+HTTP_TIMEOUT = (10, 60)  # (connect, read) seconds
+BROWSER_WAIT = 10        # max seconds for explicit waits in the browser fallback
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) CertiScan/1.0"
+MAX_PDF_BYTES = 20 * 1024 * 1024  # certificates are a few hundred KB
+DOWNLOAD_CHUNK = 256 * 1024
+# some servers send PDFs as octet-stream / x-pdf
+PDF_CONTENT_TYPES = ("application/pdf", "application/x-pdf", "application/octet-stream", "binary/octet-stream")
+
+_session = None
+def get_http_session():
     """
-    Open the QR URL in headless Chrome, try to find a certificate PDF link/button,
-    download it, and return its path.
+    Shared keep-alive session, so landing page + PDF (and repeat fetches) reuse connections.
     """
-    options = webdriver.ChromeOptions()
-    options.add_argument("--headless=new")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
+    global _session
+    if _session is None:
+        s = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=2)
+        s.mount("http://", adapter)
+        s.mount("https://", adapter)
+        s.headers["User-Agent"] = USER_AGENT
+        _session = s
+    return _session
 
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-    driver.get(qr_url)
-    time.sleep(3)
 
-    pdf_url = None
+class _LinkParser(HTMLParser):
+    """
+    Collects (url, text) candidates from <a>, <iframe>/<embed>/<object> and meta refresh.
+    """
+    def __init__(self):
+        super().__init__()
+        self.links = []
+        self._a = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "a" and attrs.get("href"):
+            self._a = [attrs["href"], ""]
+        elif tag in ("iframe", "embed") and attrs.get("src"):
+            self.links.append((attrs["src"], ""))
+        elif tag == "object" and attrs.get("data"):
+            self.links.append((attrs["data"], ""))
+        elif tag == "meta" and (attrs.get("http-equiv") or "").lower() == "refresh":
+            content = attrs.get("content") or ""
+            if "url=" in content.lower():
+                self.links.append((content[content.lower().index("url=") + 4:].strip("'\" "), ""))
+
+    def handle_data(self, data):
+        if self._a is not None:
+            self._a[1] += data
+
+    def handle_endtag(self, tag):
+        if tag == "a" and self._a is not None:
+            self.links.append((self._a[0], " ".join(self._a[1].split())))
+            self._a = None
+
+
+def pick_pdf_link(html: str, base_url: str):
+    """
+    Pick the certificate PDF URL out of a landing page's HTML, or None.
+    Keyword-labelled .pdf links win over any other .pdf link.
+    """
+    parser = _LinkParser()
+    parser.feed(html)
+    links = [(urljoin(base_url, href), text) for href, text in parser.links]
+    pdf_links = [(u, t) for u, t in links if ".pdf" in u.lower()]
+    for key in PDF_LINK_KEYWORDS:
+        for u, t in pdf_links:
+            if key.lower() in t.lower():
+                return u
+    return pdf_links[0][0] if pdf_links else None
+
+
+def find_pdf_url_http(qr_url: str):
+    """
+    Fast path: plain GET of the landing page and HTML parsing, no browser.
+    Returns the PDF URL, or None when the link isn't in the static HTML (page needs JavaScript).
+    """
+    resp = get_http_session().get(qr_url, timeout=HTTP_TIMEOUT, allow_redirects=True, stream=True)
+    resp.raise_for_status()
+    ctype = resp.headers.get("Content-Type", "").lower()
+    if "application/pdf" in ctype:
+        resp.close()
+        return resp.url  # QR pointed (or redirected) straight at the PDF
+    return pick_pdf_link(resp.text, resp.url)
+
+
+def _find_pdf_url_with_driver(driver, qr_url: str):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.common.exceptions import TimeoutException
+
+    driver.get(qr_url)
+    WebDriverWait(driver, BROWSER_WAIT).until(
+        lambda d: d.execute_script("return document.readyState") == "complete")
     try:
-        # 1) Try by link text heuristics
-        keywords = ["Course Certificate", "Download Certificate", "View Certificate", "Certificate"]
-        for key in keywords:
-            try:
-                elem = driver.find_element(By.PARTIAL_LINK_TEXT, key)
-                href = elem.get_attribute("href")
-                if href and ".pdf" in href.lower():
-                    pdf_url = href
-                    break
-                else:
-                    elem.click()
-                    time.sleep(3)
-                    if ".pdf" in driver.current_url.lower():
-                        pdf_url = driver.current_url
-                        break
-            except:
-                continue
-
-        # 2) Fallback: scan all <a> links
-        if not pdf_url:
-            anchors = driver.find_elements(By.TAG_NAME, "a")
-            for a in anchors:
-                href = a.get_attribute("href") or ""
-                if ".pdf" in href.lower():
-                    pdf_url = href
-                    break
-    finally:
-        driver.quit()
+        # wait for the page scripts to render at least one link
+        WebDriverWait(driver, BROWSER_WAIT).until(lambda d: d.find_elements(By.TAG_NAME, "a"))
+    except TimeoutException:
+        pass
 
+    # 1) Try by link text heuristics
+    for key in PDF_LINK_KEYWORDS:
+        try:
+            elem = driver.find_element(By.PARTIAL_LINK_TEXT, key)
+            href = elem.get_attribute("href")
+            if href and ".pdf" in href.lower():
+                return href
+            elem.click()
+            WebDriverWait(driver, BROWSER_WAIT).until(lambda d: ".pdf" in d.current_url.lower())
+            return driver.current_url
+        except Exception:
+            continue
+
+    # 2) Fallback: scan all <a> links
+    return pick_pdf_link(driver.page_source, driver.current_url)
+
+
+def find_pdf_url_browser(qr_url: str, pool: BrowserPool = None):
+    """
+    Slow path: open the QR URL in a pooled headless Chrome and try to find the certificate
+    PDF link/button. Uses explicit waits instead of fixed sleeps.
+    """
+    pool = pool or get_browser_pool()
+    return pool.run(lambda driver: _find_pdf_url_with_driver(driver, qr_url))
+
+
+def find_official_pdf_url(qr_url: str) -> str:
+    """
+    Find the certificate PDF URL behind a QR code: static HTML first, headless browser
+    only if the link isn't in the page source.
+    """
+    pdf_url = None
+    with span("fetch_landing", method="http") as s:
+        try:
+            pdf_url = find_pdf_url_http(qr_url)
+        except requests.RequestException as e:
+            s["error"] = type(e).__name__
+        s["outcome"] = "found" if pdf_url else "none"
+    if not pdf_url:
+        with span("fetch_landing", method="browser") as s:
+            pdf_url = find_pdf_url_browser(qr_url)
+            s["outcome"] = "found" if pdf_url else "none"
     if not pdf_url:
         raise RuntimeError("No PDF link found on QR landing page")
+    return pdf_url
 
 
-    # Download PDF
-    save_dir = r"D:\Profile\Pictures\NPTEL"
-    os.makedirs(save_dir, exist_ok=True)
-    save_path = os.path.join(save_dir, "official.pdf")
+def download_pdf(pdf_url: str, save_path: str, etag: str = None, last_modified: str = None,
+                 max_bytes: int = MAX_PDF_BYTES) -> dict:
+    """
+    Stream pdf_url to save_path in large chunks, hashing as the bytes arrive.
+    With etag / last_modified a conditional GET is sent and a 304 leaves save_path untouched.
+    Rejects non-PDF responses and anything bigger than max_bytes (partial file is removed).
+    Returns {"status", "etag", "last_modified", "path", "sha256", "bytes"}.
+    """
+    with span("download") as s:
+        meta = _download_pdf(pdf_url, save_path, etag, last_modified, max_bytes)
+        s["outcome"] = "not_modified" if meta["status"] == 304 else "ok"
+    return meta
+
+
+def _download_pdf(pdf_url, save_path, etag, last_modified, max_bytes):
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    with get_http_session().get(pdf_url, headers=headers, timeout=HTTP_TIMEOUT, stream=True) as resp:
+        meta = {"status": resp.status_code, "etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+        if resp.status_code == 304:
+            return meta
+        if resp.status_code != 200:
+            raise RuntimeError(f"Failed to download PDF from {pdf_url}, status {resp.status_code}")
 
-    resp = requests.get(pdf_url, timeout=60000)
-    if resp.status_code == 200:
-        with open(save_path, "wb") as f:
-            f.write(resp.content)
-        return save_path
-    else:
-        raise RuntimeError(f"Failed to download PDF from {pdf_url}, status {resp.status_code}")
+        ctype = resp.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if ctype and ctype not in PDF_CONTENT_TYPES:
+            raise RuntimeError(f"Expected a PDF from {pdf_url}, got Content-Type {ctype}")
+        length = resp.headers.get("Content-Length")
+        if length and length.isdigit() and int(length) > max_bytes:
+            raise RuntimeError(f"PDF at {pdf_url} is {length} bytes, limit is {max_bytes}")
 
+        h = hashlib.sha256()
+        size = 0
+        try:
+            with open(save_path, "wb") as f:
+                for chunk in resp.iter_content(chunk_size=DOWNLOAD_CHUNK):
+                    if size == 0 and not chunk.startswith(b"%PDF"):
+                        raise RuntimeError(f"Response from {pdf_url} is not a PDF")
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise RuntimeError(f"PDF at {pdf_url} exceeds {max_bytes} bytes")
+                    h.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            try:
+                os.unlink(save_path)
+            except OSError:
+                pass
+            raise
+    if size == 0:
+        raise RuntimeError(f"Empty response from {pdf_url}")
+    meta.update(path=save_path, sha256=h.hexdigest(), bytes=size)
+    return meta
+
+
+def fetch_official_pdf(qr_url: str, store: OfficialStore = None) -> str:
+    """
+    Return the path of the official PDF behind a QR URL. Goes through the official store,
+    so repeat / concurrent lookups of the same certificate reuse one download and every
+    certificate gets its own file.
+    """
+    store = store or get_official_store()
+    return store.get(qr_url, find_official_pdf_url, download_pdf)
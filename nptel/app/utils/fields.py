@@ -0,0 +1,257 @@
+"""
+Certificate field extraction: one tokenizing pass over the text driven by per-field rule tables.
+
+Each schema is a tuple of FieldRule wrapped in a RuleSet. The text is split into lines once
+(with the upper-cased copy and word count of each line); "line" rules test those lines,
+"search" rules run one precompiled pattern over the whole text. Several rules for the same
+field are fallbacks in table order.
+"""
+import re, sys, time
+from collections import namedtuple
+
+MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+_MONTH_ALT = "|".join(MONTHS)
+# same months as a prefix tree behind a first-letter lookahead: the term search is tried at every
+# offset of the text, and this rejects most of them on one character
+_MONTH_TRIE = "(?=[JFMASONDjfmasond])(?:J(?:an|u[nl])|Feb|Ma[ry]|A(?:pr|ug)|Sep|Oct|Nov|Dec)"
+
+# cert ids are matched ASCII-case-insensitively and upper-cased, instead of upper-casing the whole text
+CERT_ID_RE = re.compile(r"NPTEL[0-9A-Z\-]{4,}", re.IGNORECASE | re.ASCII)
+NAME_LINE_RE = re.compile(r"(?:[A-Z][A-Z.\-]*|[A-Z][a-z\-]+)(?:\s+(?:[A-Z][A-Z.\-]*|[A-Z][a-z\-]+)){1,3}")
+COURSE_KEYWORDS_RE = re.compile(r"WEEK|COURSE|SPEAKING|PROGRAM|PUBLIC|CERTIFICATE|MODULE")
+SCORE_FRACTION_RE = re.compile(r"\d{1,3}(?:\.\d+)?/\d{1,3}(?:\.\d+)?")
+SCORE_TOTAL_RE = re.compile(r"\bTotal[:\s]*([0-9]{1,3}(?:\.\d+)?)\b", re.IGNORECASE)
+TERM_RE = re.compile(rf"({_MONTH_TRIE})[a-z]*\s*[-–]?\s*({_MONTH_TRIE})?\s*\d{{4}}", re.IGNORECASE)
+
+NPTEL_NAME_RE = re.compile(r"[A-Z\s]{3,}")
+NPTEL_MONTH_RE = re.compile(_MONTH_ALT)
+YEAR_RE = re.compile(r"\b\d{4}\b")
+INSTITUTE_RE = re.compile(r"IIT|NIT|Institute|College|University")
+PERCENT_RE = re.compile(r"\d{1,3}\s*%")
+PURE_NUMBER_RE = re.compile(r"\d{2,3}")
+
+
+Line = namedtuple("Line", "text upper n_words")
+
+
+def tokenize(text: str):
+    """
+    Non-empty stripped lines with their upper-cased copy and word count, computed once.
+    """
+    out = []
+    for ln in text.splitlines():
+        ln = ln.strip()
+        if ln:
+            out.append(Line(ln, ln.upper(), len(ln.split())))
+    return out
+
+
+# kind: "line" -> value(line, i, lines) returns the field value or None for every line in lines[:limit]
+#       "search" -> value(text) returns the field value or None
+# pick: "first" / "last" matching line; unlike: skip lines equal to that field's final value
+FieldRule = namedtuple("FieldRule", "field kind value limit pick unlike")
+FieldRule.__new__.__defaults__ = (None, "first", None)
+
+
+def _search(pattern, group=0, upper=False):
+    def value(text):
+        m = pattern.search(text)
+        if not m:
+            return None
+        return m.group(group).upper() if upper else m.group(group)
+    return value
+
+
+def _next_line(lines, i):
+    return lines[i + 1].text if i + 1 < len(lines) else None
+
+
+COMMON_RULES = (
+    FieldRule("name", "line", lambda ln, i, lines: ln.text if ln.n_words <= 4 and NAME_LINE_RE.fullmatch(ln.text) else None,
+              limit=12),
+    # fallback: a "Name: ..." style label line
+    FieldRule("name", "line", lambda ln, i, lines: (ln.text.replace("NAME", "").strip(":- ")
+                                                    if "NAME" in ln.upper and ln.n_words <= 6 else None)),
+    FieldRule("course", "line", lambda ln, i, lines: ln.text if ln.n_words <= 8 and COURSE_KEYWORDS_RE.search(ln.upper) else None,
+              limit=20),
+    # fallback: a long-ish upper-case line that isn't the name
+    FieldRule("course", "line", lambda ln, i, lines: ln.text if 2 <= ln.n_words <= 6 and ln.text.isupper() else None,
+              limit=20, unlike="name"),
+    FieldRule("cert_id", "search", _search(CERT_ID_RE, upper=True)),
+    FieldRule("score", "search", _search(SCORE_FRACTION_RE)),
+    FieldRule("score", "search", _search(SCORE_TOTAL_RE, 1)),
+    FieldRule("term", "search", _search(TERM_RE)),
+)
+COMMON_FIELDS = ("name", "course", "cert_id", "score", "term")
+
+
+def _nptel_score(ln, i, lines):
+    m = PERCENT_RE.search(ln.text)
+    if m:
+        return m.group(0)
+    return f"{ln.text}%" if PURE_NUMBER_RE.fullmatch(ln.text) else None
+
+
+# the Streamlit NPTEL extractor: every rule keeps the last matching line
+NPTEL_RULES = (
+    FieldRule("roll_no", "line", lambda ln, i, lines: _next_line(lines, i) if ln.text.startswith("Roll No") else None,
+              pick="last"),
+    FieldRule("course", "line", lambda ln, i, lines: _next_line(lines, i) if "WEEK COURSE" in ln.upper else None,
+              pick="last"),
+    FieldRule("name", "line", lambda ln, i, lines: ln.text.title() if NPTEL_NAME_RE.fullmatch(ln.text) else None,
+              pick="last"),
+    FieldRule("certificate_id", "line", lambda ln, i, lines: ln.text if ln.text.startswith("NPTEL") else None,
+              pick="last"),
+    FieldRule("date", "line", lambda ln, i, lines: (ln.text if NPTEL_MONTH_RE.search(ln.text) and YEAR_RE.search(ln.text)
+                                                    else None), pick="last"),
+    FieldRule("institute", "line", lambda ln, i, lines: ln.text if INSTITUTE_RE.search(ln.text) else None, pick="last"),
+    FieldRule("score", "line", _nptel_score, pick="last"),
+)
+NPTEL_DEFAULTS = {"institute": "IIT Roorkee"}
+
+
+class RuleSet:
+    """
+    A rule table prepared once: "first" line rules are scanned top-down and "last" rules
+    bottom-up, each dropping out as soon as it (or an earlier rule for its field) has matched,
+    so a typical certificate is decided without touching most lines.
+    """
+    def __init__(self, rules, fields=None, defaults=None):
+        self.rules = tuple(rules)
+        self.fields = fields
+        self.defaults = dict(defaults or {})
+        self.forward, self.backward = [], []
+        for k, r in enumerate(self.rules):
+            if r.kind == "line":
+                # "first" rules ahead of this one for the same field; once one matches, this one is moot
+                earlier = tuple(j for j, e in enumerate(self.rules[:k])
+                                if e.field == r.field and e.kind == "line" and e.pick == "first" and e.unlike is None)
+                (self.backward if r.pick == "last" else self.forward).append((k, r, earlier))
+
+    @staticmethod
+    def _scan(lines, order, active, found):
+        for i in order:
+            if not active:
+                break
+            ln = lines[i]
+            drop = False
+            for k, r, earlier in active:
+                if r.limit is not None and i >= r.limit:
+                    drop = drop or order.step > 0
+                    continue
+                if earlier and any(e in found for e in earlier):
+                    drop = True
+                    continue
+                v = r.value(ln, i, lines)
+                if v is None:
+                    continue
+                if r.unlike is not None:
+                    found.setdefault(k, []).append(v)
+                else:
+                    found[k] = v
+                    drop = True
+            if drop:
+                active = [(k, r, e) for k, r, e in active
+                          if not ((order.step > 0 and r.limit is not None and i + 1 >= r.limit)
+                                  or (r.unlike is None and k in found) or any(x in found for x in e))]
+
+    def extract(self, text: str):
+        lines = tokenize(text)
+        found = {}  # rule index -> value, or list of candidate values for "unlike" rules
+        if self.forward:
+            self._scan(lines, range(len(lines)), self.forward, found)
+        if self.backward:
+            self._scan(lines, range(len(lines) - 1, -1, -1), self.backward, found)
+
+        out = {}
+        for k, r in enumerate(self.rules):
+            if out.get(r.field):
+                continue
+            if r.kind == "search":
+                v = r.value(text)
+            elif r.unlike is not None:
+                v = next((c for c in found.get(k, ()) if c != out.get(r.unlike)), None)
+            else:
+                v = found.get(k)
+            if v is not None:
+                out[r.field] = v
+        for f, v in self.defaults.items():
+            out.setdefault(f, v)
+        if self.fields is not None:
+            return {f: out.get(f) or "" for f in self.fields}
+        return out
+
+
+COMMON = RuleSet(COMMON_RULES, COMMON_FIELDS)
+NPTEL = RuleSet(NPTEL_RULES, defaults=NPTEL_DEFAULTS)
+
+
+def extract_common_fields(text: str):
+    """
+    name, course, cert_id, score, term (all keys present, "" when not found).
+    """
+    if not text:
+        return {}
+    return COMMON.extract(text)
+
+
+def extract_nptel_fields(text: str):
+    """
+    roll_no, course, name, certificate_id, date, institute, score as laid out on NPTEL certificates.
+    """
+    return NPTEL.extract(text)
+
+
+def synthetic_texts(n: int = 5000, seed: int = 0):
+    """
+    Certificate-like texts with varied names, courses, ids, scores and terms for benchmarking.
+    """
+    import random
+    rnd = random.Random(seed)
+    first = ["ADITYA", "PRIYA", "RAHUL", "Sneha", "Arjun", "MEERA", "Karan", "DIVYA"]
+    last = ["SHARMA", "Iyer", "GUPTA", "Reddy", "NAIR", "Singh", "KUMAR"]
+    courses = ["Introduction To Machine Learning", "PROGRAMMING IN JAVA", "Data Structures And Algorithms",
+               "Public Speaking", "Cloud Computing", "DESIGN AND ANALYSIS OF ALGORITHMS"]
+    out = []
+    for _ in range(n):
+        a, b = rnd.sample(MONTHS, 2)
+        lines = [
+            "Elite" if rnd.random() < 0.5 else "Successfully completed",
+            "This certificate is awarded to",
+            f"{rnd.choice(first)} {rnd.choice(last)}",
+            f"for successfully completing the course",
+            rnd.choice(courses),
+            f"with a consolidated score of {rnd.randint(40, 100)} %",
+            f"Online Assignments {rnd.randint(10, 25)}.{rnd.choice([0, 25, 5, 75])}/25 Proctored Exam {rnd.randint(30, 75)}/75",
+            f"Total number of candidates certified in this course: {rnd.randint(100, 20000)}",
+            f"{a}-{b} {rnd.randint(2018, 2025)}",
+            f"({rnd.choice([4, 8, 12])} week course)",
+            "Indian Institute of Technology Madras",
+            "Roll No:",
+            f"NPTEL{rnd.randint(18, 25)}CS{rnd.randint(10, 99)}S{rnd.randint(10**8, 10**9 - 1)}",
+            "To verify the certificate",
+            f"No. of credits recommended: {rnd.randint(1, 4)}",
+        ]
+        out.append("\n".join(lines))
+    return out
+
+
+def benchmark(n: int = 5000):
+    """
+    Texts/second of both extractors over n synthetic certificates.
+    Usage: python -m utils.fields [n]
+    """
+    texts = synthetic_texts(n)
+    report = {"texts": n}
+    for name, fn in (("common", extract_common_fields), ("nptel", extract_nptel_fields)):
+        t0 = time.perf_counter()
+        for t in texts:
+            fn(t)
+        elapsed = time.perf_counter() - t0
+        report[f"{name}_per_s"] = n / elapsed
+        report[f"{name}_us_per_text"] = elapsed * 1e6 / n
+    return report
+
+
+if __name__ == "__main__":
+    print(benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 5000))
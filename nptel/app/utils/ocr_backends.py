@@ -0,0 +1,159 @@
+import os, sys, time
+from typing import Protocol, List, Tuple, runtime_checkable
+import cv2
+
+DEFAULT_BACKEND = os.environ.get("CERTISCAN_OCR_BACKEND", "easyocr")
+
+
+@runtime_checkable
+class OcrBackend(Protocol):
+    """
+    What the pipeline needs from an OCR engine. Boxes are [x_min, x_max, y_min, y_max] in pixels.
+    """
+    name: str
+
+    def read_images(self, images) -> List[str]:
+        """One string per image (grayscale or BGR arrays)."""
+        ...
+
+    def read_regions(self, img, boxes) -> List[Tuple[str, float]]:
+        """(text, confidence 0..1) per box, recognition only."""
+        ...
+
+
+class EasyOcrBackend:
+    """
+    EasyOCR (torch). Most accurate on photos; heavy to load. Pages go through the batched OcrEngine.
+    """
+    name = "easyocr"
+
+    def __init__(self, engine=None):
+        from .ocr_engine import OcrEngine
+        self.engine = engine or OcrEngine()
+
+    def read_images(self, images):
+        return self.engine.read_images(images)
+
+    def read_regions(self, img, boxes):
+        reader = self.engine.reader
+        results = reader.recognize(img, horizontal_list=[list(b) for b in boxes], free_list=[], detail=1,
+                                   paragraph=False, batch_size=max(1, len(boxes)))
+        # results come back sorted by position, map them to the requested boxes by top-left corner
+        by_corner = {(int(r[0][0][0]), int(r[0][0][1])): (r[1].strip(), float(r[2])) for r in results}
+        return [by_corner.get((int(b[0]), int(b[2])), ("", 0.0)) for b in boxes]
+
+
+class TesseractBackend:
+    """
+    Tesseract via pytesseract: CPU-only, no torch, starts instantly. Good enough for clean
+    machine-generated certificates; weaker on skewed phone photos.
+    Needs `pip install pytesseract` and the tesseract binary on PATH.
+    """
+    name = "tesseract"
+
+    def __init__(self, lang: str = "eng", psm: int = 6):
+        import pytesseract
+        self.pytesseract = pytesseract
+        self.lang = lang
+        self.config = f"--psm {psm}"
+
+    def _gray(self, img):
+        return img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+    def read_images(self, images):
+        return [" ".join(self.pytesseract.image_to_string(self._gray(img), lang=self.lang, config=self.config).split())
+                for img in images]
+
+    def read_regions(self, img, boxes):
+        gray = self._gray(img)
+        out = []
+        for x_min, x_max, y_min, y_max in boxes:
+            crop = gray[max(0, y_min):y_max, max(0, x_min):x_max]
+            if crop.size == 0:
+                out.append(("", 0.0))
+                continue
+            data = self.pytesseract.image_to_data(crop, lang=self.lang, config="--psm 7",
+                                                  output_type=self.pytesseract.Output.DICT)
+            words = [(w, float(c)) for w, c in zip(data["text"], data["conf"]) if w.strip() and float(c) >= 0]
+            text = " ".join(w for w, _ in words)
+            conf = sum(c for _, c in words) / len(words) / 100.0 if words else 0.0
+            out.append((text, conf))
+        return out
+
+
+BACKENDS = {"easyocr": EasyOcrBackend, "tesseract": TesseractBackend}
+
+_instances = {}
+def get_ocr_backend(name: str = None) -> OcrBackend:
+    """
+    Backend by name (default: CERTISCAN_OCR_BACKEND or easyocr), one instance per process.
+    Accepts an OcrBackend instance and returns it unchanged.
+    """
+    if name is not None and not isinstance(name, str):
+        return name
+    name = name or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"unknown OCR backend {name!r}; choose from {sorted(BACKENDS)}")
+    if name not in _instances:
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
+
+
+def backend_name(backend=None):
+    return backend if isinstance(backend, str) else getattr(backend, "name", None) or DEFAULT_BACKEND
+
+
+def compare_backends(pdf_paths, backends=("easyocr", "tesseract"), dpi: int = 200):
+    """
+    Accuracy / latency harness on one corpus. Uses PDFs that have a text layer as ground truth:
+    each first page is rendered to an image, OCRed by every backend and scored against the text
+    layer (token_set_ratio over the whole text, plus exact-match rate of extracted fields).
+    Usage: python -m utils.ocr_backends a.pdf b.pdf ...
+    """
+    import fitz
+    from rapidfuzz import fuzz
+    from .compare import extract_common_fields
+    from .qr_utils import pixmap_to_array
+
+    corpus = []
+    for p in pdf_paths:
+        page = fitz.open(p).load_page(0)
+        truth = page.get_text("text").strip()
+        if len(truth) > 20:
+            pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+            img = pixmap_to_array(pix)  # the view keeps pix alive for the whole comparison
+            corpus.append((img, truth, extract_common_fields(truth)))
+    if not corpus:
+        raise ValueError("need PDFs with a text layer to use as ground truth")
+
+    report = {}
+    for name in backends:
+        try:
+            backend = get_ocr_backend(name)
+            backend.read_images([corpus[0][0]])  # load models before timing
+        except Exception as e:
+            report[name] = {"error": f"{type(e).__name__}: {e}"}
+            continue
+        t0 = time.perf_counter()
+        texts = [backend.read_images([img])[0] for img, _, _ in corpus]
+        elapsed = time.perf_counter() - t0
+        sims, field_hits, field_total = [], 0, 0
+        for text, (_, truth, t_fields) in zip(texts, corpus):
+            sims.append(fuzz.token_set_ratio(text, truth))
+            o_fields = extract_common_fields(text)
+            for k, v in t_fields.items():
+                if v:
+                    field_total += 1
+                    field_hits += int(o_fields.get(k, "") == v)
+        report[name] = {
+            "pages": len(corpus),
+            "pages_per_s": len(corpus) / elapsed,
+            "ms_per_page": elapsed * 1000.0 / len(corpus),
+            "text_similarity_mean": sum(sims) / len(sims),
+            "field_exact_rate": field_hits / field_total if field_total else None,
+        }
+    return report
+
+
+if __name__ == "__main__":
+    print(compare_backends(sys.argv[1:]))
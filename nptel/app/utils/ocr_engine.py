@@ -0,0 +1,196 @@
+import os, sys, time
+import cv2
+import numpy as np
+
+from .pdf_utils import get_easyocr_reader
+
+# EasyOCR's recognizer works on 64 px high line crops; text much taller than this is just
+# wasted detector work, so pages are scaled so the typical character is ~TARGET_TEXT_HEIGHT px.
+TARGET_TEXT_HEIGHT = 28
+MAX_UPSCALE = 1.5
+OCR_BATCH_SIZE = int(os.environ.get("CERTISCAN_OCR_BATCH", "8"))
+# images share a readtext_batched call only while padding them to a common size costs at most
+# this factor in pixels, so one large scan doesn't make every small photo in the batch page-sized
+MAX_PAD_RATIO = 1.25
+
+
+def configure_torch_threads(intra_op: int = None, inter_op: int = None):
+    """
+    Set torch intra-/inter-op thread counts for this process. With N pool workers on C cores
+    each worker should use about C // N threads, otherwise they oversubscribe the CPU.
+    Defaults come from CERTISCAN_TORCH_THREADS. Returns the thread count in effect (None if no torch).
+    """
+    intra_op = intra_op or int(os.environ.get("CERTISCAN_TORCH_THREADS", "0")) or None
+    try:
+        import torch
+    except ImportError:
+        return None
+    if intra_op:
+        torch.set_num_threads(intra_op)
+    if inter_op:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError:
+            pass  # can only be set before the first parallel op
+    return torch.get_num_threads()
+
+
+def estimate_text_height(gray):
+    """
+    Median height (px) of character-sized connected components, or None if nothing text-like.
+    Runs on a <=1000 px copy, so it costs a few ms even for phone photos.
+    """
+    h, w = gray.shape[:2]
+    s = min(1.0, 1000.0 / max(h, w))
+    small = cv2.resize(gray, (int(w * s), int(h * s)), interpolation=cv2.INTER_AREA) if s < 1.0 else gray
+    _, bw = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    n, _, stats, _ = cv2.connectedComponentsWithStats(bw, connectivity=8)
+    if n <= 1:
+        return None
+    hs = stats[1:, cv2.CC_STAT_HEIGHT]
+    ws = stats[1:, cv2.CC_STAT_WIDTH]
+    # characters: not specks, not lines / borders / logos
+    keep = (hs >= 4) & (hs <= small.shape[0] * 0.1) & (ws <= hs * 3)
+    if keep.sum() < 10:
+        return None
+    return float(np.median(hs[keep])) / s
+
+
+def scale_to_text_height(img, target: int = TARGET_TEXT_HEIGHT):
+    """
+    Resize img so its estimated text height is ~target px. Returns (img, scale).
+    """
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    text_h = estimate_text_height(gray)
+    if not text_h:
+        return img, 1.0
+    scale = min(MAX_UPSCALE, target / text_h)
+    if abs(scale - 1.0) < 0.1:
+        return img, 1.0
+    h, w = img.shape[:2]
+    interp = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
+    return cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=interp), scale
+
+
+def _pad_to(img, h, w):
+    # readtext_batched needs equal-sized inputs; pad with white so coordinates stay valid
+    ph, pw = h - img.shape[0], w - img.shape[1]
+    if ph == 0 and pw == 0:
+        return img
+    return cv2.copyMakeBorder(img, 0, ph, 0, pw, cv2.BORDER_CONSTANT, value=255)
+
+def size_buckets(shapes, max_pad_ratio: float = MAX_PAD_RATIO):
+    """
+    Group image indices so that, within a group, padding every image to the group's max h x w
+    adds at most max_pad_ratio x its own pixel count. Largest images first; greedy.
+    """
+    order = sorted(range(len(shapes)), key=lambda i: shapes[i][0] * shapes[i][1], reverse=True)
+    buckets = []  # [indices, max_h, max_w, min_area]
+    for i in order:
+        h, w = shapes[i][:2]
+        for b in buckets:
+            bh, bw = max(b[1], h), max(b[2], w)
+            if bh * bw <= max_pad_ratio * min(b[3], h * w):
+                b[0].append(i)
+                b[1], b[2], b[3] = bh, bw, min(b[3], h * w)
+                break
+        else:
+            buckets.append([[i], h, w, h * w])
+    return [b[0] for b in buckets]
+
+
+class OcrEngine:
+    """
+    Batched EasyOCR front-end: scales every page to the target text height, groups pages of
+    similar size, pads each group to a common size and pushes it through reader.readtext_batched
+    so the recognizer sees full batches instead of one page at a time.
+    """
+    def __init__(self, reader=None, target_text_height: int = TARGET_TEXT_HEIGHT, batch_size: int = OCR_BATCH_SIZE):
+        self._reader = reader
+        self.target_text_height = target_text_height
+        self.batch_size = batch_size
+
+    @property
+    def reader(self):
+        if self._reader is None:
+            self._reader = get_easyocr_reader()
+        return self._reader
+
+    def prepare(self, img):
+        gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        if self.target_text_height:
+            gray, _ = scale_to_text_height(gray, self.target_text_height)
+        return np.ascontiguousarray(gray)
+
+    def read_images(self, images):
+        """
+        OCR a list of images (any mix of pages / certificates). Returns one string per image.
+        """
+        if not images:
+            return []
+        prepared = [self.prepare(img) for img in images]
+        texts = [None] * len(prepared)
+        for bucket in size_buckets([p.shape for p in prepared]):
+            h = max(prepared[i].shape[0] for i in bucket)
+            w = max(prepared[i].shape[1] for i in bucket)
+            padded = [_pad_to(prepared[i], h, w) for i in bucket]
+            results = self.reader.readtext_batched(padded, batch_size=self.batch_size)
+            for i, page in zip(bucket, results):
+                texts[i] = " ".join(r[1] for r in page)
+        return texts
+
+    def read_image(self, img):
+        return self.read_images([img])[0]
+
+
+_engine = None
+def get_ocr_engine():
+    global _engine
+    if _engine is None:
+        _engine = OcrEngine()
+    return _engine
+
+
+def benchmark(paths, repeat: int = 1):
+    """
+    Pages/second of the old path (per-page readtext at a fixed 200 DPI) vs OcrEngine, on the same
+    rendered pages. Usage: python -m utils.ocr_engine file1.pdf file2.png ...
+    """
+    import fitz
+    from .qr_utils import pixmap_to_array
+
+    pages = []
+    for p in paths:
+        if p.lower().endswith(".pdf"):
+            for page in fitz.open(p):
+                pix = page.get_pixmap(dpi=200, colorspace=fitz.csGRAY)
+                pages.append(pixmap_to_array(pix))  # the view keeps pix alive
+        else:
+            img = cv2.imread(p, cv2.IMREAD_GRAYSCALE)
+            if img is not None:
+                pages.append(img)
+    if not pages:
+        raise ValueError("no readable pages")
+
+    reader = get_easyocr_reader()
+    reader.readtext(pages[0])  # warm-up, not timed
+    engine = OcrEngine(reader)
+
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for img in pages:
+            reader.readtext(img)
+    old = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        engine.read_images(pages)
+    new = time.perf_counter() - t0
+
+    n = len(pages) * repeat
+    return {"pages": n, "readtext_pages_per_s": n / old, "engine_pages_per_s": n / new, "speedup": old / new,
+            "torch_threads": configure_torch_threads()}
+
+
+if __name__ == "__main__":
+    print(benchmark(sys.argv[1:]))
@@ -0,0 +1,164 @@
+import os, re, json, hashlib
+import cv2
+import fitz  # pymupdf
+
+from .compare import extract_common_fields
+from .ocr_backends import get_ocr_backend
+from .text_cache import DEFAULT_CACHE_DIR
+
+DEFAULT_TEMPLATE_PATH = os.environ.get("CERTISCAN_OCR_TEMPLATE", os.path.join(DEFAULT_CACHE_DIR, "nptel_template.json"))
+TEMPLATE_FIELDS = ("name", "course", "cert_id", "score", "term", "roll_no")
+# boxes are padded so small shifts between the reference PDF and a scan still fit
+BOX_PAD_X = 0.03
+BOX_PAD_Y = 0.012
+ASPECT_TOLERANCE = 0.08
+MIN_MEAN_CONFIDENCE = 0.45
+
+
+def _norm(s: str):
+    return " ".join(s.upper().split())
+
+
+def _page_lines(page):
+    """
+    (text, fitz.Rect) for every text line on a PDF page.
+    """
+    out = []
+    for block in page.get_text("dict")["blocks"]:
+        for line in block.get("lines", []):
+            text = " ".join(span["text"] for span in line["spans"]).strip()
+            if text:
+                out.append((text, fitz.Rect(line["bbox"])))
+    return out
+
+
+def build_template_from_pdf(pdf_path: str, name: str = "nptel"):
+    """
+    Learn field boxes from a reference official PDF that has a text layer: run the normal
+    field extractor on its text, then look up which line each value came from.
+    Returns a template dict with boxes as page fractions.
+    """
+    doc = fitz.open(pdf_path)
+    page = doc.load_page(0)
+    lines = _page_lines(page)
+    if not lines:
+        raise ValueError("reference PDF has no text layer; cannot build an OCR template from it")
+    fields = extract_common_fields("\n".join(t for t, _ in lines))
+    # roll number sits on the line after the "Roll No" label
+    for i, (t, _) in enumerate(lines[:-1]):
+        if t.upper().startswith("ROLL NO"):
+            fields["roll_no"] = lines[i + 1][0]
+            break
+
+    W, H = page.rect.width, page.rect.height
+    boxes, used = {}, set()
+    for field in TEMPLATE_FIELDS:
+        value = _norm(fields.get(field) or "")
+        if not value:
+            continue
+        # exact line first, then a line containing the value; one line per field
+        candidates = [i for i, (t, _) in enumerate(lines) if _norm(t) == value and i not in used]
+        candidates += [i for i, (t, _) in enumerate(lines) if value in _norm(t) and i not in used]
+        if not candidates:
+            continue
+        used.add(candidates[0])
+        r = lines[candidates[0]][1]
+        boxes[field] = [max(0.0, r.x0 / W - BOX_PAD_X), max(0.0, r.y0 / H - BOX_PAD_Y),
+                        min(1.0, r.x1 / W + BOX_PAD_X), min(1.0, r.y1 / H + BOX_PAD_Y)]
+    if not boxes:
+        raise ValueError("none of the certificate fields could be located in the reference PDF")
+    return {"name": name, "aspect": W / H, "fields": boxes, "source": os.path.basename(pdf_path)}
+
+
+def save_template(template: dict, path: str = DEFAULT_TEMPLATE_PATH):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(template, f, indent=2)
+    global _template, _template_path
+    _template, _template_path = template, path
+    return path
+
+
+def register_template(pdf_path: str, path: str = DEFAULT_TEMPLATE_PATH):
+    """
+    Build a template from a reference official PDF and make it the active one.
+    """
+    return save_template(build_template_from_pdf(pdf_path), path)
+
+
+_template = None
+_template_path = None
+def load_template(path: str = DEFAULT_TEMPLATE_PATH):
+    """
+    Active template (cached), or None if none has been registered.
+    """
+    global _template, _template_path
+    if _template is None or _template_path != path:
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            _template, _template_path = json.load(f), path
+    return _template
+
+
+def template_id(template: dict = None):
+    """
+    Short content hash of a template (default: the active one), or None if none is registered.
+    Template OCR output is cached under it, so learning a new template invalidates the old text.
+    """
+    template = template or load_template()
+    if template is None:
+        return None
+    blob = json.dumps({"aspect": template["aspect"], "fields": template["fields"]}, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:12]
+
+
+def template_matches_shape(template: dict, img):
+    h, w = img.shape[:2]
+    return abs((w / h) - template["aspect"]) / template["aspect"] <= ASPECT_TOLERANCE
+
+
+def read_fields(img, template: dict, backend=None):
+    """
+    Recognition-only OCR of the template boxes (the text detector is skipped).
+    Returns {"matched": bool, "fields": {field: text}, "confidence": {field: conf}, "text": str}.
+    "text" has one line per field in reading order so the regular field extractors still work.
+    """
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    if not template_matches_shape(template, gray):
+        return {"matched": False, "fields": {}, "confidence": {}, "text": ""}
+
+    h, w = gray.shape[:2]
+    order = []
+    for field, (x0, y0, x1, y1) in template["fields"].items():
+        order.append((field, [int(x0 * w), int(x1 * w), int(y0 * h), int(y1 * h)]))
+
+    results = get_ocr_backend(backend).read_regions(gray, [box for _, box in order])
+    fields, conf = {}, {}
+    for (field, _), (text, c) in zip(order, results):
+        fields[field], conf[field] = text, c
+
+    mean_conf = sum(conf.values()) / len(conf) if conf else 0.0
+    matched = mean_conf >= MIN_MEAN_CONFIDENCE
+    if "cert_id" in fields:
+        # the certificate id is the most distinctive field; if it doesn't read as one, this isn't the layout
+        matched = matched and bool(re.search(r"NPTEL", fields["cert_id"].upper().replace(" ", "")))
+
+    lines = [fields[f] for f, _ in sorted(order, key=lambda item: (item[1][2], item[1][0])) if fields[f]]
+    if fields.get("roll_no"):
+        # keep the label so "line after Roll No" style extractors find it
+        lines.insert(lines.index(fields["roll_no"]), "Roll No")
+    return {"matched": matched, "fields": fields, "confidence": conf, "text": "\n".join(lines)}
+
+
+def ocr_with_template(img, template: dict = None, fallback=None, backend=None):
+    """
+    Template OCR with full-page fallback. fallback(img) -> str is used when no template is
+    registered or the image doesn't match it. Returns (text, used_template: bool).
+    """
+    template = template or load_template()
+    if template is not None:
+        res = read_fields(img, template, backend)
+        if res["matched"]:
+            return res["text"], True
+    return (fallback(img) if fallback else ""), False
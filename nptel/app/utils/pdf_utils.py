@@ -1,19 +1,74 @@
 import fitz  
-import easyocr
-import tempfile, os, io
-from PIL import Image
-import os
-import numpy as np
+import cv2
+import os, sys, time, threading
+from .compare import compute_sha256
+from .qr_utils import pixmap_to_array
+from .text_cache import TextCache, get_text_cache
 
+# bump EXTRACTOR_VERSION whenever extraction output changes so old cache entries stop matching
+EXTRACTOR_VERSION = "4"
+OCR_DPI = 200
+PREVIEW_DPI = 150
+# a text layer shorter than this is treated as "scanned PDF" -> OCR
+MIN_TEXT_LAYER_CHARS = 20
 
 
+# easyocr (and torch) are imported on first use, not at module import, so the apps start fast
 _reader = None
+_reader_lock = threading.Lock()
+_ocr_state = {"state": "cold", "error": None, "load_s": None}
+_warmup_thread = None
+
 def get_easyocr_reader(lang_list=('en',)):
     global _reader
     if _reader is None:
-        _reader = easyocr.Reader(list(lang_list), gpu=False)
+        with _reader_lock:
+            if _reader is None:
+                _ocr_state["state"] = "loading"
+                t0 = time.perf_counter()
+                try:
+                    import easyocr
+                    _reader = easyocr.Reader(list(lang_list), gpu=False)
+                except Exception as e:
+                    _ocr_state.update(state="failed", error=f"{type(e).__name__}: {e}")
+                    raise
+                _ocr_state.update(state="ready", error=None, load_s=time.perf_counter() - t0)
     return _reader
 
+def start_ocr_warmup():
+    """
+    Load the EasyOCR reader in a background thread (idempotent). Skipped when
+    CERTISCAN_OCR_WARMUP=0, e.g. for deployments that only see text-layer PDFs, and when
+    another OCR backend is selected (tesseract has no model to load, and torch isn't needed).
+    """
+    global _warmup_thread
+    from .ocr_backends import backend_name
+    if os.environ.get("CERTISCAN_OCR_WARMUP", "1") == "0" or backend_name() != "easyocr":
+        return None
+    if _reader is None and _warmup_thread is None:
+        def warm():
+            try:
+                get_easyocr_reader()
+            except Exception:
+                pass  # state/error are recorded for ocr_status()
+        _warmup_thread = threading.Thread(target=warm, name="easyocr-warmup", daemon=True)
+        _warmup_thread.start()
+    return _warmup_thread
+
+def ocr_ready():
+    return _reader is not None
+
+def ocr_status():
+    """
+    Readiness probe: {"state": cold|loading|ready|failed, "error", "load_s", "backend"}.
+    Only EasyOCR has a loading phase; other backends are always "ready".
+    """
+    from .ocr_backends import backend_name
+    name = backend_name()
+    if name != "easyocr":
+        return {"state": "ready", "error": None, "load_s": None, "backend": name}
+    return dict(_ocr_state, backend=name)
+
 
 
 def save_uploaded_file(uploaded_file, prefix=""):
@@ -43,51 +98,118 @@ def save_uploaded_file(uploaded_file, prefix=""):
 def render_first_page_as_image(pdf_path: str):
     doc = fitz.open(pdf_path)
     page = doc.load_page(0)
-    pix = page.get_pixmap(dpi=150)
+    pix = page.get_pixmap(dpi=PREVIEW_DPI)
     img_bytes = pix.tobytes("png")
     return img_bytes  # can be passed to st.image directly
 
-def extract_text_from_pdf_path(pdf_path: str):
+def text_layer_from_doc(doc):
     """
-    Try text extraction using PyMuPDF first. If result is empty or tiny, fallback to EasyOCR on rendered images.
+    Joined PyMuPDF text layer of all pages ("" for scanned PDFs).
     """
-    doc = fitz.open(pdf_path)
     txt_parts = []
     for page in doc:
         t = page.get_text("text")
         if t and t.strip():
             txt_parts.append(t.strip())
-    full = "\n".join(txt_parts).strip()
-    if len(full) > 20:
+    return "\n".join(txt_parts).strip()
+
+def ocr_arrays(images, backend=None):
+    """
+    OCR a list of image arrays (grayscale or BGR) in one batched pass; one string per image.
+    backend: OcrBackend instance or name ("easyocr", "tesseract"); default CERTISCAN_OCR_BACKEND.
+    """
+    from .ocr_backends import get_ocr_backend
+    return get_ocr_backend(backend).read_images(images)
+
+def ocr_array(img, backend=None):
+    return ocr_arrays([img], backend)[0]
+
+def extraction_version(backend=None):
+    # cached text depends on which OCR backend produced it
+    from .ocr_backends import backend_name
+    return f"{EXTRACTOR_VERSION}-{backend_name(backend)}"
+
+def render_page_gray(page, dpi: int = OCR_DPI):
+    # EasyOCR works on grayscale internally, so skip the RGB render + PNG round trip;
+    # the returned view holds pix, so it stays valid after this frame is gone
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    return pixmap_to_array(pix)
+
+def extract_text_from_pdf_path(pdf_path: str, backend=None):
+    """
+    Try text extraction using PyMuPDF first. If result is empty or tiny, fallback to OCR on rendered images.
+    """
+    doc = fitz.open(pdf_path)
+    full = text_layer_from_doc(doc)
+    if len(full) > MIN_TEXT_LAYER_CHARS:
         return full
     # fallback to OCR on each page (slower)
-    reader = get_easyocr_reader()
-    ocr_texts = []
-    for i, page in enumerate(doc):
-        pix = page.get_pixmap(dpi=200)
-        img_bytes = pix.tobytes("png")
-        # convert to PIL Image then to numpy for easyocr
-        img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-        results = reader.readtext(np.array(img))
-        page_text = " ".join([r[1] for r in results])
-        ocr_texts.append(page_text)
-    return "\n".join(ocr_texts)
-
-def extract_text_from_image_path(image_path: str):
-    reader = get_easyocr_reader()
-    import numpy as np, cv2
+    return "\n".join(ocr_arrays([render_page_gray(page) for page in doc], backend))
+
+def extract_text_from_image_path(image_path: str, backend=None):
+    from .preprocess import preprocess_image
     img = cv2.imread(image_path)
     if img is None:
         raise ValueError("Image not readable")
-    results = reader.readtext(img)
-    return " ".join([r[1] for r in results])
+    # rectified, deskewed, OCR-scaled and binarized instead of the raw full-resolution photo
+    return ocr_array(preprocess_image(img).ocr, backend)
 
-def extract_text_from_file(path_or_tempfile: str):
-    """
-    Generic helper: if PDF -> extract_text_from_pdf_path else -> extract_text_from_image_path
-    """
+def _extract_text_uncached(path_or_tempfile: str, backend=None):
     ext = os.path.splitext(path_or_tempfile)[1].lower()
     if ext == ".pdf":
-        return extract_text_from_pdf_path(path_or_tempfile)
+        return extract_text_from_pdf_path(path_or_tempfile, backend)
     else:
-        return extract_text_from_image_path(path_or_tempfile)
+        return extract_text_from_image_path(path_or_tempfile, backend)
+
+def extract_text_from_file(path_or_tempfile: str, cache: TextCache = None, use_cache: bool = True, backend=None):
+    """
+    Generic helper: if PDF -> extract_text_from_pdf_path else -> extract_text_from_image_path
+    Results are cached on disk by SHA-256 + extractor version/backend + OCR DPI, so re-verifying a
+    known file (or the same official PDF for many students) costs one hash instead of an OCR pass.
+    """
+    if not use_cache:
+        return _extract_text_uncached(path_or_tempfile, backend)
+    cache = cache or get_text_cache()
+    key = TextCache.make_key(compute_sha256(path_or_tempfile), extraction_version(backend), OCR_DPI)
+    text = cache.get(key)
+    if text is None:
+        text = _extract_text_uncached(path_or_tempfile, backend)
+        cache.put(key, text)
+    return text
+
+
+def benchmark_startup(sample_pdf: str = None):
+    """
+    Cold-start numbers, each import measured in a fresh interpreter:
+    import of this module, import of easyocr/torch, reader construction, and (if sample_pdf
+    has a text layer) time to first extracted text without touching OCR.
+    Usage: cd nptel/app && python -m utils.pdf_utils [sample.pdf]
+    """
+    import subprocess, json
+    pkg = (__spec__.name if __spec__ else __name__).rsplit(".", 1)[0]
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    def fresh(code):
+        out = subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True, text=True, check=True)
+        return json.loads(out.stdout.strip().splitlines()[-1])
+
+    res = {"import_pdf_utils_s": fresh(
+        f"import time,json;t=time.perf_counter();import {pkg}.pdf_utils;print(json.dumps(time.perf_counter()-t))")}
+    try:
+        res["import_easyocr_s"] = fresh(
+            "import time,json;t=time.perf_counter();import easyocr;print(json.dumps(time.perf_counter()-t))")
+        res["reader_load_s"] = fresh(
+            f"import json;from {pkg}.pdf_utils import get_easyocr_reader,ocr_status;get_easyocr_reader();"
+            "print(json.dumps(ocr_status()['load_s']))")
+    except subprocess.CalledProcessError as e:
+        res["easyocr_error"] = e.stderr.strip().splitlines()[-1] if e.stderr else str(e)
+    if sample_pdf:
+        res["first_text_layer_s"] = fresh(
+            f"import time,json;t=time.perf_counter();from {pkg}.pdf_utils import extract_text_from_file,ocr_status;"
+            f"extract_text_from_file({os.path.abspath(sample_pdf)!r}, use_cache=False);"
+            "print(json.dumps([time.perf_counter()-t, ocr_status()['state']]))")
+    return res
+
+
+if __name__ == "__main__":
+    print(benchmark_startup(sys.argv[1] if len(sys.argv) > 1 else None))
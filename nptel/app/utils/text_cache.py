@@ -0,0 +1,87 @@
+import os, time, sqlite3, threading
+
+# Default location can be moved with CERTISCAN_CACHE_DIR; size cap with CERTISCAN_TEXT_CACHE_MB.
+DEFAULT_CACHE_DIR = os.environ.get("CERTISCAN_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "certiscan"))
+DEFAULT_MAX_BYTES = int(float(os.environ.get("CERTISCAN_TEXT_CACHE_MB", "256")) * 1024 * 1024)
+
+
+class TextCache:
+    """
+    On-disk cache of extracted certificate text, keyed by content hash + extractor version + DPI.
+    SQLite in WAL mode so several processes (Streamlit, batch workers) can share one file.
+    Entries are evicted least-recently-used once the stored text exceeds max_bytes.
+    """
+    def __init__(self, path: str = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "text_cache.sqlite")
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as con:
+            con.execute("""CREATE TABLE IF NOT EXISTS text_cache (
+                key TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL)""")
+            con.execute("CREATE INDEX IF NOT EXISTS text_cache_lru ON text_cache(last_access)")
+
+    def _conn(self):
+        # one connection per thread, and a fresh one after fork (pool workers)
+        con = getattr(self._local, "con", None)
+        if con is None or self._local.pid != os.getpid():
+            con = sqlite3.connect(self.path, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con, self._local.pid = con, os.getpid()
+        return con
+
+    @staticmethod
+    def make_key(sha256: str, version: str, dpi: int):
+        return f"{sha256}:{version}:{dpi}"
+
+    def get(self, key: str):
+        con = self._conn()
+        row = con.execute("SELECT text FROM text_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with con:
+            con.execute("UPDATE text_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, key: str, text: str):
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        con = self._conn()
+        with con:
+            con.execute("INSERT OR REPLACE INTO text_cache(key, text, size, last_access) VALUES (?, ?, ?, ?)",
+                        (key, text, size, time.time()))
+            self._evict(con)
+
+    def _evict(self, con):
+        total = con.execute("SELECT COALESCE(SUM(size), 0) FROM text_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        victims = []
+        for key, size in con.execute("SELECT key, size FROM text_cache ORDER BY last_access ASC"):
+            victims.append((key,))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+        con.executemany("DELETE FROM text_cache WHERE key = ?", victims)
+
+    def clear(self):
+        with self._conn() as con:
+            con.execute("DELETE FROM text_cache")
+
+    def stats(self):
+        n, total = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM text_cache").fetchone()
+        return {"entries": n, "bytes": total, "max_bytes": self.max_bytes, "path": self.path}
+
+
+_cache = None
+def get_text_cache():
+    global _cache
+    if _cache is None:
+        _cache = TextCache()
+    return _cache
@@ -0,0 +1,123 @@
+import time
+from .compare import text_similarity_score, extract_common_fields, aggregate_score
+from .fields import CERT_ID_RE
+from .visual import visual_compare, VISUAL_ENABLED
+from .tracing import span
+
+# same thresholds the Streamlit apps use for the final decision
+VERIFIED_THRESHOLD = 0.9
+SUSPICIOUS_THRESHOLD = 0.6
+# text-layer scores are exact (no OCR noise), so only clear-cut ones stop there; anything in
+# between goes on to OCR of the rendered page
+TEXT_LAYER_VERIFIED_AT = 0.95
+TEXT_LAYER_FAKE_BELOW = 0.40
+TIERS = ("hash", "qr_cert_id", "text_layer", "visual", "ocr")
+
+
+def verdict_for_score(score: float):
+    if score >= VERIFIED_THRESHOLD:
+        return "VERIFIED"
+    if score >= SUSPICIOUS_THRESHOLD:
+        return "SUSPICIOUS"
+    return "FAKE"
+
+
+def cert_id_from_qr(qr_data: str):
+    """
+    NPTEL certificate id embedded in the QR URL (…/Ecertificate/?q=NPTEL23…), or None.
+    """
+    m = CERT_ID_RE.search(qr_data or "")
+    return m.group(0).upper() if m else None
+
+
+class _Tiers:
+    """
+    Runs tiers in order until one returns a verdict; records time and outcome per tier.
+    """
+    def __init__(self):
+        self.timings = []
+        self.verdict = None
+        self.decided_by = None
+
+    def run(self, tier, fn):
+        if self.verdict is not None:
+            return
+        t0 = time.perf_counter()
+        with span(f"tier_{tier}") as s:
+            outcome = fn()
+            s["outcome"] = outcome or "pass"
+        self.timings.append({"tier": tier, "ms": (time.perf_counter() - t0) * 1000.0, "outcome": outcome or "pass"})
+        if outcome:
+            self.verdict, self.decided_by = outcome, tier
+
+
+def verify_tiered(user, official, qr_data: str = None, backend=None, visual: bool = VISUAL_ENABLED):
+    """
+    Cheap-first decision for two CertificateDocuments:
+      hash        identical PDFs                                   -> VERIFIED
+      qr_cert_id  QR certificate id != official certificate id      -> FAKE
+      text_layer  both text layers, score >= TEXT_LAYER_VERIFIED_AT -> VERIFIED, < TEXT_LAYER_FAKE_BELOW -> FAKE
+      visual      pHash/dHash + block SSIM vs the stored official fingerprint; feeds the OCR tier's aggregate_score
+      ocr         OCR of the user's rendered page vs the official text, verdict_for_score
+    Returns {"verdict", "final_score", "decided_by", "tiers": [{"tier", "ms", "outcome"}], "details", ...}
+    plus "user_text" / "official_text" when a text tier ran and "visual_heatmap" when the visual check did.
+    """
+    t = _Tiers()
+    out = {"final_score": None, "details": {}}
+
+    def score(u_text, o_text):
+        with span("fields"):
+            u_fields, o_fields = extract_common_fields(u_text), extract_common_fields(o_text)
+        with span("score"):
+            sim = text_similarity_score(u_text, o_text)
+            final, details = aggregate_score(u_fields, o_fields, sim, out.get("visual_score"))
+        out.update(text_similarity=sim, user_fields=u_fields, official_fields=o_fields, final_score=final,
+                   details=details, user_text=u_text, official_text=o_text)
+        return final
+
+    def hash_tier():
+        if user.is_pdf and official.is_pdf and user.sha256 == official.sha256:
+            out.update(final_score=1.0, details={"hash_match": True})
+            return "VERIFIED"
+
+    def qr_tier():
+        qr_id = cert_id_from_qr(qr_data)
+        # only the official text layer is cheap here; a scanned official leaves this to later tiers
+        official_id = extract_common_fields(official.text_layer()).get("cert_id") if official.has_text_layer() else None
+        out.update(qr_cert_id=qr_id, official_cert_id=official_id)
+        if qr_id and official_id and qr_id != official_id:
+            out.update(final_score=0.0, details={"qr_cert_id_mismatch": True})
+            return "FAKE"
+
+    def visual_tier():
+        # never decides on its own: a re-saved or printed genuine certificate differs visually too
+        if not visual:
+            return None
+        try:
+            res = visual_compare(user, official)
+        except Exception as e:
+            out["visual_error"] = str(e)
+            return None
+        out["visual"] = {k: v for k, v in res.items() if k != "heatmap"}
+        out["visual_score"], out["visual_heatmap"] = res["visual_score"], res["heatmap"]
+
+    def text_layer_tier():
+        if not (user.is_pdf and user.has_text_layer() and official.has_text_layer()):
+            return None
+        final = score(user.text_layer(), official.text_layer())
+        if final >= TEXT_LAYER_VERIFIED_AT:
+            return "VERIFIED"
+        if final < TEXT_LAYER_FAKE_BELOW:
+            return "FAKE"
+
+    def ocr_tier():
+        return verdict_for_score(score(user.text(backend=backend, ocr=True), official.text(backend=backend)))
+
+    t.run("hash", hash_tier)
+    t.run("qr_cert_id", qr_tier)
+    t.run("text_layer", text_layer_tier)
+    # only reached when the text layer is missing or inconclusive: renders both pages
+    t.run("visual", visual_tier)
+    t.run("ocr", ocr_tier)
+    out.update(verdict=t.verdict, decided_by=t.decided_by, tiers=t.timings)
+    return out
@@ -0,0 +1,235 @@
+import os, time, threading, contextvars
+from contextlib import contextmanager
+
+TRACING_ENABLED = os.environ.get("CERTISCAN_TRACING", "1") != "0"
+# histogram buckets in seconds: cached lookups take milliseconds, OCR and browser fetches many seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+HELP = {
+    "certiscan_stage_seconds": "Time spent in a pipeline stage.",
+    "certiscan_stage_total": "Pipeline stage runs by outcome.",
+    "certiscan_stage_failures_total": "Pipeline stage failures by exception type.",
+    "certiscan_ocr_page_seconds": "OCR time per page.",
+    "certiscan_cache_requests_total": "Cache lookups by cache and result (hit / miss / revalidated).",
+    "certiscan_jobs_total": "API verification jobs finished, by status.",
+    "certiscan_job_seconds": "Wall time of an API verification job in its worker.",
+}
+
+
+class Metrics:
+    """
+    Process-wide counters and histograms, rendered in the Prometheus text format.
+    """
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}    # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [count per bucket..., +Inf count, sum]
+
+    def inc(self, name: str, labels: dict = None, value: float = 1.0):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, seconds: float, labels: dict = None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, b in enumerate(self.buckets):
+                if seconds <= b:
+                    h[i] += 1
+            h[-2] += 1
+            h[-1] += seconds
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self, extra=()):
+        """
+        Prometheus exposition text. extra: (name, type, help, [(labels dict, value)]) families
+        computed at scrape time, e.g. queue gauges.
+        """
+        fmt = lambda labels: "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}" if labels else ""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items())
+        lines, typed = [], set()
+
+        def header(name, kind, help_text=None):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# HELP {name} {help_text or HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{fmt(labels)} {value:g}")
+        for (name, labels), h in histograms:
+            header(name, "histogram")
+            for b, n in zip(self.buckets + ("+Inf",), h[:-1]):
+                lines.append(f"{name}_bucket{fmt(labels + (('le', str(b)),))} {n}")
+            lines.append(f"{name}_sum{fmt(labels)} {h[-1]:.6f}")
+            lines.append(f"{name}_count{fmt(labels)} {h[-2]}")
+        for name, kind, help_text, samples in extra:
+            header(name, kind, help_text)
+            for labels, value in samples:
+                lines.append(f"{name}{fmt(tuple(sorted(labels.items())))} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+metrics = Metrics()
+
+
+class Trace:
+    """
+    Spans and cache events of one verification, in the order they finished.
+    """
+    def __init__(self):
+        self.spans = []
+
+    def totals(self):
+        """
+        {stage: self ms} over all spans, see stage_totals.
+        """
+        return stage_totals(self.spans)
+
+
+def self_ms(s: dict):
+    """
+    Time of a span minus the spans nested in it (a tier_ocr span contains ocr, fields and score).
+    """
+    return max(0.0, s["ms"] - s.get("child_ms", 0.0))
+
+
+def stage_totals(spans):
+    """
+    {stage: ms} summed over self time, so nested stages aren't counted twice and the values add
+    up to the wall time of the outermost spans ("verify" keeps what no inner stage accounts for).
+    """
+    out = {}
+    for s in spans or ():
+        if "ms" in s:
+            out[s["stage"]] = out.get(s["stage"], 0.0) + self_ms(s)
+    return out
+
+
+_current = contextvars.ContextVar("certiscan_trace", default=None)
+_open_span = contextvars.ContextVar("certiscan_open_span", default=None)
+
+
+def current_trace():
+    return _current.get()
+
+
+def start_trace():
+    """
+    Make a new Trace current for the rest of this context (a Streamlit script run) and return it.
+    """
+    tr = Trace()
+    _current.set(tr)
+    return tr
+
+
+@contextmanager
+def trace():
+    """
+    Collect the spans of everything run inside the block; they are also added to an enclosing trace.
+    """
+    parent, tr = _current.get(), Trace()
+    token = _current.set(tr)
+    try:
+        yield tr
+    finally:
+        _current.reset(token)
+        if parent is not None:
+            parent.spans.extend(tr.spans)
+
+
+def record_span(s: dict, to_trace: bool = True):
+    """
+    Count a finished span {"stage", "ms", "outcome", "error"?, "pages"?} in the metrics.
+    """
+    labels = {"stage": s["stage"]}
+    metrics.observe("certiscan_stage_seconds", s["ms"] / 1000.0, labels)
+    metrics.inc("certiscan_stage_total", dict(labels, outcome=s["outcome"]))
+    if s.get("error"):
+        metrics.inc("certiscan_stage_failures_total", dict(labels, reason=s["error"]))
+    if s.get("pages"):
+        for _ in range(s["pages"]):
+            metrics.observe("certiscan_ocr_page_seconds", s["ms"] / 1000.0 / s["pages"])
+    tr = _current.get()
+    if to_trace and tr is not None:
+        tr.spans.append(s)
+
+
+def record_spans(spans):
+    """
+    Count spans that were traced in another process (pool workers return them with the result).
+    """
+    for s in spans or ():
+        if "ms" in s:
+            record_span(s, to_trace=False)
+        elif "cache" in s:
+            metrics.inc("certiscan_cache_requests_total", {"cache": s["cache"], "result": s["result"]})
+
+
+@contextmanager
+def span(stage: str, **attrs):
+    """
+    Time a pipeline stage. The yielded dict can be updated inside the block, e.g. with
+    s["outcome"] = "none"; an exception marks the span "error" with its type as the reason.
+    """
+    s = {"stage": stage, **attrs}
+    if not TRACING_ENABLED:
+        yield s
+        return
+    parent, token = _open_span.get(), _open_span.set(s)
+    t0 = time.perf_counter()
+    try:
+        yield s
+    except Exception as e:
+        s["outcome"], s["error"] = "error", type(e).__name__
+        raise
+    finally:
+        s["ms"] = (time.perf_counter() - t0) * 1000.0
+        _open_span.reset(token)
+        if parent is not None:
+            parent["child_ms"] = parent.get("child_ms", 0.0) + s["ms"]
+        s.setdefault("outcome", "ok")
+        record_span(s)
+
+
+def cache_event(cache: str, result: str):
+    """
+    Count a cache lookup: result is "hit", "miss" or "revalidated".
+    """
+    if not TRACING_ENABLED:
+        return
+    metrics.inc("certiscan_cache_requests_total", {"cache": cache, "result": result})
+    tr = _current.get()
+    if tr is not None:
+        tr.spans.append({"cache": cache, "result": result})
+
+
+def render_debug_panel(st, tr: Trace, expanded: bool = False):
+    """
+    Streamlit expander with the stage timings and cache events of tr, plus this process's
+    metrics. st is the streamlit module or a container such as st.sidebar (utils doesn't import it).
+    """
+    box = st.expander("Debug: stage timings", expanded=expanded)
+    spans = [s for s in tr.spans if "ms" in s]
+    if spans:
+        box.table([{"stage": s["stage"], "ms": round(s["ms"], 1), "outcome": s["outcome"],
+                    "error": s.get("error", "")} for s in spans])
+        box.write({k: round(v, 1) for k, v in sorted(tr.totals().items(), key=lambda kv: -kv[1])})
+    caches = [s for s in tr.spans if "cache" in s]
+    if caches:
+        box.write("Cache lookups: " + ", ".join(f"{c['cache']} {c['result']}" for c in caches))
+    box.code(metrics.render(), language="text")
@@ -1,3 +1,84 @@
-from django.shortcuts import render
+import os, uuid
+from django.conf import settings
+from django.db.models import Count
+from django.http import HttpResponse
+from django.core.files.storage import default_storage
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from .jobs import enqueue
+from .models import VerificationJob
+from .serializers import VerifyUploadSerializer, VerificationJobSerializer
+from .utils.tracing import metrics as pipeline_metrics
+
+
+def _store_upload(f, job_dir: str):
+    name = default_storage.save(os.path.join("uploads", job_dir, os.path.basename(f.name)), f)
+    return default_storage.path(name)
+
+
+def _job_links(request, job):
+    return {
+        "status_url": request.build_absolute_uri(reverse("job-status", args=[job.pk])),
+        "result_url": request.build_absolute_uri(reverse("job-result", args=[job.pk])),
+    }
+
+
+class VerifyView(APIView):
+    """
+    POST user_file (+ optional official_file) -> 202 with a job id; verification runs in the background.
+    A file already in the ledger comes back finished, with 200 and the stored result.
+    """
+    parser_classes = [MultiPartParser, FormParser]
+
+    def post(self, request):
+        ser = VerifyUploadSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        job_dir = uuid.uuid4().hex
+        user_path = _store_upload(ser.validated_data["user_file"], job_dir)
+        official = ser.validated_data.get("official_file")
+        official_path = _store_upload(official, job_dir) if official else None
+        job = enqueue(user_path, official_path)
+        body = VerificationJobSerializer(job).data
+        body.update(_job_links(request, job))
+        if job.status == VerificationJob.DONE:
+            body["result"] = job.result
+            return Response(body)
+        return Response(body, status=status.HTTP_202_ACCEPTED)
+
+
+class JobStatusView(APIView):
+    def get(self, request, job_id):
+        job = get_object_or_404(VerificationJob, pk=job_id)
+        body = VerificationJobSerializer(job).data
+        body.update(_job_links(request, job))
+        return Response(body)
+
+
+class JobResultView(APIView):
+    """
+    202 while the job is queued / running, 200 with the verification result (or error) once finished.
+    """
+    def get(self, request, job_id):
+        job = get_object_or_404(VerificationJob, pk=job_id)
+        body = VerificationJobSerializer(job).data
+        if job.status in (VerificationJob.QUEUED, VerificationJob.RUNNING):
+            body.update(_job_links(request, job))
+            return Response(body, status=status.HTTP_202_ACCEPTED)
+        body["result"] = job.result
+        return Response(body)
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint: stage latencies, cache hits and failures counted in this process
+    (API jobs report the spans their worker timed), plus the job queue by status.
+    """
+    by_status = dict(VerificationJob.objects.values_list("status").annotate(n=Count("pk")).order_by())
+    queue = ("certiscan_jobs", "gauge", "Verification jobs in the database by status.",
+             [({"status": st}, by_status.get(st, 0)) for st, _ in VerificationJob.STATUS_CHOICES])
+    return HttpResponse(pipeline_metrics.render([queue]), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -37,7 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    # 'rest_framework',
+    'rest_framework',
     'app'
 ]
 
@@ -118,6 +118,15 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded certificates for the verification API
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Verification API: background worker processes started by the web process on the first upload
+# (set CERTISCAN_INPROCESS_WORKERS = False and run `manage.py run_verification_workers` instead)
+CERTISCAN_API_WORKERS = 2
+CERTISCAN_INPROCESS_WORKERS = True
+CERTISCAN_OFFICIAL_DIR = str(BASE_DIR / 'media' / 'official')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,128 @@
+import asyncio, time, contextvars, functools
+from concurrent.futures import ThreadPoolExecutor
+
+from .document import CertificateDocument
+from .pipeline import apply_decision
+from .tiers import verify_tiered
+from .fetch_official import fetch_official_pdf
+from .official_store import get_official_store
+from .tracing import trace, span
+
+# seconds per stage; None disables the limit
+DEFAULT_TIMEOUTS = {"qr": 30, "fetch": 120, "ocr_user": 300, "decide": 600}
+
+_cpu_executor = None
+def get_cpu_executor():
+    # PyMuPDF / OpenCV / torch release the GIL for the heavy parts, so threads overlap fine
+    global _cpu_executor
+    if _cpu_executor is None:
+        _cpu_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="certiscan-cpu")
+    return _cpu_executor
+
+
+class StageTimeout(RuntimeError):
+    pass
+
+
+class _Stages:
+    def __init__(self, timeouts, executor):
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.executor = executor
+        self.timings = {}
+
+    async def run(self, name, fn, *args, executor=None):
+        """
+        Run a blocking stage in an executor under its timeout and record its wall time.
+        The stage runs in a copy of the caller's context, so its spans land in the caller's trace.
+        """
+        loop = asyncio.get_running_loop()
+        call = functools.partial(contextvars.copy_context().run, fn, *args)
+        t0 = time.perf_counter()
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(executor, call), self.timeouts.get(name))
+        except asyncio.TimeoutError:
+            raise StageTimeout(f"stage '{name}' timed out after {self.timeouts.get(name)}s") from None
+        finally:
+            self.timings[name] = time.perf_counter() - t0
+
+
+async def verify_async(user_path: str, official_path: str = None, official_dir: str = None,
+                       timeouts: dict = None, executor=None):
+    """
+    Asyncio version of pipeline.verify_certificate, with the same CertificateDocument / verify_tiered
+    decision and result. When the user file has no text layer (scan / photo) its OCR starts as soon
+    as the QR is decoded and runs while the official PDF is being fetched, so end-to-end time is
+    roughly max(fetch, user OCR) + the rest instead of their sum.
+    CPU stages run on `executor` (default: shared thread pool; the documents are shared between
+    stages, so it must be a thread pool), network stages on the loop's default executor.
+    Each stage has a timeout (DEFAULT_TIMEOUTS) and a failure cancels the stages still waiting.
+    Cancellation only stops waiting: a stage already running in a thread (OCR, a download) can't
+    be interrupted and finishes in the background, holding its executor slot until it does.
+    """
+    with trace() as tr:
+        with span("verify") as s:
+            result = await _verify_async(user_path, official_path, official_dir, timeouts, executor)
+            s["outcome"], s["decided_by"] = result.get("verdict") or "none", result.get("decided_by")
+    result["trace"] = tr.spans
+    return result
+
+
+async def _verify_async(user_path, official_path, official_dir, timeouts, executor):
+    t0 = time.perf_counter()
+    st = _Stages(timeouts, executor or get_cpu_executor())
+    result = {"user_path": user_path, "official_path": official_path, "qr": None}
+
+    user = CertificateDocument(user_path)
+    try:
+        qr = await st.run("qr", user.qr, executor=st.executor)
+        result["qr"], result["qr_stage"], result["qr_timings"] = qr["data"], qr["stage"], qr["timings"]
+    except Exception as e:
+        result["qr_error"] = str(e)
+
+    user_ocr = None
+    try:
+        if not official_path:
+            if not result["qr"]:
+                raise RuntimeError("No QR found and no official certificate given")
+            if not (user.is_pdf and user.has_text_layer()):
+                # the text tiers can't decide without OCR of this file, so start it now
+                user_ocr = asyncio.ensure_future(
+                    st.run("ocr_user", functools.partial(user.text, ocr=True), executor=st.executor))
+            official_path = await st.run("fetch", fetch_official_pdf, result["qr"], get_official_store(official_dir))
+            result["official_path"] = official_path
+        if user_ocr is not None:
+            await user_ocr
+    except BaseException:
+        if user_ocr is not None:
+            user_ocr.cancel()
+        raise
+
+    official = CertificateDocument(official_path)
+    decision = await st.run("decide", verify_tiered, user, official, result["qr"], executor=st.executor)
+    apply_decision(result, user, official, decision)
+    result.update(stage_timings=st.timings, elapsed_s=time.perf_counter() - t0)
+    return result
+
+
+async def verify_many_async(paths, concurrency: int = 4, **kwargs):
+    """
+    Verify several certificates with at most `concurrency` pipelines in flight.
+    Returns results in input order; failures are returned as {"user_path", "error"} dicts.
+    """
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(path):
+        async with sem:
+            try:
+                return await verify_async(path, **kwargs)
+            except Exception as e:
+                return {"user_path": path, "error": f"{type(e).__name__}: {e}"}
+
+    return await asyncio.gather(*(one(p) for p in paths))
+
+
+def verify(user_path: str, **kwargs):
+    """
+    Blocking helper for scripts: asyncio.run(verify_async(...)).
+    """
+    return asyncio.run(verify_async(user_path, **kwargs))
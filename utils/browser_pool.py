@@ -0,0 +1,214 @@
+import os, time, queue, threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+DEFAULT_POOL_SIZE = int(os.environ.get("CERTISCAN_BROWSER_POOL", "2"))
+DEFAULT_MAX_USES = 50     # recycle a browser after this many pages (Chrome leaks memory)
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_PAGE_LOAD_TIMEOUT = 30  # seconds for one driver.get()
+# upper bound on one run() (queue wait included); a stuck page would otherwise hold a browser forever
+DEFAULT_TASK_TIMEOUT = float(os.environ.get("CERTISCAN_BROWSER_TIMEOUT", "90"))
+
+
+class PoolSaturatedError(RuntimeError):
+    pass
+
+
+_driver_path = None
+_driver_path_lock = threading.Lock()
+def get_chromedriver_path():
+    """
+    Resolve the chromedriver binary once per process instead of once per fetch.
+    """
+    global _driver_path
+    with _driver_path_lock:
+        if _driver_path is None:
+            from webdriver_manager.chrome import ChromeDriverManager
+            _driver_path = ChromeDriverManager().install()
+        return _driver_path
+
+
+def start_headless_chrome():
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    return webdriver.Chrome(service=Service(get_chromedriver_path()), options=options)
+
+
+def _browser_alive(driver):
+    try:
+        driver.current_url
+        return True
+    except Exception:
+        return False
+
+
+class BrowserPool:
+    """
+    N long-lived headless browsers, each owned by one worker thread, fed from a bounded queue.
+
+    - browsers are started up front, so fetches don't pay Chrome cold start
+    - a browser is recycled after max_uses tasks and after any failed task
+    - page loads are capped by page_load_timeout, and run() by task_timeout: a task that overruns
+      has its browser quit (which aborts the stuck call) and raises TimeoutError
+    - submit() raises PoolSaturatedError when the queue is full (caller decides to wait or fail)
+    - metrics() reports busy / queued / recycled / timed-out counts and queue wait time
+    """
+    def __init__(self, size: int = DEFAULT_POOL_SIZE, max_uses: int = DEFAULT_MAX_USES,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, driver_factory=start_headless_chrome,
+                 page_load_timeout: float = DEFAULT_PAGE_LOAD_TIMEOUT, task_timeout: float = DEFAULT_TASK_TIMEOUT):
+        self.size = size
+        self.max_uses = max_uses
+        self.driver_factory = driver_factory
+        self.page_load_timeout = page_load_timeout
+        self.task_timeout = task_timeout
+        self._tasks = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._running = {}  # Future -> the driver its task is using
+        self._stats = {"busy": 0, "completed": 0, "failed": 0, "started": 0, "recycled": 0,
+                       "crashed": 0, "timed_out": 0, "rejected": 0, "wait_s_total": 0.0, "run_s_total": 0.0}
+        self._closed = False
+        self._workers = [threading.Thread(target=self._worker_loop, name=f"browser-{i}", daemon=True)
+                         for i in range(size)]
+        for t in self._workers:
+            t.start()
+
+    def _count(self, **deltas):
+        with self._lock:
+            for k, v in deltas.items():
+                self._stats[k] += v
+
+    def _start_driver(self):
+        driver = self.driver_factory()
+        self._count(started=1)
+        if self.page_load_timeout:
+            driver.set_page_load_timeout(self.page_load_timeout)
+        return driver
+
+    def _quit(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def _worker_loop(self):
+        driver, uses = None, 0
+        try:
+            driver = self._start_driver()
+        except Exception:
+            driver = None  # retried lazily on the first task
+        while True:
+            item = self._tasks.get()
+            if item is None:
+                break
+            fn, fut, queued_at = item
+            if not fut.set_running_or_notify_cancel():
+                continue
+            self._count(busy=1, wait_s_total=time.perf_counter() - queued_at)
+            t0 = time.perf_counter()
+            try:
+                if driver is None:
+                    driver = self._start_driver()
+                    uses = 0
+                with self._lock:
+                    self._running[fut] = driver
+                fut.set_result(fn(driver))
+                self._count(completed=1)
+            except BaseException as e:
+                fut.set_exception(e)
+                self._count(failed=1)
+                if driver is not None:
+                    # a failed task may leave a half-loaded page or a dead session: start fresh
+                    self._count(**({"recycled": 1} if _browser_alive(driver) else {"crashed": 1}))
+                    self._quit(driver)
+                    driver = None
+            finally:
+                uses += 1
+                with self._lock:
+                    self._running.pop(fut, None)
+                self._count(busy=-1, run_s_total=time.perf_counter() - t0)
+            if driver is not None and uses >= self.max_uses:
+                self._quit(driver)
+                driver = None
+                self._count(recycled=1)
+            elif driver is not None:
+                try:
+                    # don't leak one student's session into the next fetch
+                    driver.delete_all_cookies()
+                    driver.get("about:blank")
+                except Exception:
+                    pass
+        if driver is not None:
+            self._quit(driver)
+
+    def submit(self, fn, block: bool = True, timeout: float = None) -> Future:
+        """
+        Queue fn(driver) to run on a pooled browser. Returns a Future.
+        """
+        if self._closed:
+            raise RuntimeError("BrowserPool is shut down")
+        fut = Future()
+        try:
+            self._tasks.put((fn, fut, time.perf_counter()), block=block, timeout=timeout)
+        except queue.Full:
+            self._count(rejected=1)
+            raise PoolSaturatedError(f"browser pool queue full ({self._tasks.maxsize} waiting)")
+        return fut
+
+    def run(self, fn, timeout: float = None):
+        """
+        fn(driver) on a pooled browser, waiting at most timeout seconds (default task_timeout;
+        0 waits forever). On timeout a queued task is cancelled and a running one has its
+        browser quit, so the worker moves on with a fresh one; TimeoutError is raised.
+        """
+        timeout = self.task_timeout if timeout is None else timeout
+        fut = self.submit(fn)
+        try:
+            return fut.result(timeout or None)
+        except FutureTimeout:
+            self._count(timed_out=1)
+            if not fut.cancel():
+                with self._lock:
+                    driver = self._running.get(fut)
+                if driver is not None:
+                    self._quit(driver)
+            raise TimeoutError(f"browser task did not finish within {timeout}s") from None
+
+    def metrics(self):
+        with self._lock:
+            m = dict(self._stats)
+        done = m["completed"] + m["failed"]
+        m.update(
+            size=self.size,
+            queued=self._tasks.qsize(),
+            queue_capacity=self._tasks.maxsize,
+            saturation=m["busy"] / self.size if self.size else 0.0,
+            avg_wait_s=m["wait_s_total"] / done if done else 0.0,
+            avg_run_s=m["run_s_total"] / done if done else 0.0,
+        )
+        return m
+
+    def shutdown(self, wait: bool = True):
+        self._closed = True
+        for _ in self._workers:
+            self._tasks.put(None)
+        if wait:
+            for t in self._workers:
+                t.join()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+def get_browser_pool():
+    """
+    Process-wide pool, created (and its browsers started) on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+        return _pool
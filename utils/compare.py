@@ -1,113 +1,103 @@
-import hashlib, re
-from rapidfuzz import fuzz
+import hashlib
+from functools import lru_cache
+import numpy as np
+from rapidfuzz import fuzz, process
+
+from .fields import extract_common_fields as _extract_common_fields
 
 def compute_sha256(path: str):
     h = hashlib.sha256()
     with open(path, "rb") as f:
         while True:
-            chunk = f.read(8192)
+            chunk = f.read(1024 * 1024)
             if not chunk:
                 break
             h.update(chunk)
     return h.hexdigest()
 
+NORMALIZED_CACHE_SIZE = 2048
+
+class NormalizedText:
+    """
+    Text prepared once for token-set comparison: case-folded, whitespace-collapsed, its token set
+    and the sorted unique tokens joined by spaces. token_set_ratio only looks at the token sets,
+    so scoring the sorted strings gives the same result with no duplicate tokens to re-process.
+    """
+    __slots__ = ("folded", "tokens", "sorted")
+
+    def __init__(self, text: str):
+        words = text.casefold().split()
+        self.folded = " ".join(words)
+        self.tokens = frozenset(words)
+        self.sorted = " ".join(sorted(self.tokens))
+
+@lru_cache(maxsize=NORMALIZED_CACHE_SIZE)
+def normalize_text(text: str) -> NormalizedText:
+    """
+    Memoized NormalizedText: the cache is keyed by the string, whose hash Python computes once and
+    keeps, so one official text checked against many resubmissions is only processed once.
+    """
+    return NormalizedText(text)
+
+def token_set_score(a, b):
+    """
+    Case-insensitive token_set_ratio (0..100) of two strings or NormalizedTexts.
+    """
+    a = a if isinstance(a, NormalizedText) else normalize_text(a or "")
+    b = b if isinstance(b, NormalizedText) else normalize_text(b or "")
+    if not a.tokens or not b.tokens:
+        return 0.0
+    # one token set inside the other always scores 100; skip rapidfuzz for exact / subset matches
+    if a.tokens <= b.tokens or b.tokens <= a.tokens:
+        return 100.0
+    return fuzz.token_set_ratio(a.sorted, b.sorted)
+
 def text_similarity_score(a: str, b: str):
     """
     Return a 0..100 similarity using rapidfuzz token_set_ratio
     """
     if not a or not b:
         return 0.0
-    return fuzz.token_set_ratio(a, b)
+    return token_set_score(a, b)
 
 def extract_common_fields(text: str):
     """
     Heuristic extraction of fields: certificate id (NPTEL...), candidate name (all-caps line), course name (line with week or known words), score numbers.
     Returns dict with keys: name, course, cert_id, score, term
+    The rules live in utils/fields.py (precompiled, single pass over the lines).
     """
-    if not text:
-        return {}
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
-    text_upper = text.upper()
-    # cert id
-    cert_id = None
-    m = re.search(r'(NPTEL[0-9A-Z\-]{4,})', text_upper)
-    if m:
-        cert_id = m.group(1)
-
-    # try to find name: look for a line with 2-4 words and mostly alphabets (not too long), often in Title Case or UPPER
-    candidate_name = None
-    for ln in lines[:12]:  # first 12 lines probably contain name/course
-        words = ln.split()
-        if 1 < len(words) <= 4 and all(re.match(r'^[A-Z][A-Z\.\-]*$', w) or re.match(r'^[A-Z][a-z\-]+$', w) for w in words):
-            # treat as name if looks like title-case or upper-case words
-            candidate_name = ln
-            break
-    # fallback: search for lines containing typical name label
-    if not candidate_name:
-        for ln in lines:
-            if "NAME" in ln.upper() and len(ln.split()) <= 6:
-                candidate_name = ln.replace("NAME", "").strip(":- ")
-                break
-
-    # course: look for words like 'WEEK', 'COURSE', or lines in ALL CAPS that are not name and not cert id
-    course = None
-    for ln in lines[:20]:
-        up = ln.upper()
-        if any(k in up for k in ["WEEK","COURSE","SPEAKING","PROGRAM","PUBLIC","CERTIFICATE","MODULE"]) and len(ln.split())<=8:
-            course = ln
-            break
-    if not course:
-        # pick a long-ish uppercase line
-        for ln in lines[:20]:
-            if ln.isupper() and 2 <= len(ln.split()) <= 6 and ln != candidate_name:
-                course = ln
-                break
+    return _extract_common_fields(text)
 
-    # score: naive search for patterns like '66' or '22.25/25' or '43.5/75' - pick first numeric token > 0
-    score = None
-    m2 = re.search(r'(\d{1,3}(?:\.\d+)?/\d{1,3}(?:\.\d+)?)', text)
-    if m2:
-        score = m2.group(1)
-    else:
-        m3 = re.search(r'\bTotal[:\s]*([0-9]{1,3}(?:\.\d+)?)\b', text, re.IGNORECASE)
-        if m3:
-            score = m3.group(1)
+# aggregate_score weights, in COMPONENTS order
+COMPONENTS = ("cert", "name", "course", "text")
+WEIGHTS = {"cert": 0.35, "name": 0.30, "course": 0.20, "text": 0.15}
+WEIGHT_VECTOR = np.array([WEIGHTS[c] for c in COMPONENTS])
+# field compared for each component (text is scored separately)
+COMPONENT_FIELDS = {"cert": "cert_id", "name": "name", "course": "course"}
+# share of the final score taken by the visual check (utils/visual.py) when one was run;
+# the other weights are scaled down by (1 - VISUAL_WEIGHT)
+VISUAL_WEIGHT = 0.15
 
-    # term: look for month-year like Jul-Oct 2023
-    term = None
-    m4 = re.search(r'(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s*[-–]?\s*(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)?\s*\d{4}', text, re.IGNORECASE)
-    if m4:
-        term = m4.group(0)
+def _with_visual(final, visual_score):
+    if visual_score is None:
+        return final
+    return (1.0 - VISUAL_WEIGHT) * final + VISUAL_WEIGHT * np.clip(visual_score, 0.0, 1.0)
 
-    return {"name": candidate_name or "", "course": course or "", "cert_id": cert_id or "", "score": score or "", "term": term or ""}
-
-def aggregate_score(u_fields: dict, o_fields: dict, text_similarity_percent: float):
+def aggregate_score(u_fields: dict, o_fields: dict, text_similarity_percent: float, visual_score: float = None):
     """
     Weighted aggregation. Fields weights chosen for demo.
+    visual_score (0..1, optional) is blended in with VISUAL_WEIGHT.
     Returns (final_score [0..1], details_dict)
     """
-    # weights
-    w_cert = 0.35
-    w_name = 0.30
-    w_course = 0.20
-    w_text = 0.15
-
-    # cert id exact match -> 1 else fuzzy on token ratio
-    cert_score = 1.0 if (u_fields.get("cert_id") and o_fields.get("cert_id") and u_fields["cert_id"] == o_fields["cert_id"]) else (fuzz_token(u_fields.get("cert_id",""), o_fields.get("cert_id",""))/100.0)
-
-    name_score = fuzz_token(u_fields.get("name",""), o_fields.get("name",""))/100.0
-    course_score = fuzz_token(u_fields.get("course",""), o_fields.get("course",""))/100.0
-
-    text_score = max(0.0, min(1.0, text_similarity_percent/100.0))
-
-    final = (w_cert*cert_score + w_name*name_score + w_course*course_score + w_text*text_score)
-    details = {
-        "cert_score": cert_score,
-        "name_score": name_score,
-        "course_score": course_score,
-        "text_score": text_score,
-        "weights": {"cert": w_cert, "name": w_name, "course": w_course, "text": w_text}
-    }
+    scores = np.array([fuzz_token(u_fields.get(COMPONENT_FIELDS[c], ""), o_fields.get(COMPONENT_FIELDS[c], "")) / 100.0
+                       for c in COMPONENTS[:-1]] + [min(100.0, max(0.0, text_similarity_percent)) / 100.0])
+    final = float(_with_visual(scores @ WEIGHT_VECTOR, visual_score))
+    details = {f"{c}_score": float(v) for c, v in zip(COMPONENTS, scores)}
+    details["weights"] = dict(WEIGHTS)
+    if visual_score is not None:
+        details["visual_score"] = float(visual_score)
+        details["weights"] = {c: w * (1.0 - VISUAL_WEIGHT) for c, w in WEIGHTS.items()}
+        details["weights"]["visual"] = VISUAL_WEIGHT
     return final, details
 
 def fuzz_token(a: str, b: str):
@@ -115,4 +105,147 @@ def fuzz_token(a: str, b: str):
         return 100.0
     if not a or not b:
         return 0.0
-    return fuzz.token_set_ratio(a, b)
+    return token_set_score(a, b)
+
+def _sorted_tokens(values):
+    return [normalize_text(v).sorted if v else "" for v in values]
+
+# ---- bulk scoring: whole batches at once, in parallel C++ (rapidfuzz.process) ----
+
+def pair_scores(a, b, score_cutoff: float = None, workers: int = -1):
+    """
+    token_set_score of a[i] vs b[i] for every i, as a float64 array (scores below score_cutoff are 0).
+    Same conventions as fuzz_token: both empty -> 100, one empty -> 0.
+    """
+    if len(a) != len(b):
+        raise ValueError("pair_scores needs equally long lists")
+    out = np.zeros(len(a))
+    todo, xs, ys = [], [], []
+    for i, (x, y) in enumerate(zip(a, b)):
+        if not x or not y:
+            out[i] = 0.0 if (x or y) else 100.0
+            continue
+        x, y = normalize_text(x), normalize_text(y)
+        if not x.tokens or not y.tokens:
+            continue
+        if x.tokens <= y.tokens or y.tokens <= x.tokens:
+            out[i] = 100.0
+            continue
+        todo.append(i)
+        xs.append(x.sorted)
+        ys.append(y.sorted)
+    if todo:
+        out[todo] = process.cpdist(xs, ys, scorer=fuzz.token_set_ratio, score_cutoff=score_cutoff,
+                                   dtype=np.float64, workers=workers)
+    return out
+
+def score_matrix(queries, choices, score_cutoff: float = None, workers: int = -1):
+    """
+    len(queries) x len(choices) token_set_score matrix (float32, below score_cutoff -> 0),
+    e.g. extracted names against a registry of known names.
+    """
+    if not len(queries) or not len(choices):
+        return np.zeros((len(queries), len(choices)), dtype=np.float32)
+    return process.cdist(_sorted_tokens(queries), _sorted_tokens(choices), scorer=fuzz.token_set_ratio, score_cutoff=score_cutoff,
+                         dtype=np.float32, workers=workers)
+
+def match_registry(values, registry, score_cutoff: float = 85.0, workers: int = -1):
+    """
+    Best registry entry for every value: (index array, score array); index is -1 where nothing
+    reaches score_cutoff.
+    """
+    m = score_matrix(values, registry, score_cutoff, workers)
+    if m.shape[1] == 0:
+        return np.full(len(values), -1), np.zeros(len(values), dtype=np.float32)
+    best = m.argmax(axis=1)
+    scores = m[np.arange(len(values)), best]
+    return np.where(scores > 0, best, -1), scores
+
+def field_score_arrays(u_fields_list, o_fields_list, workers: int = -1):
+    """
+    Per-component 0..1 score arrays for paired field dicts: {"cert": arr, "name": arr, "course": arr}.
+    """
+    return {c: pair_scores([u.get(f, "") for u in u_fields_list], [o.get(f, "") for o in o_fields_list],
+                           workers=workers) / 100.0
+            for c, f in COMPONENT_FIELDS.items()}
+
+def aggregate_scores(field_scores: dict, text_similarity_percent, visual_scores=None):
+    """
+    Vectorized aggregate_score: stacks the component arrays and applies WEIGHTS in one product.
+    Returns (final array [0..1], (n, 4) component matrix in COMPONENTS order).
+    """
+    text = np.clip(np.asarray(text_similarity_percent, dtype=np.float64), 0.0, 100.0) / 100.0
+    components = np.column_stack([field_scores[c] for c in COMPONENTS[:-1]] + [text])
+    visual = None if visual_scores is None else np.asarray(visual_scores, dtype=np.float64)
+    return _with_visual(components @ WEIGHT_VECTOR, visual), components
+
+def bulk_score(u_texts, o_texts, workers: int = -1):
+    """
+    Score a batch of user texts against their official counterparts in one go.
+    Returns {"text": 0..100 array, "fields": per-component arrays, "final": 0..1 array,
+    "user_fields": [...], "official_fields": [...]}.
+    """
+    u_fields = [extract_common_fields(t) for t in u_texts]
+    o_fields = [extract_common_fields(t) for t in o_texts]
+    text = pair_scores(u_texts, o_texts, workers=workers)
+    # text_similarity_score treats one *or both* texts missing as 0
+    text[np.fromiter((not a or not b for a, b in zip(u_texts, o_texts)), dtype=bool, count=len(text))] = 0.0
+    fields = field_score_arrays(u_fields, o_fields, workers)
+    final, _ = aggregate_scores(fields, text)
+    return {"text": text, "fields": fields, "final": final, "user_fields": u_fields, "official_fields": o_fields}
+
+def benchmark_bulk(n: int = 5000):
+    """
+    Pairs/second of aggregate_score in a loop vs bulk_score on n synthetic certificate pairs.
+    Usage: python -m utils.compare [n]
+    """
+    import random, time
+    from .fields import synthetic_texts
+    u_texts = synthetic_texts(n, seed=1)
+    o_texts = list(u_texts)
+    rnd = random.Random(0)
+    for i in rnd.sample(range(n), n // 3):  # a third of them don't belong together
+        o_texts[i] = synthetic_texts(1, seed=n + i)[0]
+
+    u_fields = [extract_common_fields(t) for t in u_texts]
+    o_fields = [extract_common_fields(t) for t in o_texts]
+
+    # scoring only; field extraction is shared and benchmarked in utils.fields
+    normalize_text.cache_clear()
+    t0 = time.perf_counter()
+    loop = [aggregate_score(uf, of, text_similarity_score(u, o))[0]
+            for u, o, uf, of in zip(u_texts, o_texts, u_fields, o_fields)]
+    loop_s = time.perf_counter() - t0
+    normalize_text.cache_clear()
+    t0 = time.perf_counter()
+    text = pair_scores(u_texts, o_texts)
+    bulk, _ = aggregate_scores(field_score_arrays(u_fields, o_fields), text)
+    bulk_s = time.perf_counter() - t0
+    return {"pairs": n, "loop_pairs_per_s": n / loop_s, "bulk_pairs_per_s": n / bulk_s, "speedup": loop_s / bulk_s,
+            "max_abs_diff": float(np.abs(np.array(loop) - bulk).max())}
+
+def benchmark_normalized(n: int = 2000, repeat_official: int = 20):
+    """
+    One long official text compared with n resubmissions: raw token_set_ratio every time vs
+    token_set_score with the official text normalized once.
+    """
+    import time
+    from .fields import synthetic_texts
+    official = "\n".join(synthetic_texts(repeat_official, seed=7))  # multi-page sized text
+    users = synthetic_texts(n, seed=8)
+    t0 = time.perf_counter()
+    for u in users:
+        fuzz.token_set_ratio(official.casefold(), u.casefold())
+    raw_s = time.perf_counter() - t0
+    normalize_text.cache_clear()
+    t0 = time.perf_counter()
+    for u in users:
+        token_set_score(official, u)
+    norm_s = time.perf_counter() - t0
+    return {"comparisons": n, "raw_per_s": n / raw_s, "normalized_per_s": n / norm_s, "speedup": raw_s / norm_s}
+
+if __name__ == "__main__":
+    import sys
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    print(benchmark_bulk(n))
+    print(benchmark_normalized(n))
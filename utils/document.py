@@ -0,0 +1,193 @@
+import os, hashlib
+import cv2
+import fitz  # pymupdf
+import numpy as np
+
+from .qr_utils import pixmap_to_array, locate_qr_in_page, locate_qr_in_prepared
+from .pdf_utils import (text_layer_from_doc, ocr_array, ocr_arrays, extraction_version, OCR_DPI, PREVIEW_DPI,
+                        MIN_TEXT_LAYER_CHARS)
+from .text_cache import TextCache, get_text_cache
+from .ocr_template import ocr_with_template, template_id
+from .preprocess import preprocess_image
+from .tracing import span, cache_event
+
+
+class CertificateDocument:
+    """
+    One uploaded certificate (PDF or image), read and decoded once.
+
+    The file bytes are read a single time and hashed from memory; the PDF is opened once
+    from those bytes; rendered pixmaps are cached per (page, dpi, gray) and the text layer /
+    extracted text are cached too, so preview, QR, OCR and hashing share one decode.
+    """
+    def __init__(self, path: str = None, data: bytes = None, name: str = None):
+        if data is None:
+            with open(path, "rb") as f:
+                data = f.read()
+        self.path = path
+        self.name = name or (os.path.basename(path) if path else "upload")
+        self.data = data
+        self.is_pdf = data[:5] == b"%PDF-" or self.name.lower().endswith(".pdf")
+        self._doc = fitz.open(stream=data, filetype="pdf") if self.is_pdf else None
+        self._sha256 = None
+        self._image = None
+        self._prepared = None
+        self._pixmaps = {}
+        self._text_layer = None
+        self._texts = {}  # ocr flag -> text
+        self._qr = None
+        self.text_source = None  # "text_layer" / "ocr" / "ocr_template" / "cache" once text() ran
+
+    @classmethod
+    def from_upload(cls, uploaded_file):
+        """
+        Build from a Streamlit UploadedFile without touching disk.
+        """
+        return cls(data=uploaded_file.getvalue(), name=uploaded_file.name)
+
+    @property
+    def sha256(self):
+        if self._sha256 is None:
+            self._sha256 = hashlib.sha256(self.data).hexdigest()
+        return self._sha256
+
+    @property
+    def page_count(self):
+        return self._doc.page_count if self.is_pdf else 1
+
+    def pixmap(self, page: int = 0, dpi: int = OCR_DPI, gray: bool = True):
+        key = (page, dpi, gray)
+        pix = self._pixmaps.get(key)
+        if pix is None:
+            pix = self._doc.load_page(page).get_pixmap(dpi=dpi, colorspace=fitz.csGRAY if gray else fitz.csRGB)
+            self._pixmaps[key] = pix
+        return pix
+
+    def array(self, page: int = 0, dpi: int = OCR_DPI, gray: bool = True):
+        """
+        Rendered page as a NumPy view over the cached pixmap (images: the decoded image).
+        """
+        if not self.is_pdf:
+            img = self.image()
+            return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if gray else img
+        return pixmap_to_array(self.pixmap(page, dpi, gray))
+
+    def image(self):
+        """
+        Decoded BGR image for image uploads (None for PDFs).
+        """
+        if self.is_pdf:
+            return None
+        if self._image is None:
+            self._image = cv2.imdecode(np.frombuffer(self.data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if self._image is None:
+                raise ValueError("Image not readable by OpenCV")
+        return self._image
+
+    def prepared(self):
+        """
+        Rectified / deskewed / OCR-ready version of an image upload, computed once and shared by
+        the QR and OCR stages (None for PDFs).
+        """
+        if self.is_pdf:
+            return None
+        if self._prepared is None:
+            self._prepared = preprocess_image(self.image())
+        return self._prepared
+
+    def preview_png(self, dpi: int = PREVIEW_DPI):
+        """
+        PNG bytes of page 0 for st.image (image uploads are returned as-is).
+        """
+        if not self.is_pdf:
+            return self.data
+        return self.pixmap(0, dpi, gray=False).tobytes("png")
+
+    def text_layer(self):
+        if self._text_layer is None:
+            with span("text_layer") as s:
+                self._text_layer = text_layer_from_doc(self._doc) if self.is_pdf else ""
+                s["outcome"] = "ok" if len(self._text_layer) > MIN_TEXT_LAYER_CHARS else "empty"
+        return self._text_layer
+
+    def has_text_layer(self):
+        return len(self.text_layer()) > MIN_TEXT_LAYER_CHARS
+
+    def qr(self):
+        """
+        QR cascade result {"data", "stage", "timings"}; full-page renders come from the pixmap cache.
+        """
+        if self._qr is None:
+            with span("qr") as s:
+                if self.is_pdf:
+                    page = self._doc.load_page(0)
+
+                    def render(dpi, clip=None):
+                        if clip is None:
+                            return self.array(0, dpi)
+                        pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, clip=clip)
+                        return pixmap_to_array(pix)  # the view holds pix, no copy needed
+
+                    self._qr = locate_qr_in_page(page, render=render)
+                else:
+                    self._qr = locate_qr_in_prepared(self.prepared(), self.image())
+                s["outcome"] = "found" if self._qr["data"] else "none"
+        return self._qr
+
+    def _extract_text(self, backend=None, ocr: bool = False):
+        if self.is_pdf and not ocr and self.has_text_layer():
+            self.text_source = "text_layer"
+            return self.text_layer()
+        pages = [self.array(i, OCR_DPI) for i in range(self.page_count)] if self.is_pdf else [self.prepared().ocr]
+        with span("ocr", pages=len(pages)) as s:
+            if len(pages) == 1:
+                # single-page certificate: read only the registered field boxes if the layout matches
+                text, used_template = ocr_with_template(pages[0], fallback=lambda img: ocr_array(img, backend),
+                                                        backend=backend)
+                self.text_source = s["outcome"] = "ocr_template" if used_template else "ocr"
+                return text
+            self.text_source = "ocr"
+            return "\n".join(ocr_arrays(pages, backend))
+
+    def _text_version(self, backend, ocr):
+        version = extraction_version(backend) + ("-ocr" if ocr and self.is_pdf else "")
+        if (ocr or not self.is_pdf or not self.has_text_layer()) and self.page_count == 1:
+            # single pages may be read through the field template: key on which one
+            tid = template_id()
+            if tid:
+                version += f"-template-{tid}"
+        return version
+
+    def text(self, cache: TextCache = None, use_cache: bool = True, backend=None, ocr: bool = False):
+        """
+        Text layer if the PDF has one, else OCR; same cache + key as pdf_utils.extract_text_from_file
+        for the text layer and full-page OCR. Template OCR is cached under the template's id.
+        backend picks the OCR backend for this call (name or OcrBackend instance).
+        ocr=True OCRs the rendered page even when there is a text layer (what the reader actually sees).
+        """
+        if self._texts.get(ocr) is None:
+            if not use_cache:
+                self._texts[ocr] = self._extract_text(backend, ocr)
+            else:
+                cache = cache or get_text_cache()
+                key = TextCache.make_key(self.sha256, self._text_version(backend, ocr), OCR_DPI)
+                self._texts[ocr] = cache.get(key)
+                cache_event("text_cache", "miss" if self._texts[ocr] is None else "hit")
+                if self._texts[ocr] is not None:
+                    self.text_source = "cache"
+                else:
+                    self._texts[ocr] = self._extract_text(backend, ocr)
+                    cache.put(key, self._texts[ocr])
+        return self._texts[ocr]
+
+    def close(self):
+        self._pixmaps.clear()
+        self._prepared = None
+        if self._doc is not None:
+            self._doc.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,192 @@
+import os, time, sqlite3, tempfile, threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from .compare import compute_sha256
+from .text_cache import DEFAULT_CACHE_DIR
+from .tracing import cache_event
+
+DEFAULT_STORE_DIR = os.environ.get("CERTISCAN_OFFICIAL_DIR", os.path.join(DEFAULT_CACHE_DIR, "official"))
+# official certificates don't change often; after the TTL we revalidate with ETag / Last-Modified
+DEFAULT_TTL = float(os.environ.get("CERTISCAN_OFFICIAL_TTL", 7 * 24 * 3600))
+# a fetch claim older than this belongs to a process that died mid-download and is taken over
+CLAIM_TIMEOUT = 300.0
+CLAIM_POLL = 0.2
+
+
+def normalize_qr_url(url: str):
+    """
+    Canonical form of a QR URL so that trivially different scans map to one store entry:
+    trimmed, lower-case scheme/host, no default port, no fragment, sorted query, no trailing slash.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not ((scheme == "http" and parts.port == 80) or (scheme == "https" and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip("/") or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+class OfficialStore:
+    """
+    Content-addressed store of official certificate PDFs, indexed by normalized QR URL.
+
+    - PDFs live at <root>/<sha256>.pdf, so every certificate gets its own path and
+      concurrent verifications never overwrite each other's file.
+    - Entries younger than ttl are served straight from disk; older ones are revalidated
+      with a conditional GET (If-None-Match / If-Modified-Since) on the stored PDF URL.
+    - Concurrent get() calls for the same URL are single-flighted, across threads (a lock per
+      URL) and across processes sharing root (a claim row in the index): one caller fetches,
+      the others wait and then read the fresh entry.
+    """
+    def __init__(self, root: str = None, ttl: float = DEFAULT_TTL):
+        self.root = root or DEFAULT_STORE_DIR
+        self.ttl = ttl
+        os.makedirs(self.root, exist_ok=True)
+        self._local = threading.local()
+        self._guard = threading.Lock()
+        self._inflight = {}
+        with self._conn() as con:
+            con.execute("""CREATE TABLE IF NOT EXISTS official (
+                url_key TEXT PRIMARY KEY,
+                qr_url TEXT NOT NULL,
+                pdf_url TEXT,
+                path TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL)""")
+            con.execute("""CREATE TABLE IF NOT EXISTS fetching (
+                url_key TEXT PRIMARY KEY,
+                pid INTEGER NOT NULL,
+                started_at REAL NOT NULL)""")
+
+    def _conn(self):
+        con = getattr(self._local, "con", None)
+        if con is None or self._local.pid != os.getpid():
+            con = sqlite3.connect(os.path.join(self.root, "index.sqlite"), timeout=30)
+            con.row_factory = sqlite3.Row
+            con.execute("PRAGMA journal_mode=WAL")
+            self._local.con, self._local.pid = con, os.getpid()
+        return con
+
+    @contextmanager
+    def _single_flight(self, key):
+        with self._guard:
+            lock, waiters = self._inflight.get(key, (threading.Lock(), 0))
+            self._inflight[key] = (lock, waiters + 1)
+        try:
+            with lock, self._claim(key):
+                yield
+        finally:
+            with self._guard:
+                lock, waiters = self._inflight[key]
+                if waiters == 1:
+                    del self._inflight[key]
+                else:
+                    self._inflight[key] = (lock, waiters - 1)
+
+    @contextmanager
+    def _claim(self, key):
+        # batch pool workers each have their own store object, so the thread lock alone
+        # doesn't stop two processes downloading the same URL
+        while True:
+            with self._conn() as con:
+                con.execute("DELETE FROM fetching WHERE url_key = ? AND started_at < ?",
+                            (key, time.time() - CLAIM_TIMEOUT))
+                claimed = con.execute("INSERT OR IGNORE INTO fetching VALUES (?, ?, ?)",
+                                      (key, os.getpid(), time.time())).rowcount == 1
+            if claimed:
+                break
+            time.sleep(CLAIM_POLL)
+        try:
+            yield
+        finally:
+            with self._conn() as con:
+                con.execute("DELETE FROM fetching WHERE url_key = ? AND pid = ?", (key, os.getpid()))
+
+    def _fresh(self, entry):
+        return entry is not None and time.time() - entry["fetched_at"] < self.ttl
+
+    def lookup(self, qr_url: str):
+        """
+        Stored entry for qr_url (dict) if its PDF is still on disk, else None. No network.
+        """
+        row = self._conn().execute("SELECT * FROM official WHERE url_key = ?", (normalize_qr_url(qr_url),)).fetchone()
+        if row is None or not os.path.exists(row["path"]):
+            return None
+        return dict(row)
+
+    def _save(self, key, qr_url, pdf_url, tmp_path, meta):
+        # the downloader hashes while streaming; only hash again if it didn't
+        sha = meta.get("sha256") or compute_sha256(tmp_path)
+        path = os.path.join(self.root, f"{sha}.pdf")
+        if os.path.exists(path):
+            os.unlink(tmp_path)
+        else:
+            os.replace(tmp_path, path)  # atomic, readers never see a half-written PDF
+        with self._conn() as con:
+            con.execute("INSERT OR REPLACE INTO official VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (key, qr_url, pdf_url, path, sha, meta.get("etag"), meta.get("last_modified"), time.time()))
+        return path
+
+    def _download(self, download, pdf_url, entry=None):
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".part")
+        os.close(fd)
+        try:
+            meta = download(pdf_url, tmp_path,
+                            etag=entry and entry["etag"], last_modified=entry and entry["last_modified"])
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        if meta.get("status") == 304:
+            os.unlink(tmp_path)
+        return tmp_path, meta
+
+    def get(self, qr_url: str, resolve_pdf_url, download):
+        """
+        Path of the official PDF for qr_url, fetching it only when needed.
+        resolve_pdf_url(qr_url) -> pdf_url finds the PDF link on the landing page.
+        download(pdf_url, dest, etag=None, last_modified=None) -> {"status", "etag", "last_modified"}
+        writes the body to dest on 200 and writes nothing on 304.
+        """
+        key = normalize_qr_url(qr_url)
+        entry = self.lookup(qr_url)
+        if self._fresh(entry):  # no claim needed for a plain hit
+            cache_event("official_store", "hit")
+            return entry["path"]
+        with self._single_flight(key):
+            entry = self.lookup(qr_url)
+            if self._fresh(entry):
+                cache_event("official_store", "hit")
+                return entry["path"]
+
+            if entry and entry["pdf_url"] and (entry["etag"] or entry["last_modified"]):
+                try:
+                    tmp_path, meta = self._download(download, entry["pdf_url"], entry)
+                    if meta.get("status") == 304:
+                        with self._conn() as con:
+                            con.execute("UPDATE official SET fetched_at = ? WHERE url_key = ?", (time.time(), key))
+                        cache_event("official_store", "revalidated")
+                        return entry["path"]
+                    return self._save(key, qr_url, entry["pdf_url"], tmp_path, meta)
+                except Exception:
+                    pass  # PDF URL may have expired, resolve from the landing page again
+
+            cache_event("official_store", "miss")
+            pdf_url = resolve_pdf_url(qr_url)
+            tmp_path, meta = self._download(download, pdf_url)
+            return self._save(key, qr_url, pdf_url, tmp_path, meta)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+def get_official_store(root: str = None):
+    root = root or DEFAULT_STORE_DIR
+    with _stores_lock:
+        if root not in _stores:
+            _stores[root] = OfficialStore(root)
+        return _stores[root]
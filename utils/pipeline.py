@@ -0,0 +1,84 @@
+import os, time
+from .qr_utils import locate_qr_in_image, locate_qr_in_pdf
+from .document import CertificateDocument
+from .fetch_official import fetch_official_pdf
+from .official_store import get_official_store
+from .fields import extract_nptel_fields
+from .dedup import is_hit, known_result
+from .tracing import trace, span
+from .tiers import verify_tiered, verdict_for_score, VERIFIED_THRESHOLD, SUSPICIOUS_THRESHOLD
+
+
+def locate_qr(path: str):
+    """
+    Run the QR cascade for a PDF or image; returns {"data", "stage", "timings"}.
+    """
+    if path.lower().endswith(".pdf"):
+        return locate_qr_in_pdf(path)
+    return locate_qr_in_image(path)
+
+
+def apply_decision(result: dict, user, official, decision: dict):
+    """
+    Merge a verify_tiered() decision into result, dropping the texts and heatmap (not JSON-sized).
+    """
+    user_text = decision.pop("user_text", None)
+    decision.pop("official_text", None)
+    decision.pop("visual_heatmap", None)
+    if user_text:
+        result["roll_no"] = extract_nptel_fields(user_text).get("roll_no", "")
+    result["sha256_user"], result["sha256_official"] = user.sha256, official.sha256
+    result.update(decision)
+    return result
+
+
+def verify_certificate(user_path: str, official_path: str = None, official_dir: str = None, dedup=None):
+    """
+    Headless version of the Streamlit flow: QR -> fetch official -> tiered decision (utils/tiers.py).
+    If official_path is given the QR fetch is skipped. official_dir picks the official-PDF store
+    (default: CERTISCAN_OFFICIAL_DIR).
+    A QR link fetched before is served from the store without network, in any process.
+    dedup (optional utils.dedup.DedupIndex) returns the stored result for a file verified before
+    (same SHA-256), notes near duplicates and reused certificate ids under "dedup", and learns
+    every new result.
+    Returns a JSON-serialisable dict; "trace" lists the timed stages and cache lookups (utils/tracing.py).
+    """
+    with trace() as tr:
+        with span("verify") as s:
+            result = _verify_certificate(user_path, official_path, official_dir, dedup)
+            s["outcome"], s["decided_by"] = result.get("verdict") or "none", result.get("decided_by")
+    result["trace"] = tr.spans
+    return result
+
+
+def _verify_certificate(user_path, official_path, official_dir, dedup):
+    t0 = time.perf_counter()
+    result = {"user_path": user_path, "official_path": official_path, "qr": None}
+
+    user = CertificateDocument(user_path)
+    if dedup is not None:
+        known = dedup.lookup(user)
+        if is_hit(known):
+            return dict(known_result(known), user_path=user_path, sha256_user=user.sha256,
+                        elapsed_s=time.perf_counter() - t0)
+        if known:
+            result["dedup"] = known  # a near duplicate, or another file claiming this certificate id
+    try:
+        qr = user.qr()
+        result["qr"], result["qr_stage"], result["qr_timings"] = qr["data"], qr["stage"], qr["timings"]
+    except Exception as e:
+        result["qr_error"] = str(e)
+
+    if not official_path:
+        if not result["qr"]:
+            raise RuntimeError("No QR found and no official certificate given")
+        official_path = fetch_official_pdf(result["qr"], store=get_official_store(official_dir))
+        result["official_path"] = official_path
+    official = CertificateDocument(official_path)
+
+    # hash -> QR cert id -> text layer -> OCR, stopping at the first tier that decides
+    apply_decision(result, user, official, verify_tiered(user, official, result["qr"]))
+    result["elapsed_s"] = time.perf_counter() - t0
+    if dedup is not None:
+        dedup.add(user, result, result["qr"])
+    return result
@@ -0,0 +1,187 @@
+import os, sys, time
+import cv2
+import numpy as np
+
+# Phone photos are analysed on a small copy and warped once, straight from the original, into
+# a rectified frame no bigger than WORK_MAX_SIDE; everything downstream works on that frame.
+DETECT_MAX_SIDE = 1000
+WORK_MAX_SIDE = int(os.environ.get("CERTISCAN_WORK_MAX_SIDE", "2000"))
+# the certificate must cover at least this much of the photo to be trusted as its border
+MIN_QUAD_AREA = 0.25
+MAX_SKEW_DEG = 15.0
+MIN_SKEW_DEG = 0.3
+BINARIZE = os.environ.get("CERTISCAN_OCR_BINARIZE", "1") != "0"
+
+
+def _downscale(gray, max_side: int):
+    h, w = gray.shape[:2]
+    s = min(1.0, max_side / max(h, w))
+    if s == 1.0:
+        return gray, 1.0
+    return cv2.resize(gray, (int(w * s), int(h * s)), interpolation=cv2.INTER_AREA), s
+
+
+def order_corners(pts):
+    """
+    4x2 corners as top-left, top-right, bottom-right, bottom-left.
+    """
+    pts = np.asarray(pts, dtype=np.float32).reshape(4, 2)
+    s = pts.sum(axis=1)
+    d = np.diff(pts, axis=1).ravel()
+    return np.array([pts[np.argmin(s)], pts[np.argmin(d)], pts[np.argmax(s)], pts[np.argmax(d)]], dtype=np.float32)
+
+
+def find_document_quad(gray):
+    """
+    Corners of the certificate's outline in gray (original pixel coordinates), or None if no
+    large four-sided contour is found (scans / screenshots that are already just the page).
+    """
+    small, s = _downscale(gray, DETECT_MAX_SIDE)
+    edges = cv2.Canny(cv2.GaussianBlur(small, (5, 5), 0), 50, 150)
+    edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    min_area = MIN_QUAD_AREA * small.shape[0] * small.shape[1]
+    for c in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+        if cv2.contourArea(c) < min_area:
+            break
+        approx = cv2.approxPolyDP(c, 0.02 * cv2.arcLength(c, True), True)
+        if len(approx) == 4 and cv2.isContourConvex(approx):
+            quad = order_corners(approx) / s
+            # a quad that is just the photo frame means there is no border to crop
+            h, w = gray.shape[:2]
+            frame = np.array([[0, 0], [w, 0], [w, h], [0, h]], dtype=np.float32)
+            if np.abs(quad - frame).max() < 0.01 * max(h, w):
+                return None
+            return quad
+    return None
+
+
+def rectify(img, quad, max_side: int = WORK_MAX_SIDE):
+    """
+    Warp the quad to an upright rectangle, capped at max_side, in one interpolation pass.
+    """
+    tl, tr, br, bl = quad
+    w = max(np.linalg.norm(tr - tl), np.linalg.norm(br - bl))
+    h = max(np.linalg.norm(bl - tl), np.linalg.norm(br - tr))
+    s = min(1.0, max_side / max(w, h))
+    w, h = max(1, int(w * s)), max(1, int(h * s))
+    dst = np.array([[0, 0], [w - 1, 0], [w - 1, h - 1], [0, h - 1]], dtype=np.float32)
+    M = cv2.getPerspectiveTransform(quad.astype(np.float32), dst)
+    return cv2.warpPerspective(img, M, (w, h), flags=cv2.INTER_AREA if s < 1.0 else cv2.INTER_LINEAR,
+                               borderMode=cv2.BORDER_REPLICATE)
+
+
+def estimate_skew(gray):
+    """
+    Text-line angle in degrees (positive = counter-clockwise), from the median of near-horizontal
+    Hough segments on a downscaled copy. 0.0 if there are too few lines to tell.
+    """
+    small, _ = _downscale(gray, DETECT_MAX_SIDE)
+    edges = cv2.Canny(small, 50, 150)
+    lines = cv2.HoughLinesP(edges, 1, np.pi / 360, threshold=80, minLineLength=small.shape[1] // 8, maxLineGap=10)
+    if lines is None:
+        return 0.0
+    x0, y0, x1, y1 = lines.reshape(-1, 4).T.astype(np.float32)
+    angles = np.degrees(np.arctan2(y0 - y1, x1 - x0))
+    angles = angles[np.abs(angles) <= MAX_SKEW_DEG]
+    if len(angles) < 3:
+        return 0.0
+    return float(np.median(angles))
+
+
+def deskew(img, angle: float):
+    if abs(angle) < MIN_SKEW_DEG:
+        return img
+    h, w = img.shape[:2]
+    M = cv2.getRotationMatrix2D((w / 2, h / 2), -angle, 1.0)
+    return cv2.warpAffine(img, M, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def binarize(gray):
+    """
+    Adaptive threshold sized to the image, so shadows and uneven phone lighting don't swallow text.
+    """
+    block = max(15, (min(gray.shape[:2]) // 40) | 1)
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, block, 15)
+
+
+class PreparedImage:
+    """
+    Output of preprocess_image. gray is the rectified, deskewed page (QR decoding uses it);
+    ocr is gray scaled to the OCR text height and binarized (OCR and template OCR use it).
+    """
+    def __init__(self, gray, ocr, quad, angle, scale, timings):
+        self.gray = gray
+        self.ocr = ocr
+        self.quad = quad
+        self.angle = angle
+        self.scale = scale
+        self.timings = timings
+
+    @property
+    def rectified(self):
+        return self.quad is not None
+
+
+def preprocess_image(img, binarize_text: bool = BINARIZE):
+    """
+    Border detection -> perspective rectification -> deskew -> OCR-scale resize -> binarize.
+    img is a decoded BGR or grayscale photo/scan.
+    """
+    from .ocr_engine import scale_to_text_height
+
+    timings = {}
+    t = time.perf_counter()
+    def lap(name):
+        nonlocal t
+        now = time.perf_counter()
+        timings[name] = (now - t) * 1000.0
+        t = now
+
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    quad = find_document_quad(gray)
+    lap("border")
+    if quad is not None:
+        gray = rectify(gray, quad)
+    else:
+        gray, _ = _downscale(gray, WORK_MAX_SIDE)
+    lap("rectify")
+    angle = estimate_skew(gray)
+    gray = deskew(gray, angle)
+    lap("deskew")
+    ocr, scale = scale_to_text_height(gray)
+    lap("resize")
+    if binarize_text:
+        ocr = binarize(ocr)
+    lap("binarize")
+    return PreparedImage(gray, ocr, quad, angle, scale, timings)
+
+
+def benchmark(paths):
+    """
+    OCR time and output on raw photos vs preprocessed ones.
+    Usage: python -m utils.preprocess photo1.jpg photo2.png ...
+    """
+    from .pdf_utils import ocr_array
+
+    imgs = [img for img in (cv2.imread(p) for p in paths) if img is not None]
+    if not imgs:
+        raise ValueError("no readable images")
+    ocr_array(imgs[0])  # load the OCR model before timing
+
+    t0 = time.perf_counter()
+    raw = [ocr_array(img) for img in imgs]
+    raw_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    prepared = [preprocess_image(img) for img in imgs]
+    pre_s = time.perf_counter() - t0
+    out = [ocr_array(p.ocr) for p in prepared]
+    ocr_s = time.perf_counter() - t0 - pre_s
+    return {"images": len(imgs), "raw_ocr_s": raw_s, "preprocess_s": pre_s, "preprocessed_ocr_s": ocr_s,
+            "speedup": raw_s / (pre_s + ocr_s),
+            "rectified": sum(p.rectified for p in prepared),
+            "samples": [{"raw": r[:120], "preprocessed": o[:120]} for r, o in zip(raw, out)]}
+
+
+if __name__ == "__main__":
+    print(benchmark(sys.argv[1:]))
@@ -1,37 +1,185 @@
+import time
 import cv2
 import fitz  # pymupdf
-import tempfile, os
+import numpy as np
 
-def extract_qr_from_image_path(path: str):
+try:
+    from pyzbar import pyzbar  # needs the zbar shared library
+except Exception:
+    pyzbar = None
+
+# Cascade settings. A cheap full-page pass finds most machine-generated QRs; if that fails
+# we only re-render the regions where the NPTEL layout puts the QR code, at higher DPI.
+LOW_DPI = 72
+ROI_DPIS = (150, 300)
+FALLBACK_DPI = 200
+# (x0, y0, x1, y1) as fractions of the page: QR sits in the bottom strip, usually right-hand side
+QR_REGIONS = (
+    (0.60, 0.55, 1.00, 1.00),
+    (0.00, 0.55, 0.40, 1.00),
+)
+# phone photos get decoded on a downscaled copy first
+IMAGE_FAST_MAX_SIDE = 1000
+
+
+class _PixmapSamples:
+    """
+    Array interface over a Pixmap's sample buffer. NumPy keeps this object as the array's base,
+    and it holds the pixmap, so the buffer lives exactly as long as any view of it.
+    """
+    def __init__(self, pix):
+        self.pix = pix
+        self.__array_interface__ = {"version": 3, "typestr": "|u1", "data": (pix.samples_ptr, True),
+                                    "shape": (pix.height, pix.width, pix.n), "strides": (pix.stride, pix.n, 1)}
+
+
+def pixmap_to_array(pix):
+    """
+    Wrap a PyMuPDF Pixmap's sample buffer as a read-only (h, w[, n]) uint8 array without copying.
+    The array keeps the pixmap alive, so a temporary get_pixmap(...) result is safe to pass.
+    """
+    if hasattr(pix, "samples_ptr"):
+        arr = np.asarray(_PixmapSamples(pix))
+    else:  # older PyMuPDF: samples is a bytes copy, which the array keeps alive itself
+        arr = np.lib.stride_tricks.as_strided(np.frombuffer(pix.samples, dtype=np.uint8),
+                                              shape=(pix.height, pix.width, pix.n),
+                                              strides=(pix.stride, pix.n, 1), writeable=False)
+    return arr[:, :, 0] if pix.n == 1 else arr
+
+def extract_qr_from_array(img):
     """
-    Read image from path and try to decode QR using OpenCV QRCodeDetector.
+    Decode a QR code from an image array (grayscale or BGR/RGB) using OpenCV QRCodeDetector.
     Returns decoded string or None.
     """
-    img = cv2.imread(path)
-    if img is None:
-        raise ValueError("Image not readable by OpenCV")
     detector = cv2.QRCodeDetector()
     data, points, _ = detector.detectAndDecode(img)
     return data if data else None
 
-def extract_qr_from_pdf_path(pdf_path: str):
+def _decode_pyzbar(img):
+    if pyzbar is None:
+        return None
+    for sym in pyzbar.decode(img):
+        if sym.type == "QRCODE" and sym.data:
+            return sym.data.decode("utf-8", errors="replace")
+    return None
+
+def _decode_aruco(img):
+    if not hasattr(cv2, "QRCodeDetectorAruco"):
+        return None
+    data, points, _ = cv2.QRCodeDetectorAruco().detectAndDecode(img)
+    return data if data else None
+
+
+class _Cascade:
     """
-    Render first page of PDF and try to decode QR using OpenCV QRCodeDetector.
+    Runs decode stages in order, stops at the first hit and records per-stage timing.
     """
-    doc = fitz.open(pdf_path)
-    if doc.page_count < 1:
-        return None
-    page = doc.load_page(0)
-    pix = page.get_pixmap(dpi=200)
-    img_data = pix.tobytes("png")
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-    tmp.write(img_data)
-    tmp.flush()
-    tmp.close()
-    try:
-        return extract_qr_from_image_path(tmp.name)
-    finally:
+    def __init__(self):
+        self.timings = []
+        self.data = None
+        self.stage = None
+
+    def run(self, stage, fn):
+        if self.data is not None:
+            return self.data
+        t0 = time.perf_counter()
         try:
-            os.unlink(tmp.name)
+            data = fn()
         except Exception:
-            pass
+            data = None
+        self.timings.append({"stage": stage, "ms": (time.perf_counter() - t0) * 1000.0, "found": bool(data)})
+        if data:
+            self.data, self.stage = data, stage
+        return data
+
+    def result(self):
+        return {"data": self.data, "stage": self.stage, "timings": self.timings}
+
+
+def _render(page, dpi, clip=None):
+    # the view keeps its pixmap alive, so no stage pays for a copy
+    return pixmap_to_array(page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, clip=clip))
+
+def _region_rect(page, region):
+    r = page.rect
+    x0, y0, x1, y1 = region
+    return fitz.Rect(r.x0 + x0 * r.width, r.y0 + y0 * r.height, r.x0 + x1 * r.width, r.y0 + y1 * r.height)
+
+def locate_qr_in_page(page, render=None):
+    """
+    Cascading QR search on a PyMuPDF page:
+    low-DPI full page -> NPTEL QR regions at increasing DPI -> pyzbar -> QRCodeDetectorAruco.
+    render(dpi, clip=None) -> gray array can be passed to reuse already-rendered pixmaps.
+    Returns {"data": str|None, "stage": str|None, "timings": [{"stage", "ms", "found"}, ...]}.
+    """
+    render = render or (lambda dpi, clip=None: _render(page, dpi, clip))
+    c = _Cascade()
+    c.run(f"full@{LOW_DPI}", lambda: extract_qr_from_array(render(LOW_DPI)))
+    for dpi in ROI_DPIS:
+        for i, region in enumerate(QR_REGIONS):
+            c.run(f"roi{i}@{dpi}", lambda: extract_qr_from_array(render(dpi, _region_rect(page, region))))
+    if c.data is None:
+        full = render(FALLBACK_DPI)
+        c.run(f"pyzbar@{FALLBACK_DPI}", lambda: _decode_pyzbar(full))
+        c.run(f"aruco@{FALLBACK_DPI}", lambda: _decode_aruco(full))
+    return c.result()
+
+def locate_qr_in_array(img):
+    """
+    Same cascade for an already-decoded image (e.g. a phone photo):
+    downscaled frame -> QR regions -> full resolution -> pyzbar -> QRCodeDetectorAruco.
+    """
+    c = _Cascade()
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    h, w = gray.shape[:2]
+    scale = IMAGE_FAST_MAX_SIDE / max(h, w)
+    if scale < 1.0:
+        small = cv2.resize(gray, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+        c.run("downscaled", lambda: extract_qr_from_array(small))
+    for i, (x0, y0, x1, y1) in enumerate(QR_REGIONS):
+        crop = gray[int(y0 * h):int(y1 * h), int(x0 * w):int(x1 * w)]
+        c.run(f"roi{i}", lambda: extract_qr_from_array(crop))
+    c.run("full", lambda: extract_qr_from_array(gray))
+    c.run("pyzbar", lambda: _decode_pyzbar(gray))
+    c.run("aruco", lambda: _decode_aruco(gray))
+    return c.result()
+
+def locate_qr_in_pdf(pdf_path: str):
+    doc = fitz.open(pdf_path)
+    if doc.page_count < 1:
+        return {"data": None, "stage": None, "timings": []}
+    return locate_qr_in_page(doc.load_page(0))
+
+def locate_qr_in_prepared(prepared, img):
+    """
+    Cascade on the rectified frame from preprocess_image (the QR regions only line up once the
+    page is upright), then on the original photo if that finds nothing.
+    """
+    res = locate_qr_in_array(prepared.gray)
+    if res["data"] is None and prepared.gray.shape[:2] != img.shape[:2]:
+        raw = locate_qr_in_array(img)
+        raw["timings"] = res["timings"] + [dict(t, stage=f"raw:{t['stage']}") for t in raw["timings"]]
+        if raw["stage"]:
+            raw["stage"] = f"raw:{raw['stage']}"
+        return raw
+    return res
+
+def locate_qr_in_image(path: str):
+    from .preprocess import preprocess_image
+    img = cv2.imread(path)
+    if img is None:
+        raise ValueError("Image not readable by OpenCV")
+    return locate_qr_in_prepared(preprocess_image(img, binarize_text=False), img)
+
+def extract_qr_from_image_path(path: str):
+    """
+    Read image from path and run the QR cascade on it.
+    Returns decoded string or None.
+    """
+    return locate_qr_in_image(path)["data"]
+
+def extract_qr_from_pdf_path(pdf_path: str):
+    """
+    Run the QR cascade on the first page of a PDF. Returns decoded string or None.
+    """
+    return locate_qr_in_pdf(pdf_path)["data"]
@@ -0,0 +1,187 @@
+import os, sys, csv, json, time
+from itertools import islice
+
+# one row per verification; the nested result fields that matter for an audit are flattened
+REPORT_COLUMNS = ["doc_id", "user_path", "official_path", "verdict", "decided_by", "final_score", "text_similarity",
+                  "name", "course", "cert_id", "roll_no", "score", "term", "qr", "status", "error", "elapsed_s"]
+FLOAT_COLUMNS = {"final_score", "text_similarity", "elapsed_s"}
+REPORT_FORMATS = ("xlsx", "csv", "parquet")
+CHUNK_ROWS = 5000
+
+
+def report_row(result: dict):
+    """
+    Flat report record from a verify_certificate() result / verify-batch row.
+    """
+    fields = result.get("user_fields") or {}
+    row = {c: result.get(c) for c in REPORT_COLUMNS}
+    for k in ("name", "course", "cert_id", "score", "term"):
+        row[k] = fields.get(k, "")
+    row["cert_id"] = result.get("qr_cert_id") or row["cert_id"]
+    row["roll_no"] = result.get("roll_no") or ""
+    row["status"] = result.get("status") or ("ok" if result.get("verdict") else "")
+    row["doc_id"] = result.get("sha256_user") or result.get("doc_id")
+    return row
+
+
+def iter_result_file(path: str):
+    """
+    Results of a verify-batch run (.jsonl or .csv), one dict at a time.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            yield from csv.DictReader(f)
+        else:
+            for ln in f:
+                if ln.strip():
+                    yield json.loads(ln)
+
+
+def chunks(rows, size: int = CHUNK_ROWS):
+    it = iter(rows)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _values(row: dict, columns):
+    return [row.get(c) if row.get(c) is not None else "" for c in columns]
+
+
+def _write_xlsx(out, row_chunks, columns, sheet):
+    # write-only workbook: rows go straight to a temporary XML stream instead of a cell tree
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheet)
+    ws.append(columns)
+    n = 0
+    for chunk in row_chunks:
+        for row in chunk:
+            ws.append(_values(row, columns))
+        n += len(chunk)
+    wb.save(out)
+    return n
+
+
+def _write_csv(out, row_chunks, columns):
+    f = open(out, "w", newline="", encoding="utf-8") if isinstance(out, str) else out
+    try:
+        w = csv.writer(f)
+        w.writerow(columns)
+        n = 0
+        for chunk in row_chunks:
+            w.writerows(_values(row, columns) for row in chunk)
+            n += len(chunk)
+    finally:
+        if isinstance(out, str):
+            f.close()
+    return n
+
+
+def _write_parquet(out, row_chunks, columns):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    schema = pa.schema([(c, pa.float64() if c in FLOAT_COLUMNS else pa.string()) for c in columns])
+
+    def column(chunk, c):
+        if c in FLOAT_COLUMNS:
+            return [None if row.get(c) in (None, "") else float(row[c]) for row in chunk]
+        return [None if row.get(c) is None else str(row[c]) for row in chunk]
+
+    n = 0
+    # one row group per chunk, so only a chunk is ever held in memory
+    with pq.ParquetWriter(out, schema, compression="zstd") as writer:
+        for chunk in row_chunks:
+            writer.write_batch(pa.record_batch([column(chunk, c) for c in columns], schema=schema))
+            n += len(chunk)
+    return n
+
+
+def export_report(rows, out, fmt: str = None, columns=None, chunk_rows: int = CHUNK_ROWS,
+                  sheet: str = "VerificationData"):
+    """
+    Stream report rows (dicts, any iterable / generator) to out (path or binary file object;
+    text file object for CSV) as xlsx, csv or parquet, chunk_rows at a time, so memory stays flat
+    whatever the row count. fmt defaults to out's extension. Returns the number of rows written.
+    """
+    if not fmt and isinstance(out, str):
+        fmt = os.path.splitext(out)[1].lstrip(".").lower()
+    if fmt not in REPORT_FORMATS:
+        raise ValueError(f"unknown report format {fmt!r}; expected one of {REPORT_FORMATS}")
+    columns = list(columns or REPORT_COLUMNS)
+    row_chunks = chunks(rows, chunk_rows)
+    if fmt == "xlsx":
+        return _write_xlsx(out, row_chunks, columns, sheet)
+    if fmt == "csv":
+        return _write_csv(out, row_chunks, columns)
+    return _write_parquet(out, row_chunks, columns)
+
+
+def export_results(results, out, fmt: str = None, chunk_rows: int = CHUNK_ROWS):
+    """
+    export_report over verification results (e.g. iter_result_file(...) or ledger runs).
+    """
+    return export_report((report_row(r) for r in results), out, fmt, chunk_rows=chunk_rows)
+
+
+def synthetic_results(n: int, seed: int = 0):
+    """
+    n verify-batch-like result dicts, generated lazily, for benchmarking.
+    """
+    import random
+    from .fields import synthetic_texts, extract_common_fields
+    rnd = random.Random(seed)
+    fields = [extract_common_fields(t) for t in synthetic_texts(200, seed)]
+    verdicts = ["VERIFIED", "SUSPICIOUS", "FAKE"]
+    for i in range(n):
+        yield {"doc_id": f"{i:064x}", "user_path": f"/data/season/{i}.pdf", "official_path": f"/data/official/{i}.pdf",
+               "status": "ok", "verdict": rnd.choice(verdicts), "decided_by": rnd.choice(["hash", "text_layer", "ocr"]),
+               "final_score": rnd.random(), "text_similarity": rnd.random() * 100, "user_fields": rnd.choice(fields),
+               "roll_no": f"NPTEL23CS{i:06d}", "qr": f"https://archive.nptel.ac.in/noc/Ecertificate/?q={i}",
+               "elapsed_s": rnd.random() * 5}
+
+
+def _peak_mb(fn):
+    import tracemalloc
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_export(n: int = 100000, out_dir: str = None, formats=REPORT_FORMATS):
+    """
+    Rows/second of each format for n synthetic results, plus peak Python memory (tracemalloc)
+    at n // 4 and n rows, which should stay about the same (two chunks of rows at most).
+    Usage: python -m utils.report [n]
+    """
+    import tempfile
+    out_dir = out_dir or tempfile.mkdtemp(prefix="certiscan-report-")
+    small = max(1, n // 4)
+    stats = {}
+    for fmt in formats:
+        path = os.path.join(out_dir, f"report.{fmt}")
+        t0 = time.perf_counter()
+        try:
+            export_results(synthetic_results(n), path)
+        except RuntimeError as e:  # pyarrow missing
+            stats[fmt] = str(e)
+            continue
+        elapsed = time.perf_counter() - t0
+        stats[fmt] = {"rows": n, "rows_per_s": n / elapsed, "file_mb": os.path.getsize(path) / 1e6,
+                      f"peak_mb_{small}": _peak_mb(lambda: export_results(synthetic_results(small), path)),
+                      f"peak_mb_{n}": _peak_mb(lambda: export_results(synthetic_results(n), path))}
+    return stats
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for k, v in benchmark_export(n).items():
+        print(k, v)
@@ -0,0 +1,195 @@
+import os, sys, time, sqlite3, threading
+import cv2
+import numpy as np
+
+from .text_cache import DEFAULT_CACHE_DIR
+from .tracing import cache_event
+
+# page 0 is rendered small: layout / photo / signature edits show up at this size, text OCR isn't needed
+VISUAL_DPI = 72
+THUMB_WIDTH = 600
+SSIM_BLOCK = 16
+# blocks with SSIM below this are reported as changed
+TAMPER_SSIM = 0.6
+# hashes differing in more than this many of 64 bits count as unrelated images
+HASH_MAX_BITS = 24
+FINGERPRINT_VERSION = "1"
+VISUAL_ENABLED = os.environ.get("CERTISCAN_VISUAL", "1") != "0"
+
+
+def phash(gray):
+    """
+    64-bit DCT perceptual hash: low 8x8 frequencies of a 32x32 thumbnail vs their median.
+    """
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].ravel()
+    bits = low > np.median(low[1:])
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def dhash(gray):
+    """
+    64-bit gradient hash: is each pixel of a 9x8 thumbnail brighter than its right neighbour.
+    """
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def hamming(a: int, b: int):
+    return bin(a ^ b).count("1")
+
+
+def block_ssim(a, b, block: int = SSIM_BLOCK):
+    """
+    SSIM per non-overlapping block x block tile, all tiles at once with NumPy.
+    a and b are same-sized grayscale images; returns an (h // block, w // block) float32 map.
+    """
+    h, w = (a.shape[0] // block) * block, (a.shape[1] // block) * block
+    shape = (h // block, block, w // block, block)
+    x = a[:h, :w].astype(np.float32).reshape(shape)
+    y = b[:h, :w].astype(np.float32).reshape(shape)
+    mx, my = x.mean(axis=(1, 3)), y.mean(axis=(1, 3))
+    dx = x - mx[:, None, :, None]
+    dy = y - my[:, None, :, None]
+    vx, vy = (dx * dx).mean(axis=(1, 3)), (dy * dy).mean(axis=(1, 3))
+    cov = (dx * dy).mean(axis=(1, 3))
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    return ((2 * mx * my + c1) * (2 * cov + c2)) / ((mx * mx + my * my + c1) * (vx + vy + c2))
+
+
+def thumbnail(gray, width: int = THUMB_WIDTH):
+    h, w = gray.shape[:2]
+    return cv2.resize(gray, (width, max(1, round(h * width / w))), interpolation=cv2.INTER_AREA)
+
+
+def page_gray(doc):
+    """
+    Page 0 of a CertificateDocument as grayscale: a low-DPI render for PDFs, the rectified
+    frame for photos.
+    """
+    if doc.is_pdf:
+        return np.ascontiguousarray(doc.array(0, VISUAL_DPI))
+    return doc.prepared().gray
+
+
+def fingerprint(gray):
+    thumb = thumbnail(gray)
+    return {"phash": phash(thumb), "dhash": dhash(thumb), "thumb": thumb}
+
+
+class FingerprintStore:
+    """
+    Official-certificate fingerprints (pHash, dHash, SSIM thumbnail) by PDF SHA-256, in SQLite
+    next to the text cache, so an official page is rendered and hashed only once.
+    """
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "fingerprints.sqlite")
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as con:
+            con.execute("""CREATE TABLE IF NOT EXISTS fingerprint (
+                sha256 TEXT NOT NULL,
+                version TEXT NOT NULL,
+                phash INTEGER NOT NULL,
+                dhash INTEGER NOT NULL,
+                thumb BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (sha256, version))""")
+
+    def _conn(self):
+        con = getattr(self._local, "con", None)
+        if con is None or self._local.pid != os.getpid():
+            con = sqlite3.connect(self.path, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")
+            self._local.con, self._local.pid = con, os.getpid()
+        return con
+
+    def get(self, sha256: str):
+        row = self._conn().execute("SELECT phash, dhash, thumb FROM fingerprint WHERE sha256 = ? AND version = ?",
+                                   (sha256, FINGERPRINT_VERSION)).fetchone()
+        if row is None:
+            return None
+        # hashes are stored as signed 64-bit (SQLite INTEGER)
+        thumb = cv2.imdecode(np.frombuffer(row[2], dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        return {"phash": row[0] & (2 ** 64 - 1), "dhash": row[1] & (2 ** 64 - 1), "thumb": thumb}
+
+    def put(self, sha256: str, fp: dict):
+        ok, png = cv2.imencode(".png", fp["thumb"])
+        signed = lambda v: v - 2 ** 64 if v >= 2 ** 63 else v
+        with self._conn() as con:
+            con.execute("INSERT OR REPLACE INTO fingerprint VALUES (?, ?, ?, ?, ?, ?)",
+                        (sha256, FINGERPRINT_VERSION, signed(fp["phash"]), signed(fp["dhash"]), png.tobytes(), time.time()))
+
+
+_store = None
+def get_fingerprint_store():
+    global _store
+    if _store is None:
+        _store = FingerprintStore()
+    return _store
+
+
+def official_fingerprint(official, store: FingerprintStore = None):
+    """
+    Stored fingerprint of an official CertificateDocument, computed and saved on first use.
+    """
+    store = store or get_fingerprint_store()
+    fp = store.get(official.sha256)
+    cache_event("fingerprints", "miss" if fp is None else "hit")
+    if fp is None:
+        fp = fingerprint(page_gray(official))
+        store.put(official.sha256, fp)
+    return fp
+
+
+def visual_compare(user, official, store: FingerprintStore = None):
+    """
+    pHash / dHash distance and block-wise SSIM of the user's page 0 against the official
+    fingerprint. Returns {"visual_score" 0..1, "phash_distance", "dhash_distance", "ssim",
+    "tampered_fraction", "heatmap" (per-block SSIM), "timings"}.
+    """
+    timings = {}
+    t0 = time.perf_counter()
+    ofp = official_fingerprint(official, store)
+    timings["official_ms"] = (time.perf_counter() - t0) * 1000.0
+
+    t0 = time.perf_counter()
+    th, tw = ofp["thumb"].shape[:2]
+    # same frame as the official thumbnail, so blocks line up
+    thumb = cv2.resize(page_gray(user), (tw, th), interpolation=cv2.INTER_AREA)
+    pd, dd = hamming(phash(thumb), ofp["phash"]), hamming(dhash(thumb), ofp["dhash"])
+    heatmap = block_ssim(thumb, ofp["thumb"])
+    timings["compare_ms"] = (time.perf_counter() - t0) * 1000.0
+
+    ssim = float(heatmap.mean())
+    hash_sim = 1.0 - min(HASH_MAX_BITS, (pd + dd) / 2.0) / HASH_MAX_BITS
+    return {
+        "visual_score": 0.4 * hash_sim + 0.6 * max(0.0, ssim),
+        "phash_distance": pd,
+        "dhash_distance": dd,
+        "ssim": ssim,
+        "tampered_fraction": float((heatmap < TAMPER_SSIM).mean()),
+        "heatmap": heatmap,
+        "timings": timings,
+    }
+
+
+def heatmap_overlay(user, heatmap, alpha: float = 0.45):
+    """
+    BGR image of the user's page with low-SSIM blocks painted red, for st.image.
+    """
+    gray = page_gray(user)
+    h, w = gray.shape[:2]
+    diff = np.clip((1.0 - heatmap) * 255.0, 0, 255).astype(np.uint8)
+    diff = cv2.resize(diff, (w, h), interpolation=cv2.INTER_NEAREST)
+    color = cv2.applyColorMap(diff, cv2.COLORMAP_JET)
+    return cv2.addWeighted(cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR), 1.0 - alpha, color, alpha, 0)
+
+
+if __name__ == "__main__":
+    # python -m utils.visual user.pdf official.pdf
+    from .document import CertificateDocument
+    res = visual_compare(CertificateDocument(sys.argv[1]), CertificateDocument(sys.argv[2]))
+    res.pop("heatmap")
+    print(res)